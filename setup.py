@@ -30,7 +30,9 @@ setup(
     test_suite="nose.collector",
     entry_points={
         "console_scripts": [
-            "specchio = specchio.main:main"
+            "specchio = specchio.main:main",
+            "specchio-replay = specchio.main:replay_main",
+            "specchio-push = specchio.main:push_main"
         ],
     },
     classifiers=[
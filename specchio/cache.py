@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import marshal
+import os
+import threading
+import time
+
+from specchio.utils import (compile_gitignore, find_binary, logger,
+                            parse_gitignore)
+
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_FOLDER = os.path.join("~", ".cache", "specchio")
+
+
+class StartupCache(object):
+
+    def __init__(self, src_path, cache_folder=DEFAULT_CACHE_FOLDER):
+        """Constructor of `StartupCache`, the startup work of a source path
+        is cached in one file, including the location of all `.gitignore`,
+        the parsed patterns of each `.gitignore` and the path of binaries
+
+        A folder is listed again only if its modification time is changed,
+        and a `.gitignore` is parsed again only if its modification time or
+        size is changed. A time too close to the time of the cache is not
+        trusted, because a change in the same tick can't be seen.
+
+        :param src_path: str -- source path, None to keep the cache in
+                                memory only
+        :param cache_folder: str -- the folder of cache files
+        :return: None
+        """
+        self.src_path = os.path.abspath(src_path) if src_path else None
+        self.cache_path = os.path.join(
+            os.path.expanduser(cache_folder),
+            hashlib.sha1(self.src_path).hexdigest() + ".cache"
+        ) if src_path else None
+        self.data = self.load()
+        self.lock = threading.Lock()
+
+    def load(self):
+        data = {"version": CACHE_VERSION, "time": 0, "binaries": {},
+                "folders": {}, "gitignores": {}}
+        if self.cache_path is None:
+            return data
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                _data = marshal.load(cache_file)
+        except (IOError, OSError, EOFError, TypeError, ValueError):
+            return data
+        if (not isinstance(_data, dict) or
+                _data.get("version") != CACHE_VERSION):
+            return data
+        data.update(_data)
+        return data
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        self.data["time"] = time.time()
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            if not os.path.isdir(os.path.dirname(self.cache_path)):
+                os.makedirs(os.path.dirname(self.cache_path))
+            # Paths are kept as bytes by `marshal`, unlike JSON
+            with open(tmp_path, "wb") as cache_file:
+                marshal.dump(self.data, cache_file)
+            os.rename(tmp_path, self.cache_path)
+        except (IOError, OSError):
+            logger.warning("Failed to save the cache to {}".format(
+                self.cache_path
+            ))
+
+    def is_fresh(self, mtime):
+        return mtime < self.data["time"] - 1
+
+    def get_binary(self, name):
+        """Get the path of a binary, the cached one is used if it's still
+        executable
+
+        :param name: str -- the name of binary, like `ssh`
+        :return: str -- the path of binary, None if it's not found
+        """
+        path = self.data["binaries"].get(name)
+        if path is None or not os.access(path, os.X_OK):
+            path = find_binary(name)
+            self.data["binaries"][name] = path
+        return path
+
+    def get_gitignore_re(self, base_path):
+        """Get all compiled regular expression from all `.gitignore` under
+        base_path, and save the cache
+
+        :param base_path: str -- the path to deal with
+        :return: dict -- same as `utils.get_all_re`
+        """
+        with self.lock:
+            result = self.get_all_re(self.walk_get_gitignore(base_path))
+            self.save()
+        return result
+
+    def walk_get_gitignore(self, base_path):
+        """Same as `utils.walk_get_gitignore`, but only the folders changed
+        since the cache are listed
+
+        :param base_path: str -- the path to deal with
+        :return: list of str -- the path of all `.gitignore`
+        """
+        base_path = os.path.abspath(base_path)
+        folders = self.data["folders"]
+        # The relative path of folder is the key, the value is a list like
+        # [modification time, names of child folders, has `.gitignore`]
+        _folders = {}
+        result = []
+        pending_folders = [""]
+        while pending_folders:
+            folder = pending_folders.pop()
+            abs_folder = os.path.join(base_path, folder)
+            try:
+                mtime = os.stat(abs_folder).st_mtime
+            except OSError:
+                continue
+            entry = folders.get(folder)
+            if entry is None or entry[0] != mtime or not self.is_fresh(mtime):
+                entry = [mtime] + self.list_folder(abs_folder)
+            _folders[folder] = entry
+            if entry[2]:
+                result.append(os.path.join(abs_folder, ".gitignore"))
+            pending_folders.extend(os.path.join(folder, name)
+                                   for name in entry[1])
+        self.data["folders"] = _folders
+        return sorted(result)
+
+    def list_folder(self, abs_folder):
+        """List a folder like `os.walk`, the linked folders are skipped
+
+        :param abs_folder: str -- the absolute path of folder
+        :return: list -- [names of child folders, has `.gitignore`]
+        """
+        child_folders, has_gitignore = [], False
+        try:
+            names = os.listdir(abs_folder)
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(abs_folder, name)
+            if not os.path.isdir(path):
+                has_gitignore = has_gitignore or name == ".gitignore"
+            elif not os.path.islink(path):
+                child_folders.append(name)
+        return [sorted(child_folders), has_gitignore]
+
+    def get_all_re(self, gitignore_path_list):
+        """Same as `utils.get_all_re`, but only the `.gitignore` changed
+        since the cache are parsed
+
+        :param gitignore_path_list: list of str -- the path of all
+                                                   `.gitignore`
+        :return: dict -- same as `utils.get_all_re`
+        """
+        gitignores = self.data["gitignores"]
+        # The path is the key, the value is a list like
+        # [modification time, size, patterns of type 1, 2 and 3]
+        _gitignores = {}
+        result = {}
+        for gitignore_path in gitignore_path_list:
+            stat = os.stat(gitignore_path)
+            entry = gitignores.get(gitignore_path)
+            if (entry is None or entry[:2] != [stat.st_mtime, stat.st_size] or
+                    not self.is_fresh(stat.st_mtime)):
+                globs = parse_gitignore(gitignore_path)
+                entry = [stat.st_mtime, stat.st_size,
+                         globs[1], globs[2], globs[3]]
+            _gitignores[gitignore_path] = entry
+            result[gitignore_path] = compile_gitignore(
+                {1: entry[2], 2: entry[3], 3: entry[4]}
+            )
+        self.data["gitignores"] = _gitignores
+        return result
@@ -13,7 +13,7 @@ LOGGING_CONFIG = {
     },
     "handlers": {
         "specchio": {
-            "class": "logging.StreamHandler",
+            "()": "specchio.logs.AsyncStreamHandler",
             "formatter": "specchio",
             "stream": "ext://sys.stdout"
         }},
@@ -23,6 +23,10 @@ LOGGING_CONFIG = {
                       " %(asctime)s %(name)s  %(message)s",
             "datefmt": "%Y-%m-%d %H:%M:%S",
             "()": "colorlog.ColoredFormatter",
+        },
+        "json": {
+            "()": "specchio.logs.JsonFormatter",
+            "datefmt": "%Y-%m-%d %H:%M:%S"
         }
     }
 }
@@ -2,12 +2,154 @@
 # -*- coding: utf-8 -*-
 
 GENERAL_OPTIONS = {
-    "--init-remote"
+    "--init-remote",
+    "--verify-remote",
+    "--checksum",
+    "--reconcile-interval",
+    "--storm-rate",
+    "--storm-queue",
+    "--large-file-size",
+    "--large-file-bwlimit",
+    "--bulk-bwlimit",
+    "--log-json",
+    "--record",
+    "--scan-processes",
+    "--poll-interval",
+    "--push-socket",
+    "--max-file-size",
+    "--size-policy"
+}
+
+# Options with a string value
+STR_OPTIONS = {
+    "--record",
+    "--push-socket",
+    "--size-policy"
+}
+
+DEFAULT_STORM_RATE = 200
+
+DEFAULT_STORM_QUEUE = 1000
+
+DEFAULT_LARGE_FILE_SIZE = 32
+
+# All cores
+DEFAULT_SCAN_PROCESSES = 0
+
+# Options with an integer value, and the default value of them
+INT_OPTIONS = {
+    "--reconcile-interval": None,
+    "--storm-rate": DEFAULT_STORM_RATE,
+    "--storm-queue": DEFAULT_STORM_QUEUE,
+    "--large-file-size": DEFAULT_LARGE_FILE_SIZE,
+    "--large-file-bwlimit": None,
+    "--bulk-bwlimit": None,
+    "--scan-processes": DEFAULT_SCAN_PROCESSES,
+    "--poll-interval": None,
+    "--max-file-size": None
 }
 
 MANUAL = """Usage:
   specchio [options] src/ user@host:dst/
+  specchio [options] src/ dst/
+  specchio wait --socket=PATH [--timeout=SECONDS]
 
 General Options:
   --init-remote     Initialize remote folder, rsync all files to remote system.
+  --verify-remote   Compare remote folder with local folder by one listing,
+                    rsync the different files and remove the extra files.
+  --checksum        Compare content hash instead of size and modification
+                    time when verifying remote folder.
+  --reconcile-interval=SECONDS
+                    Keep a merkle tree of local folder, compare it with
+                    remote folder periodically and sync the differences.
+  --storm-rate=EVENTS
+                    Stop handling events one by one when there are more
+                    events in one second, and resync the changed folders
+                    once activity settles, 200 by default.
+  --storm-queue=EVENTS
+                    Same as `--storm-rate`, but for the number of pending
+                    events, 1000 by default.
+  --large-file-size=MB
+                    Send files of this size or larger one by one in a
+                    background lane with resumable transfers, 32 by
+                    default, 0 to disable the lane.
+  --large-file-bwlimit=KBPS
+                    Bandwidth limit of the large file lane.
+  --bulk-bwlimit=KBPS
+                    Bandwidth limit of bulk work, which runs in the
+                    background behind saved files, like initialization,
+                    storm recovery and reconciliation.
+  --log-json        Write logs as JSON lines instead of colored text.
+  --record=PATH     Record all raw events to a trace file, which can be
+                    replayed by `specchio-replay`.
+  --scan-processes=PROCESSES
+                    Number of processes to list the files of a folder
+                    which is not a git work tree, 0 by default for all
+                    cores, 1 to list in one thread.
+  --poll-interval=SECONDS
+                    Poll source path instead of waiting for inotify events,
+                    like on NFS, SMB or a volume of container, the interval
+                    doubles up to this while nothing changes.
+  --push-socket=PATH
+                    Listen on a Unix socket for paths to sync now, which
+                    are sent by `specchio-push`, and for `specchio wait`.
+  --max-file-size=MB
+                    Skip the files larger than this which are not ignored.
+  --size-policy=PATH
+                    Skip or defer files by a policy file, with lines like
+                    `*.csv 100M defer` for the max size of files matched,
+                    or `data/ 2G files=5000` for the budget of a folder.
+"""
+
+REPLAY_OPTIONS = {
+    "--speed",
+    "--src"
+}
+
+REPLAY_MANUAL = """Usage:
+  specchio-replay [options] trace
+
+Replay a trace recorded by `specchio --record` against a fake transport,
+and print the operations and the latency from events to operations.
+
+Options:
+  --speed=SPEED     1 is the original speed, 2 is twice as fast, 0 is as
+                    fast as possible, 0 by default.
+  --src=PATH        Source path to look up the files of events, an empty
+                    temporary folder by default.
+"""
+
+PUSH_OPTIONS = {
+    "--socket",
+    "--timeout"
+}
+
+PUSH_MANUAL = """Usage:
+  specchio-push [options] path...
+
+Ask a running `specchio --push-socket=PATH` to sync files or folders now,
+and wait for the remote to apply them. Exit with 1 if it fails.
+
+Options:
+  --socket=PATH     The path of Unix socket, required.
+  --timeout=SECONDS Seconds to wait, 600 by default.
+"""
+
+WAIT_OPTIONS = {
+    "--socket",
+    "--timeout"
+}
+
+WAIT_MANUAL = """Usage:
+  specchio wait [options]
+
+Block until a running `specchio --push-socket=PATH` has applied all changes
+observed before the call to the remote. It returns at once if there is
+nothing to sync. Exit with 1 if it times out, or the remote is unreachable
+and the changes are journaled.
+
+Options:
+  --socket=PATH     The path of Unix socket, required.
+  --timeout=SECONDS Seconds to wait, 60 by default.
 """
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+from watchdog.events import (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED,
+                             EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED)
+
+
+def iter_self_and_ancestors(path):
+    """Iterate the path itself and all of its ancestors
+
+    :param path: str -- the path to deal with
+    :return: generator of str -- like "/a/b", "/a", "/"
+    """
+    path = path.rstrip("/") or "/"
+    while True:
+        yield path
+        parent_path = os.path.dirname(path)
+        if parent_path == path:
+            break
+        path = parent_path
+
+
+def is_implied_move(event, dir_moves):
+    """Check whether a move is already done by moving one of its ancestors
+
+    :param event: FileSystemMovedEvent -- the move to check
+    :param dir_moves: list of tuple -- (src_path, dest_path) of folder moves
+                                       seen before
+    :return: bool
+    """
+    src_path = event.src_path.rstrip("/")
+    dest_path = event.dest_path.rstrip("/")
+    for dir_src_path, dir_dest_path in dir_moves:
+        if (src_path.startswith(dir_src_path + "/") and
+                dest_path == dir_dest_path + src_path[len(dir_src_path):]):
+            return True
+    return False
+
+
+def compact_segment(events):
+    """Compact a window of events which contains no move
+
+    Deletes covered by a later delete of the same path or an ancestor are
+    dropped, so are creates and modifies under a path deleted later in the
+    window. Repeated syncs of one path are reduced to the last one, and a
+    folder create is dropped when a later file sync creates it anyway.
+    Other events, like `closed` sent by watchdog 0.10 after each write,
+    need nothing remotely and are dropped.
+
+    :param events: list of FileSystemEvent -- events in order
+    :return: list of FileSystemEvent -- all deletes come first, because
+                                        every kept create or modify happened
+                                        after the deletes covering it
+    """
+    deleted_paths, synced_paths, parent_paths = set(), set(), set()
+    kept_events = []
+    for event in reversed(events):
+        if event.event_type not in (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED,
+                                    EVENT_TYPE_MODIFIED):
+            continue
+        path = event.src_path.rstrip("/") or "/"
+        if any(_path in deleted_paths
+               for _path in iter_self_and_ancestors(path)):
+            continue
+        if event.event_type == EVENT_TYPE_DELETED:
+            deleted_paths.add(path)
+        elif event.event_type == EVENT_TYPE_MODIFIED and event.is_directory:
+            # Nothing to do remotely when a folder is modified
+            continue
+        else:
+            if path in synced_paths:
+                continue
+            if event.is_directory and path in parent_paths:
+                continue
+            synced_paths.add(path)
+            if not event.is_directory:
+                parent_paths.update(iter_self_and_ancestors(
+                    os.path.dirname(path)
+                ))
+        kept_events.append(event)
+    kept_events.reverse()
+    return (
+        [e for e in kept_events if e.event_type == EVENT_TYPE_DELETED] +
+        [e for e in kept_events if e.event_type != EVENT_TYPE_DELETED]
+    )
+
+
+def compact_events(events):
+    """Reduce a window of events to the minimal equivalent set of events
+    over the path tree
+
+    Moves split the window into segments, each segment is compacted by
+    `compact_segment`. A move of a child which is done by moving its
+    folder is dropped.
+
+    :param events: list of FileSystemEvent -- events in order
+    :return: list of FileSystemEvent
+    """
+    result, segment, dir_moves = [], [], []
+    for event in events:
+        if event.event_type != EVENT_TYPE_MOVED:
+            segment.append(event)
+            continue
+        if is_implied_move(event, dir_moves):
+            continue
+        result.extend(compact_segment(segment))
+        segment = []
+        result.append(event)
+        if event.is_directory:
+            dir_moves.append((event.src_path.rstrip("/"),
+                              event.dest_path.rstrip("/")))
+    result.extend(compact_segment(segment))
+    return result
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import array
+
+# The flags of an entry
+FLAG_FOLDER = 1
+FLAG_REMOVED = 2
+
+# No entry, like the parent of root or the end of siblings
+NO_ENTRY = -1
+
+# The root entry is the source path itself
+ROOT_ENTRY = 0
+
+
+class FileIndex(object):
+
+    def __init__(self):
+        """Constructor of `FileIndex`, a compact index of relative paths for
+        millions of files
+
+        Each entry is one component of a path with a pointer to its parent
+        entry, and the components are interned, so a folder is stored once
+        for all paths under it. The size, modification time, inode and
+        flags of entries are kept in packed arrays, and the child of a
+        folder is found by an open addressing table in an array instead of
+        a dict, so no object is allocated per entry. The arrays of size,
+        modification time and inode are empty until one of them is set.
+
+        Iterating the index yields the relative path of files sorted like
+        `sorted`, so an index can be used as a list of paths.
+
+        :return: None
+        """
+        # The component is the key, the value is its index in `names`
+        self.name_ids = {}
+        self.names = []
+        self.parents = array.array("i", [NO_ENTRY])
+        self.name_refs = array.array("i", [NO_ENTRY])
+        self.first_children = array.array("i", [NO_ENTRY])
+        self.next_siblings = array.array("i", [NO_ENTRY])
+        self.sizes = array.array("L")
+        self.mtimes = array.array("d")
+        self.inodes = array.array("L")
+        self.flags = array.array("B", [FLAG_FOLDER])
+        # Slots of entries, the number of slots is a power of 2
+        self.table = array.array("i", [NO_ENTRY]) * 8
+        self.file_count = 0
+        # The paths are mostly added folder by folder
+        self.last_folder = ""
+        self.last_folder_entry = ROOT_ENTRY
+
+    def __len__(self):
+        return self.file_count
+
+    def __iter__(self):
+        return self.iter_paths()
+
+    def __contains__(self, path):
+        entry = self.lookup(path)
+        return entry is not None and entry != ROOT_ENTRY
+
+    def get_slot(self, parent, name_id):
+        """Find the slot of a child in the table
+
+        :param parent: int -- the parent entry
+        :param name_id: int -- the index of component in `names`
+        :return: int -- the slot of the child, or the empty slot to put it
+        """
+        mask = len(self.table) - 1
+        slot = hash((parent, name_id)) & mask
+        while True:
+            entry = self.table[slot]
+            if entry == NO_ENTRY or (self.parents[entry] == parent and
+                                     self.name_refs[entry] == name_id):
+                return slot
+            slot = (slot + 1) & mask
+
+    def resize_table(self):
+        self.table = array.array("i", [NO_ENTRY]) * (len(self.table) * 2)
+        for entry in range(1, len(self.parents)):
+            self.table[self.get_slot(self.parents[entry],
+                                     self.name_refs[entry])] = entry
+
+    def get_child(self, parent, name, create=False):
+        """Get the entry of a component under a folder
+
+        :param parent: int -- the parent entry
+        :param name: str -- the component
+        :param create: bool -- create the entry if it doesn't exist
+        :return: int -- the entry, None if it doesn't exist
+        """
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            if not create:
+                return None
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        slot = self.get_slot(parent, name_id)
+        entry = self.table[slot]
+        if entry != NO_ENTRY or not create:
+            return None if entry == NO_ENTRY else entry
+        entry = len(self.parents)
+        self.parents.append(parent)
+        self.name_refs.append(name_id)
+        self.first_children.append(NO_ENTRY)
+        self.next_siblings.append(self.first_children[parent])
+        self.first_children[parent] = entry
+        if self.sizes:
+            self.sizes.append(0)
+            self.mtimes.append(0)
+            self.inodes.append(0)
+        self.flags.append(FLAG_REMOVED)
+        self.table[slot] = entry
+        # Keep the table at most half full
+        if len(self.parents) * 2 > len(self.table):
+            self.resize_table()
+        return entry
+
+    def lookup(self, path):
+        """Get the entry of a path
+
+        :param path: str -- relative path of file or folder, "" is the root
+        :return: int -- the entry, None if it doesn't exist
+        """
+        entry = ROOT_ENTRY
+        for name in path.strip("/").split("/") if path.strip("/") else []:
+            entry = self.get_child(entry, name)
+            if entry is None or self.flags[entry] & FLAG_REMOVED:
+                return None
+        return entry
+
+    def add(self, path, size=0, mtime=0, inode=0, isdir=False):
+        """Add or update a file or folder, the parent folders are added
+
+        :param path: str -- relative path of file or folder
+        :param size: int -- size of file
+        :param mtime: float -- modification time of file
+        :param inode: int -- inode of file or folder
+        :param isdir: bool -- whether the path is a folder
+        :return: int -- the entry
+        """
+        folder, _, name = path.strip("/").rpartition("/")
+        if (folder != self.last_folder or
+                self.flags[self.last_folder_entry] != FLAG_FOLDER):
+            parent = ROOT_ENTRY
+            for _name in folder.split("/") if folder else []:
+                parent = self.set_kind(
+                    self.get_child(parent, _name, create=True), True
+                )
+            self.last_folder, self.last_folder_entry = folder, parent
+        entry = self.set_kind(
+            self.get_child(self.last_folder_entry, name, create=True), isdir
+        )
+        if size or mtime or inode or self.sizes:
+            if not self.sizes:
+                self.sizes = array.array("L", [0]) * len(self.parents)
+                self.mtimes = array.array("d", [0]) * len(self.parents)
+                self.inodes = array.array("L", [0]) * len(self.parents)
+            self.sizes[entry] = size
+            self.mtimes[entry] = mtime
+            self.inodes[entry] = inode
+        return entry
+
+    def set_kind(self, entry, isdir):
+        flags = self.flags[entry]
+        if flags & FLAG_REMOVED or bool(flags & FLAG_FOLDER) != isdir:
+            if not flags & FLAG_REMOVED:
+                # A file is replaced by a folder, or a folder by a file
+                self.remove_entry(entry)
+            self.flags[entry] = FLAG_FOLDER if isdir else 0
+            self.file_count += not isdir
+        return entry
+
+    def remove(self, path):
+        """Remove a file, or a folder with all entries under it
+
+        :param path: str -- relative path of file or folder
+        :return: bool -- whether the path existed
+        """
+        entry = self.lookup(path)
+        if entry is None or entry == ROOT_ENTRY:
+            return False
+        self.remove_entry(entry)
+        return True
+
+    def remove_entry(self, entry):
+        # The entries are kept for the same path added again
+        stack = [entry]
+        while stack:
+            entry = stack.pop()
+            flags = self.flags[entry]
+            if flags & FLAG_REMOVED:
+                continue
+            if not flags & FLAG_FOLDER:
+                self.file_count -= 1
+            self.flags[entry] = flags | FLAG_REMOVED
+            child = self.first_children[entry]
+            while child != NO_ENTRY:
+                stack.append(child)
+                child = self.next_siblings[child]
+
+    def get(self, path):
+        """Get the attributes of a path
+
+        :param path: str -- relative path of file or folder
+        :return: tuple -- (whether it's a folder, size, mtime, inode), None
+                          if the path doesn't exist
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return None
+        if not self.sizes:
+            return bool(self.flags[entry] & FLAG_FOLDER), 0, 0, 0
+        return (bool(self.flags[entry] & FLAG_FOLDER), self.sizes[entry],
+                self.mtimes[entry], self.inodes[entry])
+
+    def iter_files(self, path=""):
+        """List all files under a folder with their attributes
+
+        :param path: str -- relative path of file or folder, "" is the root
+        :return: generator of tuple -- (relative path, size, mtime, inode)
+        """
+        for entry in self.iter_entries(path):
+            if self.flags[entry] & FLAG_FOLDER:
+                continue
+            if not self.sizes:
+                yield self.get_path(entry), 0, 0, 0
+                continue
+            yield (self.get_path(entry), self.sizes[entry],
+                   self.mtimes[entry], self.inodes[entry])
+
+    def get_path(self, entry):
+        names = []
+        while entry != ROOT_ENTRY:
+            names.append(self.names[self.name_refs[entry]])
+            entry = self.parents[entry]
+        return "/".join(reversed(names))
+
+    def get_sorted_children(self, entry):
+        children = []
+        child = self.first_children[entry]
+        while child != NO_ENTRY:
+            if not self.flags[child] & FLAG_REMOVED:
+                children.append(child)
+            child = self.next_siblings[child]
+        # A folder is sorted by its name with "/", so the paths under it
+        # are sorted like `sorted`
+        children.sort(key=lambda child: (
+            self.names[self.name_refs[child]] +
+            ("/" if self.flags[child] & FLAG_FOLDER else "")
+        ))
+        return children
+
+    def iter_entries(self, path=""):
+        """Walk all files and folders under a folder in sorted order
+
+        :param path: str -- relative path of folder, "" is the root
+        :return: generator of int -- the entries, the folder itself first
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return
+        stack = [entry]
+        while stack:
+            entry = stack.pop()
+            yield entry
+            if self.flags[entry] & FLAG_FOLDER:
+                stack.extend(reversed(self.get_sorted_children(entry)))
+
+    def iter_paths(self, path=""):
+        """List all files under a folder in sorted order
+
+        :param path: str -- relative path of folder, "" is the root
+        :return: generator of str -- relative path of files
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return
+        if not self.flags[entry] & FLAG_FOLDER:
+            yield self.get_path(entry)
+            return
+        prefix = self.get_path(entry)
+        # The prefix of each folder is only joined once
+        stack = [(entry, prefix + "/" if prefix else "")]
+        while stack:
+            entry, prefix = stack.pop()
+            if not self.flags[entry] & FLAG_FOLDER:
+                yield prefix
+                continue
+            for child in reversed(self.get_sorted_children(entry)):
+                name = self.names[self.name_refs[child]]
+                stack.append((child, prefix + name + (
+                    "/" if self.flags[child] & FLAG_FOLDER else ""
+                )))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+from specchio.utils import get_git_dir, get_git_head, git_changed_files
+
+# Git keeps these paths in `.git` while an operation is running
+GIT_OPERATION_PATHS = (
+    "index.lock", "rebase-merge", "rebase-apply", "MERGE_HEAD",
+    "CHERRY_PICK_HEAD", "REVERT_HEAD"
+)
+
+
+class GitStateMonitor(object):
+
+    def __init__(self, src_path, max_paths=1000):
+        """Constructor of `GitStateMonitor`
+
+        A git operation is detected by the events of `.git/HEAD`,
+        `.git/index.lock` and rebase or merge state. While it's running,
+        the paths of events are only collected, and the files changed by
+        git are got when it has been done.
+
+        :param src_path: str -- source path
+        :param max_paths: int -- max number of paths collected while a git
+                                 operation is running
+        :return: None
+        """
+        self.src_path = src_path
+        self.git_dir = get_git_dir(src_path)
+        self.head = get_git_head(src_path) if self.git_dir else None
+        self.max_paths = max_paths
+        self.is_running = False
+        self.paths = set()
+        self.is_overflow = False
+        # The number of git events, to tell whether another operation has
+        # started while polling
+        self.git_event_count = 0
+        # `poll` runs git without holding it, so events keep coming
+        self.lock = threading.Lock()
+
+    def is_git_path(self, abs_path):
+        return bool(self.git_dir) and (
+            abs_path == self.git_dir or
+            abs_path.startswith(self.git_dir + "/")
+        )
+
+    def on_git_event(self, abs_path):
+        """Check whether a git operation starts by an event under `.git`
+
+        :param abs_path: str -- the absolute path of the event
+        :return: None
+        """
+        name = abs_path[len(self.git_dir) + 1:].split("/")[0]
+        if name == "HEAD" or name in GIT_OPERATION_PATHS:
+            with self.lock:
+                self.is_running = True
+                self.git_event_count += 1
+
+    def add_path(self, path):
+        """Collect a path changed while a git operation is running
+
+        :param path: str -- relative path of file or folder
+        :return: None
+        """
+        with self.lock:
+            if len(self.paths) >= self.max_paths:
+                self.is_overflow = True
+                return
+            self.paths.add(path)
+
+    def is_operation_running(self):
+        return any(os.path.exists(os.path.join(self.git_dir, name))
+                   for name in GIT_OPERATION_PATHS)
+
+    def poll(self, paths=()):
+        """Check whether a git operation has been done
+
+        :param paths: iterable of str -- relative path of other changed files
+        :return: tuple -- (set of relative path changed, whether too many
+                          paths were collected), None if there is no git
+                          operation done
+        """
+        with self.lock:
+            if not self.is_running:
+                return None
+            git_event_count = self.git_event_count
+        if self.is_operation_running():
+            return None
+        head = get_git_head(self.src_path)
+        if head != self.head:
+            changed_paths = git_changed_files(self.src_path, self.head, head)
+        else:
+            # Like `git reset --hard` or `git stash`, only the paths of
+            # events are changed
+            changed_paths = set()
+        changed_paths.update(paths)
+        with self.lock:
+            changed_paths.update(self.paths)
+            result = changed_paths, self.is_overflow
+            self.head = head
+            # Keep pausing if another operation has started meanwhile
+            self.is_running = self.git_event_count != git_event_count
+            self.paths = set()
+            self.is_overflow = False
+        return result
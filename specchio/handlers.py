@@ -2,18 +2,45 @@
 # -*- coding: utf-8 -*-
 
 import os
+import stat
+import threading
+import time
 
-from specchio.utils import (get_all_re, logger, remote_create_folder,
-                            remote_mv, remote_rm, rsync, rsync_multi,
-                            walk_get_gitignore)
-from watchdog.events import (DirCreatedEvent, DirDeletedEvent,
+from specchio.const import (DEFAULT_LARGE_FILE_SIZE, DEFAULT_STORM_QUEUE,
+                            DEFAULT_STORM_RATE)
+from specchio.events import compact_events, iter_self_and_ancestors
+from specchio.fileindex import FileIndex
+from specchio.gitstate import GitStateMonitor
+from specchio.journal import JournaledTransport
+from specchio.lanes import LargeFileLane
+from specchio.merkle import MerkleTree, join_path
+from specchio.moves import MoveDetector
+from specchio.policy import DEFER, SKIP
+from specchio.scanner import ParallelScanner
+from specchio.scheduler import BULK, GITIGNORE, INTERACTIVE, SyncScheduler
+from specchio.storm import StormDetector
+from specchio.transports import SSHTransport
+from specchio.utils import (diff_manifest, get_all_re, get_manifest_value,
+                            get_relative_path, git_ignored_files,
+                            git_ls_files, is_git_work_tree, logger,
+                            match_ignore, walk_get_gitignore)
+from watchdog.events import (EVENT_TYPE_DELETED, EVENT_TYPE_MODIFIED,
+                             DirCreatedEvent, DirDeletedEvent,
                              DirModifiedEvent, DirMovedEvent,
                              FileModifiedEvent, FileSystemEventHandler)
 
 
 class SpecchioEventHandler(FileSystemEventHandler):
 
-    def __init__(self, src_path, dst_ssh, dst_path, is_init_remote=False):
+    def __init__(self, src_path, dst_ssh, dst_path, is_init_remote=False,
+                 is_verify_remote=False, is_checksum=False,
+                 reconcile_interval=None, storm_rate=DEFAULT_STORM_RATE,
+                 storm_queue=DEFAULT_STORM_QUEUE,
+                 large_file_size=DEFAULT_LARGE_FILE_SIZE,
+                 large_file_bwlimit=None, bulk_bwlimit=None,
+                 startup_cache=None, trace_recorder=None, transport=None,
+                 scan_processes=1, journal=None, size_policy=None,
+                 clock=time):
         """Constructor of `SpecchioEventHandler`
 
         :param src_path: str -- source path
@@ -21,77 +48,756 @@ class SpecchioEventHandler(FileSystemEventHandler):
                                just like: user@host
         :param dst_path: str -- destination path
         :param is_init_remote: bool -- initialize the file remotely or not
+        :param is_verify_remote: bool -- compare the remote file with local
+                                         file and sync the differences
+        :param is_checksum: bool -- compare content hash when verifying
+        :param reconcile_interval: int -- seconds between two periodic
+                                          reconciliations by merkle tree,
+                                          None to disable it
+        :param storm_rate: int -- events in one second to start a storm
+        :param storm_queue: int -- pending events to start a storm
+        :param large_file_size: int -- the size in MB of a large file, which
+                                       is sent in the large file lane, None
+                                       to disable the lane
+        :param large_file_bwlimit: int -- bandwidth limit in KB/s of the
+                                          large file lane
+        :param bulk_bwlimit: int -- bandwidth limit in KB/s of bulk work,
+                                    like initialization, storm recovery
+                                    and reconciliation
+        :param startup_cache: `StartupCache` -- cache of the ignore pattern,
+                                                None to load all ignore
+                                                pattern every time
+        :param trace_recorder: `TraceRecorder` -- record all raw events,
+                                                  None to disable it
+        :param transport: object -- the transport to sync files, like
+                                    `LocalTransport`, `SSHTransport` of
+                                    dst_ssh by default
+        :param scan_processes: int -- number of processes to list the files
+                                      by walking the tree, 0 is the number
+                                      of cores, 1 to walk in the current
+                                      thread
+        :param journal: `OperationJournal` -- journal the changes when the
+                                              remote is unreachable, and
+                                              replay them once it's back,
+                                              None to disable it
+        :param size_policy: `SizePolicy` -- skip or defer the files over
+                                            the max size or the budget of
+                                            their folder, None to disable
+                                            it
+        :param clock: object -- has `time` and `sleep` like the module, to
+                                replay a trace by its own time
         :return: None
         """
+        self.startup_cache = startup_cache
+        self.trace_recorder = trace_recorder
+        self.clock = clock
+        # The ignore rules are shared by the foreground and bulk threads,
+        # they're replaced as a whole instead of changed in place
+        self.ignore_lock = threading.Lock()
         self.init_gitignore(src_path)
         self.src_path = src_path
         self.dst_ssh = dst_ssh
         self.dst_path = dst_path
+        self.transport = transport or SSHTransport(dst_ssh)
+        self.journal = journal
+        self.size_policy = size_policy
+        if journal is not None:
+            self.transport = JournaledTransport(self.transport, journal,
+                                                dst_path)
+        self.is_replaying = False
+        self.reconnect_retries = 0
+        self.next_reconnect_time = 0
         self.git_path = os.path.join(os.path.abspath(self.src_path),
                                      ".git/")
+        # Events are collected here, and handled by `flush` in a batch
+        self.pending_events = []
+        self.pending_events_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # The merkle tree is updated by the foreground and bulk threads
+        self.merkle_lock = threading.Lock()
+        self.storm_detector = StormDetector(src_path, max_rate=storm_rate,
+                                            max_depth=storm_queue,
+                                            clock=clock)
+        self.git_state_monitor = GitStateMonitor(src_path,
+                                                 max_paths=storm_queue)
+        self.large_file_lane = LargeFileLane(
+            self.transport, min_size=large_file_size * 1024 * 1024,
+            bwlimit=large_file_bwlimit
+        ) if large_file_size else None
+        # Pair deletes with creates of the same file to move it remotely
+        self.move_detector = MoveDetector(src_path, self.is_ignore)
+        self.merkle_tree = None
+        # The files skipped by the size policy are left out of the merkle
+        # tree, and excluded from the remote one
+        self.skipped_files = set()
+        self.scanner = (ParallelScanner(processes=scan_processes)
+                        if scan_processes != 1 else None)
+        # Whether to list files from git index, None is unknown yet
+        self.git_index_enabled = None
+        self.reconcile_interval = reconcile_interval
+        self.last_reconcile_time = self.clock.time()
+        self.is_reconciling = False
+        self.bulk_bwlimit = bulk_bwlimit
+        # Saved files are synced before `.gitignore` changes, and both are
+        # synced before bulk work, which runs in the background
+        self.scheduler = SyncScheduler()
         super(SpecchioEventHandler, self).__init__()
+        if is_init_remote or is_verify_remote or reconcile_interval:
+            self.scheduler.submit(BULK, self.prepare_remote, is_init_remote,
+                                  is_verify_remote, is_checksum)
+
+    def start(self):
+        self.scheduler.start()
+
+    def stop(self):
+        # The deletes held by the move detector are released
+        self.flush()
+        self.scheduler.stop()
+
+    def prepare_remote(self, is_init_remote, is_verify_remote, is_checksum):
+        """Initialize or verify the remote file, then build the merkle tree
+        if periodic reconciliation is enabled
+
+        :param is_init_remote: bool -- initialize the file remotely or not
+        :param is_verify_remote: bool -- compare the remote file with local
+                                         file and sync the differences
+        :param is_checksum: bool -- compare content hash when verifying
+        :return: None
+        """
         if is_init_remote:
             logger.info("Starting to initialize the file remotely first")
             self.init_remote()
             logger.info("Initialization of the remote file has been done")
+        elif is_verify_remote:
+            logger.info("Starting to verify the file remotely first")
+            self.verify_remote(with_hash=is_checksum)
+            logger.info("Verification of the remote file has been done")
+        if self.reconcile_interval:
+            logger.info("Building merkle tree of the local file")
+            self.init_merkle_tree()
 
     def init_remote(self):
-        # Rsync all files to remote system
-        _rsync_file_list = []
-        for root_path, dirs_path, files_path in os.walk(self.src_path):
+        # Stream all files by tar if the remote folder is empty, otherwise
+        # rsync all files to remote system
+        src_paths = self.iter_sync_files()
+        if self.size_policy is not None:
+            src_paths = self.apply_size_policy(src_paths)
+        if self.transport.is_empty(dst_path=self.dst_path):
+            logger.info("Remote folder is empty, send all files by tar")
+            self.transport.send_all(folder_path=self.src_path,
+                                    src_paths=src_paths,
+                                    dst_path=self.dst_path)
+            return
+        file_index = FileIndex()
+        for path in src_paths:
+            file_index.add(path)
+        self.transport.send_files(folder_path=self.src_path,
+                                  src_paths=file_index,
+                                  dst_path=self.dst_path,
+                                  bwlimit=self.bulk_bwlimit)
+
+    def iter_sync_files(self, folder_path=None):
+        """Get all files which are not ignored, from the git index if the
+        source path is a git work tree, otherwise by walking the tree
+
+        :param folder_path: str -- only list this folder under source path
+        :return: generator of str -- relative path of files
+        """
+        if self.git_index_enabled is None:
+            self.git_index_enabled = is_git_work_tree(self.src_path)
+            if self.git_index_enabled:
+                logger.info("Source path is a git work tree, list files "
+                            "from git index")
+        if self.git_index_enabled:
+            return self.iter_git_files(folder_path)
+        return self.iter_walk_files(folder_path)
+
+    def iter_git_files(self, folder_path=None):
+        """List all tracked files and untracked files which are not ignored
+        by git
+
+        :param folder_path: str -- only list this folder under source path
+        :return: generator of str -- relative path of files
+        """
+        relative_folder_path = (self.get_relative_src_path(folder_path)
+                                if folder_path else "")
+        for file_path in git_ls_files(folder_path or self.src_path):
+            relative_src_file_path = os.path.join(relative_folder_path,
+                                                  file_path)
+            try:
+                mode = os.lstat(os.path.join(
+                    self.src_path, relative_src_file_path
+                )).st_mode
+            except OSError:
+                # The file is tracked but deleted
+                continue
+            # Skip submodule
+            if not stat.S_ISDIR(mode):
+                yield relative_src_file_path
+
+    def iter_walk_files(self, folder_path=None):
+        """Walk the source path and yield all files which are not ignored,
+        the ignored folders are pruned from the walk, and the folders are
+        spread across processes if the scanner is enabled
+
+        :param folder_path: str -- only walk this folder under source path
+        :return: generator of str -- relative path of files
+        """
+        if self.scanner is not None:
+            for batch in self.scanner.iter_batches(
+                os.path.abspath(self.src_path),
+                self.get_relative_src_path(folder_path) if folder_path
+                else "",
+                self.copy_ignore_rules()
+            ):
+                for path in batch:
+                    yield path
+            return
+        for root_path, dirs_path, files_path in os.walk(
+            folder_path or self.src_path
+        ):
             abs_src_folder_path = os.path.abspath(root_path)
-            if not self.is_ignore(abs_src_folder_path, True):
-                for file_path in files_path:
-                    src_file_path = os.path.join(root_path, file_path)
-                    abs_src_file_path = os.path.abspath(src_file_path)
-                    relative_src_file_path = self.get_relative_src_path(
-                        src_file_path
+            if self.is_ignore(abs_src_folder_path, True):
+                del dirs_path[:]
+                continue
+            for file_path in files_path:
+                src_file_path = os.path.join(root_path, file_path)
+                abs_src_file_path = os.path.abspath(src_file_path)
+                relative_src_file_path = self.get_relative_src_path(
+                    src_file_path
+                )
+                if not self.is_ignore(abs_src_file_path, False):
+                    yield relative_src_file_path
+
+    def verify_remote(self, with_hash=False, folder_paths=None):
+        """Compare a remote listing with the local files, rsync the missing
+        and changed files, and remove the extra files remotely
+
+        :param with_hash: bool -- compare content hash instead of size and
+                                  modification time
+        :param folder_paths: list of str -- only compare these folders,
+                                            relative to the source path
+        :return: None
+        """
+        local_file_index = FileIndex()
+        # The files skipped by the size policy are left alone remotely
+        skipped_files = set()
+        for folder_path in folder_paths or [""]:
+            src_folder_path = os.path.join(self.src_path, folder_path)
+            if folder_paths is None or os.path.isdir(src_folder_path):
+                for path in self.iter_sync_files(
+                    src_folder_path if folder_path else None
+                ):
+                    if self.is_skipped(path):
+                        skipped_files.add(path)
+                    else:
+                        local_file_index.add(path)
+        # The paths of index are sorted
+        local_manifest = (
+            (path, get_manifest_value(os.path.join(self.src_path, path),
+                                      with_hash))
+            for path in local_file_index
+        )
+        _rsync_file_list, _rm_file_list = [], []
+        for state, path in diff_manifest(
+            local_manifest,
+            self.transport.manifest(self.dst_path, with_hash, folder_paths)
+        ):
+            if path in skipped_files:
+                continue
+            if state != "extra":
+                _rsync_file_list.append(path)
+            elif not self.is_ignore(
+                os.path.abspath(os.path.join(self.src_path, path)), False
+            ):
+                # Keep the file ignored locally, like built files remotely
+                _rm_file_list.append(os.path.join(self.dst_path, path))
+        self.sync_differences(_rsync_file_list, _rm_file_list,
+                              bwlimit=self.bulk_bwlimit)
+        # The files are tracked to detect moves
+        for path in local_file_index:
+            self.move_detector.record(path)
+
+    def sync_differences(self, rsync_file_list, rm_file_list, bwlimit=None,
+                         use_large_file_lane=True):
+        """Remove the extra paths remotely, then rsync the different files,
+        the large files are queued in the large file lane
+
+        :param rsync_file_list: list of str -- relative path of files
+        :param rm_file_list: list of str -- destination path to remove
+        :param bwlimit: int -- bandwidth limit in KB/s, None is unlimited
+        :param use_large_file_lane: bool -- False to send the large files
+                                            with the others
+        :return: bool -- whether the transfers succeed, the files queued in
+                         the large file lane are not waited
+        """
+        logger.info("Found {0} different files and {1} extra paths "
+                    "remotely".format(len(rsync_file_list),
+                                      len(rm_file_list)))
+        is_succeeded = self.transport.remove_multi(dst_paths=rm_file_list)
+        for dst_path in rm_file_list:
+            self.release_path(get_relative_path(self.dst_path, dst_path))
+        if self.size_policy is not None:
+            rsync_file_list = list(self.apply_size_policy(rsync_file_list))
+        for path in rsync_file_list:
+            self.move_detector.record(path)
+        if self.large_file_lane and use_large_file_lane:
+            _rsync_file_list = []
+            for path in rsync_file_list:
+                abs_src_path = os.path.abspath(
+                    os.path.join(self.src_path, path)
+                )
+                if self.large_file_lane.is_large(abs_src_path):
+                    self.large_file_lane.submit(
+                        abs_src_path, os.path.join(self.dst_path, path),
+                        is_tracked=self.is_tracked_task()
                     )
-                    if not self.is_ignore(abs_src_file_path, False):
-                        _rsync_file_list.append(relative_src_file_path)
-        rsync_multi(dst_ssh=self.dst_ssh, folder_path=self.src_path,
-                    src_paths=_rsync_file_list, dst_path=self.dst_path)
+                else:
+                    _rsync_file_list.append(path)
+            rsync_file_list = _rsync_file_list
+        if rsync_file_list:
+            is_succeeded = self.transport.send_files(
+                folder_path=self.src_path, src_paths=rsync_file_list,
+                dst_path=self.dst_path, bwlimit=bwlimit
+            ) and is_succeeded
+        return is_succeeded
+
+    def check_size_policy(self, path):
+        """Check a file by the size policy, a skipped file is logged
+
+        :param path: str -- relative path of file
+        :return: str -- `SKIP` or `DEFER`, None to send it now
+        """
+        try:
+            size = os.lstat(os.path.join(self.src_path, path)).st_size
+        except OSError:
+            # Like removed, the transport deals with it
+            return None
+        action = self.size_policy.check(path, size)
+        if action == SKIP:
+            logger.warning("Skip {0} of {1} bytes by the size policy".format(
+                path, size
+            ), extra={"summary": "skipped {} files by the size policy"})
+        return action
+
+    def is_skipped(self, path):
+        """Check whether a file is skipped by the size policy, without
+        charging the budget
+
+        :param path: str -- relative path of file
+        :return: bool -- True if it's never sent
+        """
+        if self.size_policy is None:
+            return False
+        try:
+            size = os.lstat(os.path.join(self.src_path, path)).st_size
+        except OSError:
+            return False
+        return self.size_policy.check(path, size, is_charged=False) == SKIP
+
+    def apply_size_policy(self, paths):
+        """Check files by the size policy, the deferred files are sent
+        later as bulk work
+
+        :param paths: iterable of str -- relative path of files
+        :return: generator of str -- the files to send now
+        """
+        deferred_paths = []
+        for path in paths:
+            action = self.check_size_policy(path)
+            if action is None:
+                yield path
+            elif action == DEFER:
+                deferred_paths.append(path)
+        if deferred_paths:
+            logger.info("Defer {} files by the size policy".format(
+                len(deferred_paths)
+            ))
+            self.scheduler.submit(BULK, self.send_deferred, deferred_paths)
+
+    def send_deferred(self, paths):
+        """Send the files deferred by the size policy one by one, the
+        interrupted transfer is resumed next time
+
+        :param paths: list of str -- relative path of files
+        :return: None
+        """
+        for path in paths:
+            abs_src_path = os.path.abspath(os.path.join(self.src_path, path))
+            if not os.path.isfile(abs_src_path):
+                continue
+            dst_path = os.path.join(self.dst_path, path)
+            logger.info("Rsync deferred file {} remotely".format(dst_path),
+                        extra={"summary": "synced {} deferred files"})
+            self.transport.create_folder(dst_path=os.path.dirname(dst_path))
+            self.transport.send_large_file(src_path=abs_src_path,
+                                           dst_path=dst_path,
+                                           bwlimit=self.bulk_bwlimit)
+
+    def release_path(self, path):
+        """Forget a removed file or folder in the move detector and the
+        budget of size policy
+
+        :param path: str -- relative path of file or folder
+        :return: None
+        """
+        self.move_detector.forget(path)
+        if self.size_policy is not None:
+            self.size_policy.release(path)
+
+    def init_merkle_tree(self):
+        merkle_tree = MerkleTree()
+        skipped_files = set()
+        for path in self.iter_sync_files():
+            if self.is_skipped(path):
+                skipped_files.add(path)
+                continue
+            merkle_tree.update_file(path, get_manifest_value(
+                os.path.join(self.src_path, path)
+            ))
+        with self.merkle_lock:
+            self.skipped_files = skipped_files
+        self.merkle_tree = merkle_tree
+
+    def refresh_merkle_tree(self, path):
+        """Update the merkle tree after the path is synced
+
+        :param path: str -- the path of file or folder from event
+        :return: None
+        """
+        merkle_tree = self.merkle_tree
+        if merkle_tree is None:
+            return
+        relative_path = self.get_relative_src_path(path).rstrip("/")
+        abs_path = os.path.abspath(path)
+        files, skipped_files, is_file = [], [], False
+        if os.path.isdir(abs_path):
+            for file_path in self.iter_sync_files(path):
+                if self.is_skipped(file_path):
+                    skipped_files.append(file_path)
+                else:
+                    files.append((file_path, get_manifest_value(
+                        os.path.join(self.src_path, file_path)
+                    )))
+        elif os.path.isfile(abs_path):
+            is_file = True
+            is_ignored = self.is_ignore(abs_path, False)
+            is_skipped = self.is_skipped(relative_path)
+            value = get_manifest_value(abs_path)
+        with self.merkle_lock:
+            # A file listed by git index is kept even if it's ignored
+            if is_file and (not is_ignored or (
+                self.git_index_enabled and
+                (relative_path in self.skipped_files or
+                 list(merkle_tree.iter_files(relative_path)) ==
+                 [relative_path])
+            )):
+                if is_skipped:
+                    skipped_files = [relative_path]
+                else:
+                    files = [(relative_path, value)]
+            merkle_tree.remove(relative_path)
+            self.skipped_files = set(
+                file_path for file_path in self.skipped_files
+                if file_path != relative_path and
+                not file_path.startswith(relative_path + "/")
+            )
+            self.skipped_files.update(skipped_files)
+            for file_path, value in files:
+                merkle_tree.update_file(file_path, value)
+
+    def get_ignore_rules(self):
+        """Get all ignore patterns relative to the source path, from the
+        nearest `.gitignore`
+
+        :return: list of tuple -- (relative folder of `.gitignore`,
+                                   list of negate ignore glob,
+                                   list of ignore glob)
+        """
+        abs_src_path = os.path.join(os.path.abspath(self.src_path), "")
+        _, gitignore_list, gitignore_dict = self.copy_ignore_rules()
+        return [
+            (gitignore_folder_path[len(abs_src_path):],
+             gitignore_dict[gitignore_folder_path + ".gitignore"][2].globs,
+             gitignore_dict[gitignore_folder_path + ".gitignore"][3].globs)
+            for gitignore_folder_path in gitignore_list
+        ]
+
+    def get_git_exceptions(self):
+        """Get the exceptions to the ignore rules when the files are listed
+        from git index, the tracked files are listed even if they're
+        ignored, and git ignores more by `.git/info/exclude` and the global
+        excludes
+
+        :return: tuple -- (list of relative path of files to include, list
+                           of relative path of files or folders to exclude,
+                           a folder ends with "/")
+        """
+        if not self.git_index_enabled:
+            return [], []
+        ignored_files = git_ignored_files(self.src_path)
+        if ignored_files is None:
+            return [], []
+        abs_src_path = os.path.abspath(self.src_path)
+        return ignored_files[0], [
+            path for path in ignored_files[1]
+            if not self.is_ignore(os.path.join(abs_src_path, path),
+                                  path.endswith("/"))
+        ]
+
+    def reconcile_merkle_tree(self):
+        """Compare the root hash of local and remote merkle tree, descend
+        only into the different folders, and sync the differences
+
+        :return: None
+        """
+        includes, excludes = self.get_git_exceptions()
+        with self.merkle_lock:
+            excludes = list(excludes) + sorted(self.skipped_files)
+        remote_tree = self.transport.merkle_tree(
+            self.dst_path, self.get_ignore_rules(), includes=includes,
+            excludes=excludes
+        )
+        _rsync_file_list, _rm_file_list = [], []
+        is_succeeded = False
+        try:
+            if remote_tree.is_failed:
+                return
+            with self.merkle_lock:
+                root_hash = self.merkle_tree.get_hash()
+            if remote_tree.root_hash == root_hash:
+                return
+            folders = [""]
+            while folders:
+                _folders = []
+                for folder, remote_children in zip(
+                    folders, remote_tree.get_children(folders)
+                ):
+                    with self.merkle_lock:
+                        local_children = self.merkle_tree.get_children(
+                            folder
+                        )
+                    for name in set(local_children) | set(remote_children):
+                        local_child = local_children.get(name)
+                        remote_child = remote_children.get(name)
+                        if local_child == remote_child:
+                            continue
+                        path = join_path(folder, name)
+                        if (local_child and remote_child and
+                                local_child[0] == remote_child[0] == "d"):
+                            _folders.append(path)
+                            continue
+                        if remote_child and (
+                            not local_child or
+                            local_child[0] != remote_child[0]
+                        ):
+                            _rm_file_list.append(
+                                os.path.join(self.dst_path, path)
+                            )
+                        if local_child:
+                            with self.merkle_lock:
+                                _rsync_file_list.extend(
+                                    self.merkle_tree.iter_files(path)
+                                )
+                folders = _folders
+        finally:
+            is_succeeded = remote_tree.close()
+            if not is_succeeded:
+                logger.error("Failed to build the remote merkle tree of {}, "
+                             "skip this reconcile".format(self.dst_path))
+        if not is_succeeded:
+            return
+        self.sync_differences(_rsync_file_list, _rm_file_list,
+                              bwlimit=self.bulk_bwlimit)
+
+    def reconcile_if_due(self):
+        if (self.merkle_tree is None or self.is_reconciling or
+                self.is_offline() or
+                self.clock.time() - self.last_reconcile_time <
+                self.reconcile_interval):
+            return
+        self.is_reconciling = True
+        self.scheduler.submit(BULK, self.reconcile)
+
+    def reconcile(self):
+        logger.info("Starting to reconcile the file remotely")
+        try:
+            self.reconcile_merkle_tree()
+        finally:
+            self.is_reconciling = False
+            self.last_reconcile_time = self.clock.time()
+
+    def is_offline(self):
+        return self.journal is not None and self.transport.is_offline
+
+    def reconnect_if_due(self):
+        if (not self.is_offline() or self.is_replaying or
+                self.clock.time() < self.next_reconnect_time):
+            return
+        self.is_replaying = True
+        self.scheduler.submit(BULK, self.replay_journal)
+
+    def replay_journal(self):
+        """Replay the journal as one batched sync if the remote is
+        reachable, otherwise check it again later with backoff
+
+        :return: None
+        """
+        try:
+            if not self.transport.is_reachable(self.dst_path):
+                self.reconnect_retries += 1
+                delay = min(2 ** self.reconnect_retries, 300)
+                self.next_reconnect_time = self.clock.time() + delay
+                logger.info("Remote is still unreachable, check it again in "
+                            "{}s".format(delay))
+                return
+            self.reconnect_retries = 0
+            entries, last_seq = self.journal.get_entries()
+            logger.info("Remote is reachable again, sync {} journaled "
+                        "paths".format(len(entries)))
+            # The paths failed again are journaled again after `last_seq`
+            self.transport.is_offline = False
+            paths = [path for path, operation in entries.items()
+                     if operation != "create"]
+            # A folder is created anyway by syncing a path under it
+            covered_folders = set(
+                folder for path in paths
+                for folder in list(iter_self_and_ancestors(path))[1:]
+            )
+            for path, operation in sorted(entries.items()):
+                if (operation == "create" and path not in covered_folders and
+                        os.path.isdir(os.path.join(self.src_path, path))):
+                    self.transport.create_folder(
+                        dst_path=os.path.join(self.dst_path, path)
+                    )
+            self.sync_paths(paths, bwlimit=self.bulk_bwlimit)
+            self.journal.clear(last_seq)
+        finally:
+            self.is_replaying = False
 
     def is_ignore(self, file_or_dir_path, isdir):
-        if isdir and not file_or_dir_path.endswith("/"):
-            file_or_dir_path += "/"
-        if file_or_dir_path.startswith(self.git_path):
-            return True
-        for gitignore_folder_path in self.gitignore_list:
-            gitignore_path = gitignore_folder_path + ".gitignore"
-            if file_or_dir_path.startswith(gitignore_folder_path):
-                _relative_file_or_dir_path = (
-                    file_or_dir_path[len(gitignore_folder_path):]
-                )
-                for _re in self.gitignore_dict[gitignore_path][2]:
-                    if _re.match(_relative_file_or_dir_path):
-                        return False
-                for _re in self.gitignore_dict[gitignore_path][3]:
-                    if _re.match(_relative_file_or_dir_path):
-                        return True
-        return False
+        with self.ignore_lock:
+            gitignore_list = self.gitignore_list
+            gitignore_dict = self.gitignore_dict
+        return match_ignore(file_or_dir_path, isdir, self.git_path,
+                            gitignore_list, gitignore_dict)
 
     def init_gitignore(self, src_path):
         logger.info("Loading ignore pattern from all `.gitignore`")
-        gitignore_list = walk_get_gitignore(src_path)
-        self.gitignore_dict = get_all_re(gitignore_list)
+        if self.startup_cache is None:
+            _gitignore_dict = get_all_re(walk_get_gitignore(src_path))
+        else:
+            _gitignore_dict = self.startup_cache.get_gitignore_re(src_path)
         # Match file or folder from the nearest `.gitignore`
-        _gitignore_list = sorted(self.gitignore_dict.keys())[::-1]
+        _gitignore_list = sorted(_gitignore_dict.keys())[::-1]
         for index in range(len(_gitignore_list)):
             # Change '/test/.gitignore' to '/test/'
             _gitignore_list[index] = _gitignore_list[index][:-10]
-        self.gitignore_list = _gitignore_list
+        with self.ignore_lock:
+            self.gitignore_dict = _gitignore_dict
+            self.gitignore_list = _gitignore_list
         logger.info("All ignore pattern has been loaded")
 
     def update_gitignore(self, gitignore_path):
         _re_dict = get_all_re([gitignore_path])
-        self.gitignore_dict.update(_re_dict)
-        self.gitignore_list.append(gitignore_path[:-10])
-        self.gitignore_list = sorted(self.gitignore_list)[::-1]
+        with self.ignore_lock:
+            old_rules = (self.git_path, self.gitignore_list,
+                         self.gitignore_dict)
+            _gitignore_dict = dict(self.gitignore_dict)
+            _gitignore_dict.update(_re_dict)
+            _gitignore_list = self.gitignore_list
+            if gitignore_path[:-10] not in _gitignore_list:
+                _gitignore_list = sorted(
+                    _gitignore_list + [gitignore_path[:-10]]
+                )[::-1]
+            self.gitignore_dict = _gitignore_dict
+            self.gitignore_list = _gitignore_list
+        self.reapply_gitignore(gitignore_path, old_rules)
 
     def del_gitignore(self, gitignore_path):
-        del self.gitignore_dict[gitignore_path]
-        self.gitignore_list.remove(gitignore_path[:-10])
+        with self.ignore_lock:
+            old_rules = (self.git_path, self.gitignore_list,
+                         self.gitignore_dict)
+            self.gitignore_dict = dict(
+                (path, value) for path, value in self.gitignore_dict.items()
+                if path != gitignore_path
+            )
+            self.gitignore_list = [
+                path for path in self.gitignore_list
+                if path != gitignore_path[:-10]
+            ]
+        self.reapply_gitignore(gitignore_path, old_rules)
+
+    def copy_ignore_rules(self):
+        """Copy the current ignore rules
+
+        :return: tuple -- the arguments of `utils.match_ignore` after the
+                          path and isdir
+        """
+        with self.ignore_lock:
+            return (self.git_path, list(self.gitignore_list),
+                    dict(self.gitignore_dict))
+
+    def reapply_gitignore(self, gitignore_path, old_rules):
+        """Sync the paths whose verdict is flipped by a changed
+        `.gitignore` in one batch, only the folder of `.gitignore` is
+        walked, and the folders ignored by both old and new rules are
+        pruned
+
+        :param gitignore_path: str -- the absolute path of `.gitignore`
+        :param old_rules: tuple -- the result of `copy_ignore_rules` before
+                                   the change
+        :return: None
+        """
+        new_rules = self.copy_ignore_rules()
+        old_re = old_rules[2].get(gitignore_path)
+        new_re = new_rules[2].get(gitignore_path)
+        if (old_re is not None and new_re is not None and
+                old_re[2] == new_re[2] and old_re[3] == new_re[3]):
+            return
+        abs_src_path = os.path.abspath(self.src_path)
+        _rsync_file_list, _rm_file_list, flipped_paths = [], [], []
+        # Folders to walk, and whether they're ignored by old and new rules
+        pending_folders = [(gitignore_path[:-10], False, False)]
+        while pending_folders:
+            folder_path, old_ignored, new_ignored = pending_folders.pop()
+            try:
+                names = os.listdir(folder_path)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(folder_path, name)
+                isdir = os.path.isdir(path)
+                if isdir and os.path.islink(path):
+                    # Like `os.walk`, the linked folders are not followed
+                    continue
+                _old_ignored = old_ignored or match_ignore(path, isdir,
+                                                           *old_rules)
+                _new_ignored = new_ignored or match_ignore(path, isdir,
+                                                           *new_rules)
+                if _old_ignored and _new_ignored:
+                    continue
+                relative_path = get_relative_path(abs_src_path, path)
+                if _new_ignored:
+                    _rm_file_list.append(os.path.join(self.dst_path,
+                                                      relative_path))
+                    flipped_paths.append(path)
+                elif isdir:
+                    pending_folders.append((path, _old_ignored,
+                                            _new_ignored))
+                elif _old_ignored:
+                    _rsync_file_list.append(relative_path)
+                    flipped_paths.append(path)
+        if not flipped_paths:
+            return
+        logger.info("Ignore pattern of {0} changed, {1} paths are ignored "
+                    "and {2} files are not ignored any more".format(
+                        gitignore_path, len(_rm_file_list),
+                        len(_rsync_file_list)
+                    ))
+        self.sync_differences(sorted(_rsync_file_list), _rm_file_list)
+        for path in flipped_paths:
+            self.refresh_merkle_tree(path)
 
     def get_relative_src_path(self, path):
         _src_path = (self.src_path if self.src_path.endswith("/")
@@ -99,6 +805,276 @@ class SpecchioEventHandler(FileSystemEventHandler):
         ret = path[len(_src_path):]
         return "" if ret == "." else ret
 
+    def get_event_paths(self, event):
+        paths = [event.src_path]
+        if hasattr(event, "dest_path"):
+            paths.append(event.dest_path)
+        return paths
+
+    def get_changed_paths(self, event):
+        """Get the paths to sync after a git operation, a modified folder
+        is skipped, because syncing it would send all files under it
+
+        :param event: FileSystemEvent -- the event
+        :return: list of str -- relative path of files or folders
+        """
+        if event.is_directory and event.event_type == EVENT_TYPE_MODIFIED:
+            return []
+        return [self.get_relative_src_path(path)
+                for path in self.get_event_paths(event)]
+
+    def dispatch(self, event):
+        if self.trace_recorder is not None:
+            self.trace_recorder.record(event)
+        with self.pending_events_lock:
+            abs_src_path = os.path.abspath(event.src_path)
+            if self.git_state_monitor.is_git_path(abs_src_path):
+                self.git_state_monitor.on_git_event(abs_src_path)
+                return
+            if self.git_state_monitor.is_running:
+                # Pause during a git operation, only collect the paths
+                for path in self.get_changed_paths(event):
+                    self.git_state_monitor.add_path(path)
+                return
+            is_storm = self.storm_detector.is_storm
+            if not self.storm_detector.record(len(self.pending_events) + 1):
+                self.pending_events.append(event)
+                return
+            if not is_storm:
+                logger.warning("Too many events, stop handling events one "
+                               "by one until activity settles")
+            # Only mark the folders dirty during a storm
+            for _event in self.pending_events + [event]:
+                self.storm_detector.mark_dirty(self.get_event_paths(_event))
+            self.pending_events = []
+
+    def flush(self):
+        """Schedule all pending events as a window, the window is compacted
+        by `compact_events`, a delete and a create of the same file are
+        paired into a remote move by `MoveDetector`, and the remaining
+        deletes are batched
+
+        If a storm has settled, resync all dirty folders in one batch in the
+        background. If a git operation has been done, sync the files changed
+        by git with the paths of pending events in one batch.
+
+        :return: None
+        """
+        # The events popped by one flush are submitted before another
+        # flush starts, so `wait_synced` can rely on the sequence number.
+        # Only the tasks from events are tracked
+        with self.flush_lock:
+            if self.trace_recorder is not None:
+                self.trace_recorder.flush()
+            with self.pending_events_lock:
+                events, self.pending_events = self.pending_events, []
+                dirty_folders = self.storm_detector.pop_dirty_folders()
+            # Git runs without blocking `dispatch` of the observer
+            git_changes = self.git_state_monitor.poll(
+                path for event in events
+                for path in self.get_changed_paths(event)
+            )
+            if dirty_folders:
+                self.scheduler.submit(BULK, self.resync_folders,
+                                      dirty_folders, is_tracked=True)
+            # The paths of events are synced with the git changes, only the
+            # deletes held from the last window are left
+            moves, events = self.move_detector.pair(
+                compact_events(events) if git_changes is None else []
+            )
+            if moves:
+                self.scheduler.submit(INTERACTIVE, self.move_files, moves,
+                                      is_tracked=True)
+            if git_changes is not None:
+                if events:
+                    self.scheduler.submit(INTERACTIVE,
+                                          self.on_deleted_multi, events,
+                                          is_tracked=True)
+                self.scheduler.submit(INTERACTIVE, self.sync_git_changes,
+                                      *git_changes, is_tracked=True)
+                return
+            deleted_events = []
+            for event in events:
+                if event.event_type == EVENT_TYPE_DELETED:
+                    deleted_events.append(event)
+                    continue
+                if deleted_events:
+                    self.scheduler.submit(INTERACTIVE,
+                                          self.on_deleted_multi,
+                                          deleted_events, is_tracked=True)
+                    deleted_events = []
+                self.scheduler.submit(
+                    self.get_event_priority(event),
+                    super(SpecchioEventHandler, self).dispatch, event,
+                    is_tracked=True
+                )
+            if deleted_events:
+                self.scheduler.submit(INTERACTIVE, self.on_deleted_multi,
+                                      deleted_events, is_tracked=True)
+
+    def wait_synced(self, timeout):
+        """Wait until all events observed before have been applied
+        remotely, the pending events are flushed at once, and a storm, a
+        git operation or the deletes held to detect moves are waited to
+        settle first
+
+        :param timeout: float -- max seconds to wait
+        :return: bool -- False if it times out, or the changes are journaled
+                         because the remote is unreachable
+        """
+        deadline = self.clock.time() + timeout
+        while True:
+            self.flush()
+            if not (self.storm_detector.is_storm or
+                    self.git_state_monitor.is_running or
+                    self.move_detector.held_events):
+                break
+            if self.clock.time() >= deadline:
+                return False
+            self.clock.sleep(0.1)
+        # The tasks of all flushed events are submitted up to here, the
+        # background work like a reconcile isn't waited
+        if not self.scheduler.wait(self.scheduler.seq,
+                                   max(0, deadline - self.clock.time())):
+            return False
+        if self.large_file_lane is not None and not (
+            self.large_file_lane.wait(max(0, deadline - self.clock.time()))
+        ):
+            return False
+        return not self.is_offline()
+
+    def is_tracked_task(self):
+        """Check whether the current task is from events, then the large
+        files it queues are waited by `wait_synced`
+
+        :return: bool
+        """
+        return self.scheduler.get_current_seq() is not None
+
+    def get_event_priority(self, event):
+        if any(path.split("/")[-1] == ".gitignore"
+               for path in self.get_event_paths(event)):
+            return GITIGNORE
+        return INTERACTIVE
+
+    def resync_folders(self, folder_paths):
+        """Reload all ignore pattern, and sync multiple folders by
+        comparing one remote listing of them
+
+        :param folder_paths: list of str -- the path of folders
+        :return: None
+        """
+        logger.info("Activity settled, resync {} folders".format(
+            len(folder_paths)
+        ))
+        # `.gitignore` may be changed during the storm
+        self.init_gitignore(self.src_path)
+        self.verify_remote(folder_paths=[
+            self.get_relative_src_path(os.path.join(folder_path, ""))
+            .rstrip("/") for folder_path in folder_paths
+        ])
+        for folder_path in folder_paths:
+            self.refresh_merkle_tree(folder_path)
+
+    def sync_git_changes(self, paths, is_overflow):
+        """Sync the paths changed by a git operation in one batch
+
+        :param paths: set of str -- relative path of files or folders
+        :param is_overflow: bool -- too many paths to collect, resync the
+                                    whole source path instead
+        :return: None
+        """
+        if is_overflow:
+            logger.info("Git operation has been done, too many paths changed")
+            self.scheduler.submit(BULK, self.resync_folders, [self.src_path])
+            return
+        logger.info("Git operation has been done, sync {} changed "
+                    "paths".format(len(paths)))
+        if any(path.split("/")[-1] == ".gitignore" for path in paths):
+            self.init_gitignore(self.src_path)
+        self.sync_paths(paths)
+        for path in paths:
+            self.refresh_merkle_tree(os.path.join(self.src_path, path))
+
+    def sync_paths(self, paths, bwlimit=None, use_large_file_lane=True):
+        """Sync multiple paths by the latest state of them in one batch,
+        the paths which don't exist any more are removed remotely
+
+        :param paths: iterable of str -- relative path of files or folders
+        :param bwlimit: int -- bandwidth limit in KB/s, None is unlimited
+        :param use_large_file_lane: bool -- False to send the large files
+                                            with the others
+        :return: bool -- same as `sync_differences`
+        """
+        _rsync_file_index, _rm_file_list = FileIndex(), []
+        for path in sorted(paths):
+            src_path = os.path.join(self.src_path, path)
+            abs_src_path = os.path.abspath(src_path)
+            if os.path.isdir(abs_src_path):
+                for file_path in self.iter_sync_files(src_path):
+                    _rsync_file_index.add(file_path)
+            elif self.is_ignore(abs_src_path, False):
+                continue
+            elif os.path.lexists(abs_src_path):
+                _rsync_file_index.add(path)
+            else:
+                _rm_file_list.append(os.path.join(self.dst_path, path))
+        return self.sync_differences(
+            list(_rsync_file_index), _rm_file_list, bwlimit=bwlimit,
+            use_large_file_lane=use_large_file_lane
+        )
+
+    def sync_now(self, paths):
+        """Sync the paths requested by the push API in one batch, the large
+        files are sent with the others instead of the large file lane, so
+        the remote has applied all paths when it returns
+
+        :param paths: list of str -- relative path of files or folders
+        :return: bool -- whether the remote has applied all paths
+        """
+        logger.info("Sync {} pushed paths".format(len(paths)))
+        # Like the events, only the paths flipped by `.gitignore` are synced
+        for path in paths:
+            if path.split("/")[-1] != ".gitignore":
+                continue
+            abs_src_path = os.path.abspath(os.path.join(self.src_path, path))
+            if os.path.isfile(abs_src_path):
+                self.update_gitignore(abs_src_path)
+            else:
+                self.del_gitignore(abs_src_path)
+        is_succeeded = self.sync_paths(paths, use_large_file_lane=False)
+        for path in paths:
+            self.refresh_merkle_tree(os.path.join(self.src_path, path))
+        # The paths are only journaled when the remote is unreachable
+        return bool(is_succeeded) and not self.is_offline()
+
+    def rsync_file(self, abs_src_path, dst_path):
+        """Rsync a file remotely, the large file is queued in the large file
+        lane instead
+
+        :param abs_src_path: str -- the absolute path of file
+        :param dst_path: str -- destination of file
+        :return: None
+        """
+        if self.size_policy is not None:
+            path = get_relative_path(self.src_path, abs_src_path)
+            action = self.check_size_policy(path)
+            if action == DEFER:
+                self.scheduler.submit(BULK, self.send_deferred, [path])
+            if action is not None:
+                return
+        if self.large_file_lane and self.large_file_lane.is_large(
+            abs_src_path
+        ):
+            logger.info("Queue large file {} to rsync".format(dst_path),
+                        extra={"summary": "queued {} large files"})
+            self.large_file_lane.submit(abs_src_path, dst_path,
+                                        is_tracked=self.is_tracked_task())
+            return
+        logger.info("Rsync {} remotely".format(dst_path),
+                    extra={"summary": "synced {} files"})
+        self.transport.send_file(src_path=abs_src_path, dst_path=dst_path)
+
     def on_created(self, event):
         abs_src_path = os.path.abspath(event.src_path)
         isdir = isinstance(event, DirCreatedEvent)
@@ -107,17 +1083,17 @@ class SpecchioEventHandler(FileSystemEventHandler):
         relative_path = self.get_relative_src_path(event.src_path)
         dst_path = os.path.join(self.dst_path, relative_path)
         if isinstance(event, DirCreatedEvent):
-            logger.info("Create {} remotely".format(dst_path))
-            remote_create_folder(dst_ssh=self.dst_ssh, dst_path=dst_path)
+            logger.info("Create {} remotely".format(dst_path),
+                        extra={"summary": "created {} folders"})
+            self.transport.create_folder(dst_path=dst_path)
         else:
             dst_path = os.path.join(self.dst_path, relative_path)
             # Create folder of file
             dst_folder_path = dst_path[:-len(dst_path.split("/")[-1])]
-            remote_create_folder(dst_ssh=self.dst_ssh,
-                                 dst_path=dst_folder_path)
-            logger.info("Rsync {} remotely".format(dst_path))
-            rsync(dst_ssh=self.dst_ssh, src_path=abs_src_path,
-                  dst_path=dst_path)
+            self.transport.create_folder(dst_path=dst_folder_path)
+            self.rsync_file(abs_src_path, dst_path)
+            self.move_detector.record(relative_path)
+            self.refresh_merkle_tree(event.src_path)
             if dst_path.split("/")[-1] == ".gitignore":
                 logger.info("Update ignore pattern, because changed "
                             "file({}) named `.gitignore` locally".format(
@@ -142,11 +1118,10 @@ class SpecchioEventHandler(FileSystemEventHandler):
                                 abs_src_path
                             ))
                 self.update_gitignore(abs_src_path)
-            remote_create_folder(dst_ssh=self.dst_ssh,
-                                 dst_path=dst_folder_path)
-            logger.info("Rsync {} remotely".format(dst_path))
-            rsync(dst_ssh=self.dst_ssh, src_path=abs_src_path,
-                  dst_path=dst_path)
+            self.transport.create_folder(dst_path=dst_folder_path)
+            self.rsync_file(abs_src_path, dst_path)
+            self.move_detector.record(relative_path)
+            self.refresh_merkle_tree(event.src_path)
 
     def on_deleted(self, event):
         abs_src_path = os.path.abspath(event.src_path)
@@ -162,8 +1137,39 @@ class SpecchioEventHandler(FileSystemEventHandler):
                             abs_src_path
                         ))
             self.del_gitignore(abs_src_path)
-        logger.info("Remove {} remotely".format(dst_path))
-        remote_rm(dst_ssh=self.dst_ssh, dst_path=dst_path)
+        logger.info("Remove {} remotely".format(dst_path),
+                    extra={"summary": "removed {} paths"})
+        self.transport.remove(dst_path=dst_path)
+        self.release_path(relative_path)
+        self.refresh_merkle_tree(event.src_path)
+
+    def on_deleted_multi(self, events):
+        if len(events) <= 1:
+            for event in events:
+                self.on_deleted(event)
+            return
+        dst_paths = []
+        for event in events:
+            abs_src_path = os.path.abspath(event.src_path)
+            isdir = isinstance(event, DirDeletedEvent)
+            if self.is_ignore(abs_src_path, isdir):
+                continue
+            # Remove all `.gitignore` in dict and list under the path
+            for gitignore_path in self.copy_ignore_rules()[2]:
+                if (gitignore_path == abs_src_path or
+                        gitignore_path.startswith(abs_src_path + "/")):
+                    logger.info("Remove some ignore pattern, because "
+                                "removed file({}) named `.gitignore` "
+                                "locally".format(gitignore_path))
+                    self.del_gitignore(gitignore_path)
+            relative_path = self.get_relative_src_path(event.src_path)
+            dst_paths.append(os.path.join(self.dst_path, relative_path))
+            self.release_path(relative_path)
+        if dst_paths:
+            logger.info("Remove {} paths remotely".format(len(dst_paths)))
+            self.transport.remove_multi(dst_paths=dst_paths)
+        for event in events:
+            self.refresh_merkle_tree(event.src_path)
 
     def on_moved(self, event):
         isdir = isinstance(event, DirMovedEvent)
@@ -179,21 +1185,57 @@ class SpecchioEventHandler(FileSystemEventHandler):
         dst_dst_path = os.path.join(self.dst_path, relative_dst_path)
         if src_ignore_tag and dst_ignore_tag:
             return
-        elif dst_ignore_tag:
-            remote_rm(dst_ssh=self.dst_ssh, dst_path=dst_src_path)
-            logger.info("Remove {} remotely".format(dst_src_path))
+        if src_ignore_tag or dst_ignore_tag:
+            self.release_path(relative_src_path)
+        else:
+            self.move_detector.move(relative_src_path, relative_dst_path)
+        if dst_ignore_tag:
+            self.transport.remove(dst_path=dst_src_path)
+            logger.info("Remove {} remotely".format(dst_src_path),
+                        extra={"summary": "removed {} paths"})
+        elif src_ignore_tag and isdir:
+            # Only the files not ignored in the folder are synced
+            self.sync_paths([relative_dst_path])
         elif src_ignore_tag:
             dst_folder_path = dst_dst_path[:-len(dst_dst_path.split("/")[-1])]
-            remote_create_folder(dst_ssh=self.dst_ssh,
-                                 dst_path=dst_folder_path)
-            rsync(dst_ssh=self.dst_ssh, src_path=abs_src_dst_path,
-                  dst_path=dst_dst_path)
-            logger.info("Rsync {} remotely".format(dst_dst_path))
+            self.transport.create_folder(dst_path=dst_folder_path)
+            self.rsync_file(abs_src_dst_path, dst_dst_path)
         else:
-            remote_mv(dst_ssh=self.dst_ssh, src_path=dst_src_path,
-                      dst_path=dst_dst_path)
+            self.transport.move(src_path=dst_src_path,
+                                dst_path=dst_dst_path)
             logger.info("Move {} to {} remotely".format(
                 dst_src_path, dst_dst_path
-            ))
-        logger.info("Because of move method, try to update all ignore pattern")
+            ), extra={"summary": "moved {} paths"})
+        logger.info("Because of move method, try to update all ignore pattern",
+                    extra={"summary": "reloaded ignore pattern {} times"})
         self.init_gitignore(self.src_path)
+        self.refresh_merkle_tree(event.src_path)
+        self.refresh_merkle_tree(event.dest_path)
+
+    def move_files(self, moves):
+        """Move the files paired by `MoveDetector` remotely, a changed file
+        is synced by its own event after the move, which only sends the
+        difference
+
+        :param moves: list of tuple -- (relative source path, relative
+                                        destination path, whether the file
+                                        is changed)
+        :return: None
+        """
+        for src_path, dst_path, is_changed in moves:
+            dst_src_path = os.path.join(self.dst_path, src_path)
+            dst_dst_path = os.path.join(self.dst_path, dst_path)
+            self.transport.create_folder(
+                dst_path=os.path.dirname(dst_dst_path)
+            )
+            if self.transport.move(src_path=dst_src_path,
+                                   dst_path=dst_dst_path):
+                logger.info("Move {0} to {1} remotely".format(
+                    dst_src_path, dst_dst_path
+                ), extra={"summary": "moved {} paths"})
+            elif not is_changed:
+                # Like the file is missing remotely, send it instead
+                self.rsync_file(os.path.join(os.path.abspath(self.src_path),
+                                             dst_path), dst_dst_path)
+            self.refresh_merkle_tree(os.path.join(self.src_path, src_path))
+            self.refresh_merkle_tree(os.path.join(self.src_path, dst_path))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import marshal
+import os
+import threading
+
+from specchio.cache import DEFAULT_CACHE_FOLDER
+from specchio.utils import get_relative_path, logger
+
+
+def get_journal_path(src_path, dst, cache_folder=DEFAULT_CACHE_FOLDER):
+    """Get the path of journal, one journal for each source and
+    destination
+
+    :param src_path: str -- source path
+    :param dst: str -- destination, like user@host:dst/
+    :param cache_folder: str -- the folder of journal files
+    :return: str -- the path of journal
+    """
+    return os.path.join(
+        os.path.expanduser(cache_folder),
+        hashlib.sha1(os.path.abspath(src_path) + "\0" + dst).hexdigest() +
+        ".journal"
+    )
+
+
+class OperationJournal(object):
+
+    def __init__(self, journal_path, max_records=1000):
+        """Constructor of `OperationJournal`, the paths of the operations
+        which failed to run are appended to a local file, one record per
+        path like (sequence number, operation, relative path)
+
+        Only the latest record of a path is kept in memory, and the file is
+        compacted when it has much more records than paths, or when it's
+        opened, so a broken record at the end is dropped.
+
+        :param journal_path: str -- the path of journal file
+        :param max_records: int -- min number of records to compact
+        :return: None
+        """
+        self.journal_path = journal_path
+        self.max_records = max_records
+        # The relative path is the key, the value is a tuple like
+        # (sequence number, operation)
+        self.entries = {}
+        self.record_count = 0
+        self.last_seq = 0
+        self.lock = threading.Lock()
+        self.journal_file = None
+        self.load()
+        self.compact()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        try:
+            journal_file = open(self.journal_path, "rb")
+        except IOError:
+            return
+        with journal_file:
+            while True:
+                try:
+                    seq, operation, path = marshal.load(journal_file)
+                except (EOFError, TypeError, ValueError):
+                    break
+                self.entries[path] = (seq, operation)
+                self.last_seq = max(self.last_seq, seq)
+
+    def compact(self):
+        """Rewrite the journal file with the latest record of each path
+
+        :return: None
+        """
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+        tmp_path = self.journal_path + ".tmp"
+        try:
+            if not os.path.isdir(os.path.dirname(self.journal_path)):
+                os.makedirs(os.path.dirname(self.journal_path))
+            with open(tmp_path, "wb") as journal_file:
+                for path, (seq, operation) in sorted(
+                    self.entries.items(), key=lambda item: item[1][0]
+                ):
+                    marshal.dump((seq, operation, path), journal_file)
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.rename(tmp_path, self.journal_path)
+            self.journal_file = open(self.journal_path, "ab")
+        except (IOError, OSError):
+            logger.warning("Failed to write the journal to {}".format(
+                self.journal_path
+            ))
+        self.record_count = len(self.entries)
+
+    def append(self, operation, paths):
+        """Append the paths of a failed operation, the file is synced to
+        disk before it returns
+
+        :param operation: str -- "sync", "remove" or "create" of a folder
+        :param paths: list of str -- relative path of files or folders
+        :return: None
+        """
+        with self.lock:
+            for path in paths:
+                self.last_seq += 1
+                self.entries[path] = (self.last_seq, operation)
+                if self.journal_file is not None:
+                    marshal.dump((self.last_seq, operation, path),
+                                 self.journal_file)
+                self.record_count += 1
+            if self.record_count > max(self.max_records,
+                                       len(self.entries) * 2):
+                self.compact()
+            elif self.journal_file is not None:
+                try:
+                    self.journal_file.flush()
+                    os.fsync(self.journal_file.fileno())
+                except (IOError, OSError):
+                    logger.warning("Failed to write the journal to "
+                                   "{}".format(self.journal_path))
+
+    def get_entries(self):
+        """Get the latest operation of each path
+
+        :return: tuple -- (dict of the relative path and the operation,
+                           the last sequence number)
+        """
+        with self.lock:
+            return (dict((path, operation)
+                         for path, (_, operation) in self.entries.items()),
+                    self.last_seq)
+
+    def clear(self, last_seq):
+        """Remove the records replayed, the paths appended again after them
+        are kept
+
+        :param last_seq: int -- the last sequence number of replayed records
+        :return: None
+        """
+        with self.lock:
+            self.entries = dict(
+                (path, entry) for path, entry in self.entries.items()
+                if entry[0] > last_seq
+            )
+            self.compact()
+
+    def close(self):
+        with self.lock:
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+
+
+class JournaledTransport(object):
+
+    def __init__(self, transport, journal, dst_path):
+        """Constructor of `JournaledTransport`, wrap a transport, the paths
+        of a failed operation are appended to the journal and the transport
+        is offline, then all operations are journaled without running,
+        until the journal is replayed
+
+        :param transport: object -- the transport to wrap
+        :param journal: `OperationJournal` -- the journal
+        :param dst_path: str -- destination path of the handler
+        :return: None
+        """
+        self.transport = transport
+        self.journal = journal
+        self.dst_path = dst_path
+        # A journal left by the last run is replayed first
+        self.is_offline = len(journal) > 0
+
+    def __getattr__(self, name):
+        # The methods which only read the destination
+        return getattr(self.transport, name)
+
+    def run(self, name, operation, paths, **kwargs):
+        """Run a method of the transport, or journal the paths if it's
+        offline
+
+        :param name: str -- the name of method
+        :param operation: str -- "sync", "remove" or "create" of a folder
+        :param paths: list of str -- relative path of files or folders
+        :return: bool -- whether it succeeds or is journaled
+        """
+        if not self.is_offline:
+            if getattr(self.transport, name)(**kwargs):
+                return True
+            # Like a file removed before it's sent
+            if self.transport.is_reachable(self.dst_path):
+                return False
+            logger.warning("Remote is unreachable, journal the changes "
+                           "until it's back")
+            self.is_offline = True
+        self.journal.append(operation, paths)
+        return True
+
+    def get_paths(self, dst_paths):
+        return [get_relative_path(self.dst_path, dst_path)
+                for dst_path in dst_paths]
+
+    def create_folder(self, dst_path):
+        # Only the folder itself is created, not synced with its files
+        return self.run("create_folder", "create",
+                        self.get_paths([dst_path]), dst_path=dst_path)
+
+    def remove(self, dst_path):
+        return self.run("remove", "remove", self.get_paths([dst_path]),
+                        dst_path=dst_path)
+
+    def remove_multi(self, dst_paths):
+        if not dst_paths:
+            return True
+        return self.run("remove_multi", "remove", self.get_paths(dst_paths),
+                        dst_paths=dst_paths)
+
+    def move(self, src_path, dst_path):
+        # Both paths are synced by the latest state of them
+        return self.run("move", "sync",
+                        self.get_paths([src_path, dst_path]),
+                        src_path=src_path, dst_path=dst_path)
+
+    def send_file(self, src_path, dst_path):
+        return self.run("send_file", "sync", self.get_paths([dst_path]),
+                        src_path=src_path, dst_path=dst_path)
+
+    def send_large_file(self, src_path, dst_path, bwlimit=None,
+                        is_resumed=False):
+        return self.run("send_large_file", "sync",
+                        self.get_paths([dst_path]), src_path=src_path,
+                        dst_path=dst_path, bwlimit=bwlimit,
+                        is_resumed=is_resumed)
+
+    def send_files(self, folder_path, src_paths, dst_path, bwlimit=None):
+        return self.run("send_files", "sync", src_paths,
+                        folder_path=folder_path, src_paths=src_paths,
+                        dst_path=dst_path, bwlimit=bwlimit)
+
+    def send_all(self, folder_path, src_paths, dst_path):
+        # The files are streamed, so the whole source path is journaled
+        return self.run("send_all", "sync", [""], folder_path=folder_path,
+                        src_paths=src_paths, dst_path=dst_path)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+from specchio.utils import logger
+
+
+class LargeFileLane(object):
+
+    def __init__(self, transport, min_size, bwlimit=None, max_retries=5):
+        """Constructor of `LargeFileLane`, large files are sent one by one in
+        a background thread, so they never block small files
+
+        A file queued again before it's sent is only sent once. The
+        transfer is resumable, a failed one is retried with backoff. The
+        thread starts with the first large file. Only the tracked files,
+        like the ones from events, are waited by `wait`.
+
+        :param transport: object -- the transport to send files, like
+                                    `SSHTransport`
+        :param min_size: int -- the size in bytes of a large file
+        :param bwlimit: int -- bandwidth limit in KB/s, None is unlimited
+        :param max_retries: int -- max retries of a failed transfer
+        :return: None
+        """
+        self.transport = transport
+        self.min_size = min_size
+        self.bwlimit = bwlimit
+        self.max_retries = max_retries
+        # The source path is the key, the destination path is the value
+        self.pending_files = {}
+        self.pending_order = []
+        # The source path of tracked files queued
+        self.tracked_files = set()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.is_transferring = False
+        self.is_tracked_transfer = False
+
+    def is_large(self, src_path):
+        try:
+            return os.path.getsize(src_path) >= self.min_size
+        except OSError:
+            return False
+
+    def submit(self, src_path, dst_path, is_tracked=False):
+        """Queue a large file
+
+        :param src_path: str -- the absolute path of file
+        :param dst_path: str -- destination of file
+        :param is_tracked: bool -- whether `wait` waits for it
+        :return: None
+        """
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+            if src_path not in self.pending_files:
+                self.pending_order.append(src_path)
+            self.pending_files[src_path] = dst_path
+            if is_tracked:
+                self.tracked_files.add(src_path)
+            self.condition.notify_all()
+
+    def pop(self):
+        with self.condition:
+            while not self.pending_order:
+                self.condition.wait()
+            src_path = self.pending_order.pop(0)
+            self.is_transferring = True
+            self.is_tracked_transfer = src_path in self.tracked_files
+            self.tracked_files.discard(src_path)
+            return src_path, self.pending_files.pop(src_path)
+
+    def run(self):
+        while True:
+            src_path, dst_path = self.pop()
+            try:
+                self.transfer(src_path, dst_path)
+            finally:
+                with self.condition:
+                    self.is_transferring = False
+                    self.is_tracked_transfer = False
+                    self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait until all tracked files have been sent or failed
+
+        :param timeout: float -- max seconds to wait, None is unlimited
+        :return: bool -- False if it times out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.tracked_files or self.is_tracked_transfer:
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def transfer(self, src_path, dst_path):
+        self.transport.create_folder(dst_path=os.path.dirname(dst_path))
+        for retry in range(self.max_retries + 1):
+            if retry:
+                time.sleep(min(2 ** retry, 60))
+            logger.info("Rsync large file {} remotely".format(dst_path))
+            # Only a retry resumes the partial file of the failed transfer
+            if self.transport.send_large_file(src_path=src_path,
+                                              dst_path=dst_path,
+                                              bwlimit=self.bwlimit,
+                                              is_resumed=bool(retry)):
+                return True
+        logger.error("Failed to rsync large file {} remotely".format(
+            dst_path
+        ))
+        return False
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import json
+import logging
+import Queue
+import threading
+
+
+class AsyncStreamHandler(logging.StreamHandler):
+
+    def __init__(self, stream=None, capacity=10000, burst_size=10,
+                 settle_time=1, max_burst_time=10):
+        """Constructor of `AsyncStreamHandler`, records are queued and
+        written to the stream by a background thread, so logging never
+        blocks on terminal I/O
+
+        A record is dropped when the queue is full, and the number of
+        dropped records is logged later. A record logged with
+        `extra={"summary": "synced {} files"}` is a burst event, only the
+        first `burst_size` ones of a burst are written, the others are
+        aggregated into a summary like "synced 1,243 files in 3.1s". A
+        burst ends when there is no event for `settle_time` seconds, and a
+        summary is written every `max_burst_time` seconds in a long burst.
+
+        :param stream: file -- the stream to write, `sys.stderr` by default
+        :param capacity: int -- max number of queued records
+        :param burst_size: int -- max number of events written one by one
+                                  in a burst
+        :param settle_time: int -- seconds without event to end a burst
+        :param max_burst_time: int -- max seconds of one summary
+        :return: None
+        """
+        super(AsyncStreamHandler, self).__init__(stream)
+        self.queue = Queue.Queue(capacity)
+        self.burst_size = burst_size
+        self.settle_time = settle_time
+        self.max_burst_time = max_burst_time
+        self.dropped_count = 0
+        # The summary is the key, the value is a list like
+        # [time of first event, time of last event, count, is continued]
+        self.bursts = {}
+        self.thread = None
+
+    def emit(self, record):
+        # Format the message now, the arguments may change later
+        record.msg = record.getMessage()
+        record.args = None
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+            # Write the queued records before exit
+            atexit.register(self.close)
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped_count += 1
+
+    def run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.settle_time)
+            except Queue.Empty:
+                record = None
+            if record is self:
+                # Stop by `close`
+                self.write_summaries(None)
+                break
+            self.acquire()
+            try:
+                dropped_count, self.dropped_count = self.dropped_count, 0
+            finally:
+                self.release()
+            if dropped_count:
+                self.write(logging.makeLogRecord({
+                    "name": "specchio", "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": "Dropped {:,} log records".format(dropped_count)
+                }))
+            if record is not None:
+                self.write_event(record)
+            self.write_summaries(record.created if record else None)
+
+    def write(self, record):
+        logging.StreamHandler.emit(self, record)
+
+    def write_event(self, record):
+        summary = getattr(record, "summary", None)
+        if summary is None:
+            self.write(record)
+            return
+        burst = self.bursts.get(summary)
+        if burst is None:
+            burst = self.bursts[summary] = [record.created, record.created,
+                                            0, False]
+        burst[1] = record.created
+        burst[2] += 1
+        if not burst[3] and burst[2] <= self.burst_size:
+            self.write(record)
+
+    def write_summaries(self, now):
+        """Write the summary of settled or long bursts
+
+        :param now: float -- the time of the latest record, None to end all
+                             bursts
+        :return: None
+        """
+        for summary, burst in list(self.bursts.items()):
+            first_time, last_time, count, is_continued = burst
+            is_settled = now is None or now - last_time >= self.settle_time
+            if not is_settled and now - first_time < self.max_burst_time:
+                continue
+            del self.bursts[summary]
+            if count and (is_continued or count > self.burst_size):
+                self.write(logging.makeLogRecord({
+                    "name": "specchio", "levelno": logging.INFO,
+                    "levelname": "INFO",
+                    "msg": "{0} in {1:.1f}s".format(
+                        summary.format("{:,}".format(count)),
+                        last_time - first_time
+                    ),
+                    "summary": summary, "count": count
+                }))
+            if not is_settled:
+                # Keep aggregating the rest of the long burst
+                self.bursts[summary] = [now, now, 0, True]
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(self)
+            self.thread.join(5)
+        super(AsyncStreamHandler, self).close()
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        """Format a record as one line of JSON
+
+        :param record: `logging.LogRecord` -- the record to format
+        :return: str -- the JSON line
+        """
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "name": record.name,
+            "message": record.getMessage()
+        }
+        for key in ("summary", "count"):
+            if hasattr(record, key):
+                data[key] = getattr(record, key)
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data)
@@ -3,12 +3,24 @@
 
 import os
 import sys
+import tempfile
 import time
 
 from watchdog.observers import Observer
 
-from specchio.const import GENERAL_OPTIONS, MANUAL
+from specchio.cache import StartupCache
+from specchio.const import (GENERAL_OPTIONS, INT_OPTIONS, MANUAL,
+                            PUSH_MANUAL, PUSH_OPTIONS, REPLAY_MANUAL,
+                            REPLAY_OPTIONS, STR_OPTIONS, WAIT_MANUAL,
+                            WAIT_OPTIONS)
 from specchio.handlers import SpecchioEventHandler
+from specchio.journal import OperationJournal, get_journal_path
+from specchio.policy import SizePolicy, load_policy
+from specchio.polling import PollingObserver
+from specchio.push import (DEFAULT_PUSH_TIMEOUT, DEFAULT_WAIT_TIMEOUT,
+                           PushServer, push_paths, wait_synced)
+from specchio.trace import TraceRecorder, replay
+from specchio.transports import LocalTransport
 from specchio.utils import init_logger, logger
 
 
@@ -16,41 +28,213 @@ def main():
     """Main function for specchio
 
     Example: specchio test/ user@host:test/
+             specchio test/ /mnt/test/
+             specchio wait --socket=/tmp/specchio.sock
 
     :return: None
     """
-    init_logger()
-    _popen_str = os.popen("whereis ssh").read().strip()
-    if _popen_str == "" or _popen_str == "ssh:":
+    if sys.argv[1:2] == ["wait"] and all(
+        arg.startswith("--") for arg in sys.argv[2:]
+    ):
+        return wait_main()
+    init_logger(is_json="--log-json" in sys.argv[1:-2])
+    # The cache is kept in memory only without a source path
+    startup_cache = StartupCache(
+        sys.argv[-2].strip() if len(sys.argv) >= 3 else None
+    )
+    # A destination without host is a local folder, which needs no binary
+    is_local = len(sys.argv) >= 3 and ":" not in sys.argv[-1]
+    if not is_local and startup_cache.get_binary("ssh") is None:
         return logger.error("Specchio need `ssh`, "
                             "but there is no `ssh` in the system")
-    _popen_str = os.popen("whereis rsync").read().strip()
-    if _popen_str == "" or _popen_str == "rsync:":
+    if not is_local and startup_cache.get_binary("rsync") is None:
         return logger.error("Specchio need `rsync`, "
                             "but there is no `rsync` in the system")
     if len(sys.argv) >= 3:
         src_path = sys.argv[-2].strip()
-        dst_ssh, dst_path = sys.argv[-1].strip().split(":")
+        if is_local:
+            dst_ssh, transport = None, LocalTransport()
+            dst_path = os.path.join(os.path.abspath(sys.argv[-1].strip()),
+                                    "")
+        else:
+            dst_ssh, dst_path = sys.argv[-1].strip().split(":")
+            transport = None
+        # Options are like `--init-remote` or `--reconcile-interval=60`
+        options = dict(
+            (option.split("=", 1) + [None])[:2] for option in sys.argv[1:-2]
+        )
         option_valid = all((option in GENERAL_OPTIONS)
-                           for option in sys.argv[1:-2])
+                           for option in options)
+        # Options like `--record=PATH` need a value
+        option_valid = option_valid and all(
+            options[option] for option in STR_OPTIONS if option in options
+        )
+        try:
+            int_options = dict(
+                (option, int(options[option]) if option in options
+                 else default)
+                for option, default in INT_OPTIONS.items()
+            )
+        except (TypeError, ValueError):
+            option_valid = False
         if option_valid:
             logger.info("Initialize Specchio")
-            is_init_remote = "--init-remote" in sys.argv[1:-2]
+            max_size = (int_options["--max-file-size"] * 1024 * 1024
+                        if int_options["--max-file-size"] else None)
+            size_policy = None
+            try:
+                if "--size-policy" in options:
+                    size_policy = load_policy(options["--size-policy"],
+                                              max_size=max_size)
+                elif max_size is not None:
+                    size_policy = SizePolicy(max_size=max_size)
+            except (IOError, ValueError) as e:
+                return logger.error("Failed to load the size policy: "
+                                    "{}".format(e))
+            is_init_remote = "--init-remote" in options
+            is_verify_remote = "--verify-remote" in options
+            is_checksum = "--checksum" in options
+            trace_recorder = (TraceRecorder(options["--record"], src_path)
+                              if "--record" in options else None)
+            journal = OperationJournal(get_journal_path(
+                src_path, sys.argv[-1].strip()
+            ))
             event_handler = SpecchioEventHandler(
                 src_path=src_path, dst_ssh=dst_ssh, dst_path=dst_path,
-                is_init_remote=is_init_remote
+                is_init_remote=is_init_remote,
+                is_verify_remote=is_verify_remote, is_checksum=is_checksum,
+                reconcile_interval=int_options["--reconcile-interval"],
+                storm_rate=int_options["--storm-rate"],
+                storm_queue=int_options["--storm-queue"],
+                large_file_size=int_options["--large-file-size"],
+                large_file_bwlimit=int_options["--large-file-bwlimit"],
+                bulk_bwlimit=int_options["--bulk-bwlimit"],
+                startup_cache=startup_cache, trace_recorder=trace_recorder,
+                transport=transport,
+                scan_processes=int_options["--scan-processes"],
+                journal=journal, size_policy=size_policy
             )
-            observer = Observer()
+            if int_options["--poll-interval"]:
+                observer = PollingObserver(
+                    max_interval=int_options["--poll-interval"]
+                )
+            else:
+                observer = Observer()
             observer.schedule(event_handler, src_path, recursive=True)
+            push_server = (PushServer(event_handler,
+                                      options["--push-socket"])
+                           if "--push-socket" in options else None)
+            event_handler.start()
+            if push_server is not None:
+                push_server.start()
             observer.start()
             try:
                 while True:
                     time.sleep(1)
+                    event_handler.flush()
+                    event_handler.reconcile_if_due()
+                    event_handler.reconnect_if_due()
             except KeyboardInterrupt:
                 observer.stop()
             observer.join()
+            if push_server is not None:
+                push_server.stop()
+            event_handler.flush()
+            event_handler.stop()
+            if trace_recorder is not None:
+                trace_recorder.close()
+            journal.close()
             logger.info("Specchio stopped, have a nice day :)")
         else:
             print MANUAL
     else:
         print MANUAL
+
+
+def replay_main():
+    """Main function for specchio-replay, replay a trace recorded by
+    `--record` against a fake transport and print the report
+
+    Example: specchio-replay --speed=10 trace.log
+
+    :return: None
+    """
+    init_logger()
+    options = dict(
+        (option.split("=", 1) + [None])[:2] for option in sys.argv[1:-1]
+    )
+    if (len(sys.argv) < 2 or
+            not all(option in REPLAY_OPTIONS for option in options)):
+        print REPLAY_MANUAL
+        return
+    try:
+        speed = float(options.get("--speed") or 0)
+    except ValueError:
+        print REPLAY_MANUAL
+        return
+    src_path = options.get("--src") or tempfile.mkdtemp()
+    report = replay(sys.argv[-1], src_path, speed=speed)
+    print "Operations:"
+    for name, count in sorted(report["operations"].items()):
+        print "  {0}: {1}".format(name, count)
+    print "Latency: {0:.3f}s p50, {1:.3f}s p95, {2:.3f}s max".format(
+        report["p50"], report["p95"], report["max"]
+    )
+    print "Paths without operation: {}".format(report["unsynced"])
+
+
+def push_main():
+    """Main function for specchio-push, ask a running specchio to sync
+    paths now, and wait for the remote to apply them
+
+    Example: specchio-push --socket=/tmp/specchio.sock src/1.py src/b/
+
+    :return: int -- the exit code
+    """
+    init_logger()
+    options = dict(
+        (arg.split("=", 1) + [None])[:2] for arg in sys.argv[1:]
+        if arg.startswith("--")
+    )
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    try:
+        timeout = int(options.get("--timeout") or DEFAULT_PUSH_TIMEOUT)
+    except ValueError:
+        timeout = None
+    if (not paths or not options.get("--socket") or timeout is None or
+            not all(option in PUSH_OPTIONS for option in options)):
+        print PUSH_MANUAL
+        return 1
+    is_succeeded, error = push_paths(options["--socket"], paths,
+                                     timeout=timeout)
+    if not is_succeeded:
+        logger.error("Failed to push: {}".format(error))
+        return 1
+    return 0
+
+
+def wait_main():
+    """Main function for specchio wait, block until a running specchio has
+    applied all changes observed before to the remote
+
+    Example: specchio wait --socket=/tmp/specchio.sock --timeout=60
+
+    :return: int -- the exit code
+    """
+    init_logger()
+    options = dict(
+        (arg.split("=", 1) + [None])[:2] for arg in sys.argv[2:]
+    )
+    try:
+        timeout = int(options.get("--timeout") or DEFAULT_WAIT_TIMEOUT)
+    except ValueError:
+        timeout = None
+    if (not options.get("--socket") or timeout is None or
+            not all(option in WAIT_OPTIONS for option in options)):
+        print WAIT_MANUAL
+        return 1
+    is_succeeded, error = wait_synced(options["--socket"], timeout=timeout)
+    if not is_succeeded:
+        logger.error("Failed to wait: {}".format(error))
+        return 1
+    return 0
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import json
+import re
+import subprocess
+import threading
+
+# The root hash printed by the helper, anything else means it failed
+HASH_RE = re.compile(r"^[0-9a-f]{40}$")
+
+# The helper runs remotely by `python -c`, it computes the same tree as
+# `MerkleTree` with the same ignore rules, prints the root hash, then
+# answers the children of each folder read from stdin until EOF. The globs
+# are translated by the remote python, whose regular expression may differ
+HELPER_SCRIPT = r'''
+import base64
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sys
+
+
+def to_native(data):
+    if isinstance(data, str):
+        return data
+    if isinstance(data, bytes):
+        return data.decode("utf-8", "surrogateescape")
+    return data.encode("utf-8")
+
+
+def to_bytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode("utf-8", "surrogateescape")
+
+
+def get_hash(text):
+    return hashlib.sha1(to_bytes(text)).hexdigest()
+
+
+def get_folder_hash(children):
+    return get_hash("\n".join(
+        "{0}\t{1}\t{2}".format(children[name][0], name, children[name][1])
+        for name in sorted(children)
+    ))
+
+
+config = json.loads(to_native(base64.b64decode(sys.argv[1])))
+root = to_native(config["root"])
+rules = [
+    (to_native(folder),
+     [re.compile(fnmatch.translate(to_native(g))) for g in negates],
+     [re.compile(fnmatch.translate(to_native(g))) for g in ignores])
+    for folder, negates, ignores in config["rules"]
+]
+includes = set(to_native(path) for path in config["includes"])
+include_folders = set(
+    path[:index + 1] for path in includes
+    for index, char in enumerate(path) if char == "/"
+)
+excludes = set(to_native(path) for path in config["excludes"])
+folders = {}
+
+
+def is_ignore(path):
+    if path.startswith(".git/") or path in excludes:
+        return True
+    for folder, negates, ignores in rules:
+        if path.startswith(folder):
+            _path = path[len(folder):]
+            if any(_re.match(_path) for _re in negates):
+                return False
+            if any(_re.match(_path) for _re in ignores):
+                return True
+    return False
+
+
+def build(folder, is_forced=False):
+    # Only the included files are kept under an ignored folder
+    children = {}
+    try:
+        names = os.listdir(os.path.join(root, folder))
+    except OSError:
+        names = []
+    for name in names:
+        path = folder + "/" + name if folder else name
+        abs_path = os.path.join(root, path)
+        if os.path.isdir(abs_path):
+            if os.path.islink(abs_path):
+                continue
+            if path + "/" in include_folders:
+                _children = build(path, is_forced or is_ignore(path + "/"))
+            elif is_forced or is_ignore(path + "/"):
+                continue
+            else:
+                _children = build(path)
+            if _children:
+                children[name] = ("d", get_folder_hash(_children))
+        elif os.path.isfile(abs_path) and (
+            path in includes or not (is_forced or is_ignore(path))
+        ):
+            stat = os.stat(abs_path)
+            children[name] = ("f", get_hash("{0}\t{1}".format(
+                stat.st_size, int(stat.st_mtime)
+            )))
+    folders[folder] = children
+    return children
+
+
+stdin = getattr(sys.stdin, "buffer", sys.stdin)
+stdout = getattr(sys.stdout, "buffer", sys.stdout)
+stdout.write(to_bytes(get_folder_hash(build("")) + "\n"))
+stdout.flush()
+for line in iter(stdin.readline, b""):
+    children = folders.get(to_native(line).rstrip("\n"), {})
+    for name in sorted(children):
+        stdout.write(to_bytes("{0}\t{1}\t{2}\n".format(
+            children[name][0], name, children[name][1]
+        )))
+    stdout.write(b"\n")
+    stdout.flush()
+'''
+
+
+def get_hash(text):
+    """Get sha1 of a text
+
+    :param text: str -- the text to hash
+    :return: str -- hex digest
+    """
+    return hashlib.sha1(text).hexdigest()
+
+
+def get_folder_hash(children):
+    """Get the hash of a folder, it's same as the one in `HELPER_SCRIPT`
+
+    :param children: dict -- the name of child is the key, the value is a
+                             tuple like ("f" or "d", hash of child)
+    :return: str -- hex digest
+    """
+    return get_hash("\n".join(
+        "{0}\t{1}\t{2}".format(children[name][0], name, children[name][1])
+        for name in sorted(children)
+    ))
+
+
+def join_path(folder, name):
+    return folder + "/" + name if folder else name
+
+
+class MerkleTree(object):
+
+    def __init__(self):
+        """Constructor of `MerkleTree`, a per-folder hash tree of files,
+        folder path is relative and the root folder is ""
+
+        The hash of a folder is cached, and the cache of all ancestors is
+        dropped when a file under it is updated.
+
+        :return: None
+        """
+        self.folders = {"": {}}
+        self.folder_hashes = {}
+
+    def _drop_hashes(self, folder):
+        while True:
+            self.folder_hashes.pop(folder, None)
+            if folder == "":
+                break
+            folder = folder.rpartition("/")[0]
+
+    def update_file(self, path, value):
+        """Update a file in the tree
+
+        :param path: str -- relative path of the file
+        :param value: str -- "size\tmtime" of the file
+        :return: None
+        """
+        folder, _, name = path.rpartition("/")
+        # Create all missing ancestors of the file
+        missing_folders = []
+        _folder = folder
+        while _folder not in self.folders:
+            missing_folders.append(_folder)
+            _folder = _folder.rpartition("/")[0]
+        for _folder in missing_folders:
+            self.folders[_folder] = {}
+        for _folder in missing_folders:
+            parent_folder, _, folder_name = _folder.rpartition("/")
+            self.folders[parent_folder][folder_name] = ("d", None)
+        self.folders[folder][name] = ("f", get_hash(value))
+        self._drop_hashes(folder)
+
+    def remove(self, path):
+        """Remove a file or a folder in the tree, the empty ancestors are
+        removed too
+
+        :param path: str -- relative path of the file or folder
+        :return: None
+        """
+        folder, _, name = path.rpartition("/")
+        if name not in self.folders.get(folder, {}):
+            return
+        if self.folders[folder].pop(name)[0] == "d":
+            for _folder in list(self.folders.keys()):
+                if _folder == path or _folder.startswith(path + "/"):
+                    del self.folders[_folder]
+                    self.folder_hashes.pop(_folder, None)
+        self._drop_hashes(folder)
+        if folder and not self.folders[folder]:
+            self.remove(folder)
+
+    def get_hash(self, folder=""):
+        """Get the hash of a folder
+
+        :param folder: str -- relative path of the folder
+        :return: str -- hex digest
+        """
+        if folder not in self.folder_hashes:
+            self.folder_hashes[folder] = get_folder_hash(
+                self.get_children(folder)
+            )
+        return self.folder_hashes[folder]
+
+    def get_children(self, folder):
+        """Get all children of a folder with their hashes
+
+        :param folder: str -- relative path of the folder
+        :return: dict -- like the param of `get_folder_hash`
+        """
+        return dict(
+            (name, (_type, _hash) if _type == "f" else
+             (_type, self.get_hash(join_path(folder, name))))
+            for name, (_type, _hash) in self.folders.get(folder, {}).items()
+        )
+
+    def iter_files(self, path):
+        """Iterate all files under a path in the tree
+
+        :param path: str -- relative path of the file or folder
+        :return: generator of str -- relative path of files
+        """
+        folder, _, name = path.rpartition("/")
+        child = self.folders.get(folder, {}).get(name)
+        if child is None:
+            return
+        if child[0] == "f":
+            yield path
+            return
+        for _name, (_type, _) in self.folders[path].items():
+            for file_path in self.iter_files(join_path(path, _name)):
+                yield file_path
+
+
+class RemoteMerkleTree(object):
+
+    def __init__(self, dst_ssh, dst_path, rules, includes=(), excludes=()):
+        """Constructor of `RemoteMerkleTree`, run `HELPER_SCRIPT` remotely
+        by ssh and read the root hash
+
+        `is_failed` is set if the helper can't run or its output is
+        invalid, like an unreachable host or a missing python, then the
+        remote tree must not be treated as empty.
+
+        :param dst_ssh: str -- user name and host name of destination path
+                               just like: user@host, None to run it
+                               locally
+        :param dst_path: str -- destination path
+        :param rules: list of tuple -- (relative folder of `.gitignore`,
+                                        list of negate ignore glob,
+                                        list of ignore glob),
+                                       from the nearest `.gitignore`
+        :param includes: list of str -- relative path of files kept even if
+                                        they're ignored
+        :param excludes: list of str -- relative path of files or folders
+                                        ignored besides the rules, a
+                                        folder ends with "/"
+        :return: None
+        """
+        config = base64.b64encode(json.dumps({
+            "root": dst_path, "rules": rules, "includes": list(includes),
+            "excludes": list(excludes)
+        }))
+        command = (
+            "$(command -v python3 || command -v python) -c "
+            "\"import base64;exec(base64.b64decode('{0}'))\" {1}"
+        ).format(base64.b64encode(HELPER_SCRIPT), config)
+        args = (["sh", "-c", command] if dst_ssh is None else
+                ["ssh", dst_ssh, command])
+        try:
+            self.process = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE)
+        except OSError:
+            # Like the argument list is too long
+            self.process = None
+            self.root_hash = ""
+        else:
+            self.root_hash = self.process.stdout.readline().strip()
+        self.is_failed = not HASH_RE.match(self.root_hash)
+
+    def get_children(self, folders):
+        """Get all children of multiple folders in one round trip
+
+        :param folders: list of str -- relative path of folders
+        :return: list of dict -- like the param of `get_folder_hash`
+        """
+        def _write():
+            try:
+                for folder in folders:
+                    self.process.stdin.write(folder + "\n")
+                self.process.stdin.flush()
+            except IOError:
+                # The helper exited, it's found by the truncated output
+                pass
+
+        # Write in another thread, so that a full pipe can't block reading
+        writer = threading.Thread(target=_write)
+        writer.start()
+        result = []
+        for _ in folders:
+            children = {}
+            for line in iter(self.process.stdout.readline, "\n"):
+                if line == "":
+                    self.is_failed = True
+                    break
+                _type, name, _hash = line.rstrip("\n").split("\t")
+                children[name] = (_type, _hash)
+            result.append(children)
+        writer.join()
+        return result
+
+    def close(self):
+        """Stop the helper
+
+        :return: bool -- whether the helper succeeds, the answers can't be
+                         trusted if it exits with an error
+        """
+        if self.process is None:
+            return False
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        return self.process.wait() == 0 and not self.is_failed
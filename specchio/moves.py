@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+import threading
+
+from specchio.events import iter_self_and_ancestors
+from specchio.fileindex import FileIndex
+from specchio.utils import get_relative_path
+from watchdog.events import (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED,
+                             EVENT_TYPE_MODIFIED)
+
+# Smaller files are cheaper to send again than to track
+MIN_SIZE = 64 * 1024
+
+
+class MoveDetector(object):
+
+    def __init__(self, src_path, is_ignore, min_size=MIN_SIZE):
+        """Constructor of `MoveDetector`, pair the deletes with the creates
+        of the same file, so a file moved by a tool which copies and
+        deletes, or a move which arrives as a delete and a create, is moved
+        remotely instead of sent again
+
+        The size, modification time and inode of synced files are kept in a
+        `FileIndex`. A created file is paired with a deleted one by inode
+        and size, or by size and modification time for a copy, which is
+        synced again after the move in case the content differs. A delete
+        which covers indexed files but pairs with nothing is held until the
+        next window, so a create arriving a little later is still paired.
+
+        :param src_path: str -- source path
+        :param is_ignore: function -- check whether a path is ignored, like
+                                      `SpecchioEventHandler.is_ignore`
+        :param min_size: int -- only track files of this size or larger
+        :return: None
+        """
+        self.src_path = os.path.abspath(src_path)
+        self.is_ignore = is_ignore
+        self.min_size = min_size
+        self.file_index = FileIndex()
+        # The deletes held from the last window
+        self.held_events = []
+        self.lock = threading.Lock()
+
+    def get_relative_path(self, path):
+        return get_relative_path(self.src_path, path)
+
+    def stat(self, path):
+        """Get the stat of a file worth tracking
+
+        :param path: str -- relative path of file
+        :return: stat_result -- None if it's not a regular file, too small
+                                or a `.gitignore`
+        """
+        if path.split("/")[-1] == ".gitignore":
+            return None
+        try:
+            file_stat = os.lstat(os.path.join(self.src_path, path))
+        except OSError:
+            return None
+        if (not stat.S_ISREG(file_stat.st_mode) or
+                file_stat.st_size < self.min_size):
+            return None
+        return file_stat
+
+    def record(self, path):
+        """Record the current state of a synced file
+
+        :param path: str -- relative path of file
+        :return: None
+        """
+        file_stat = self.stat(path)
+        with self.lock:
+            if file_stat is None:
+                self.file_index.remove(path)
+                return
+            self.file_index.add(path, size=file_stat.st_size,
+                                mtime=file_stat.st_mtime,
+                                inode=file_stat.st_ino)
+
+    def forget(self, path):
+        """Forget a removed file, or all files under a removed folder
+
+        :param path: str -- relative path of file or folder
+        :return: None
+        """
+        with self.lock:
+            self.file_index.remove(path)
+
+    def move(self, src_path, dst_path):
+        """Move the files tracked under a moved path
+
+        :param src_path: str -- relative path of file or folder moved
+        :param dst_path: str -- relative path of the new place
+        :return: None
+        """
+        with self.lock:
+            files = list(self.file_index.iter_files(src_path))
+            self.file_index.remove(src_path)
+            for path, size, mtime, inode in files:
+                self.file_index.add(dst_path + path[len(src_path):],
+                                    size=size, mtime=mtime, inode=inode)
+
+    def pair(self, events):
+        """Pair the deletes of the held events and a window with the
+        creates of the window, and hold the deletes of tracked files which
+        pair with nothing
+
+        :param events: list of FileSystemEvent -- a window compacted by
+                                                 `compact_events`
+        :return: tuple -- (list of moves, list of events to handle), a move
+                          is (relative source path, relative destination
+                          path, whether the file is changed), the events
+                          start with the held deletes released
+        """
+        with self.lock:
+            held_events, self.held_events = self.held_events, []
+            deleted_events = held_events + [
+                event for event in events
+                if event.event_type == EVENT_TYPE_DELETED
+            ]
+            if not deleted_events or not len(self.file_index):
+                return [], held_events + events
+            deleted_paths = set()
+            # The key is like ("inode", inode, size) or ("mtime", size,
+            # mtime), the value is relative path of the deleted file
+            candidates = {}
+            for event in deleted_events:
+                path = self.get_relative_path(event.src_path)
+                deleted_paths.add(path)
+                for file_path, size, mtime, inode in (
+                    self.file_index.iter_files(path)
+                ):
+                    candidates[("inode", inode, size)] = file_path
+                    candidates[("mtime", size, int(mtime))] = file_path
+            moves, kept_events, paired_paths = [], [], set()
+            for event in events:
+                move = None
+                if candidates and not event.is_directory and (
+                    event.event_type in (EVENT_TYPE_CREATED,
+                                         EVENT_TYPE_MODIFIED)
+                ):
+                    move = self.find_move(
+                        self.get_relative_path(event.src_path), candidates,
+                        deleted_paths, paired_paths
+                    )
+                if move is None:
+                    kept_events.append(event)
+                    continue
+                moves.append(move)
+                paired_paths.add(move[0])
+                # The changed file is synced after the move
+                if move[2]:
+                    kept_events.append(event)
+            for src_path, dst_path, _ in moves:
+                size, mtime, inode = self.file_index.get(src_path)[1:]
+                self.file_index.remove(src_path)
+                file_stat = self.stat(dst_path)
+                if file_stat is not None:
+                    self.file_index.add(dst_path, size=file_stat.st_size,
+                                        mtime=file_stat.st_mtime,
+                                        inode=file_stat.st_ino)
+            # The delete of a moved file is done by the move
+            released_events = [
+                event for event in held_events if event.is_directory or
+                self.get_relative_path(event.src_path) not in paired_paths
+            ]
+            for event in kept_events:
+                if event.event_type != EVENT_TYPE_DELETED:
+                    released_events.append(event)
+                elif (not event.is_directory and
+                      self.get_relative_path(event.src_path) in
+                      paired_paths):
+                    continue
+                elif self.should_hold(event, kept_events, paired_paths):
+                    self.held_events.append(event)
+                else:
+                    released_events.append(event)
+            return moves, released_events
+
+    def find_move(self, path, candidates, deleted_paths, paired_paths):
+        """Find the deleted file which a created file is moved from
+
+        :param path: str -- relative path of the created file
+        :param candidates: dict -- the deleted files by their keys
+        :param deleted_paths: set of str -- relative path of the deletes
+        :param paired_paths: set of str -- the deleted files paired already
+        :return: tuple -- the move like in `pair`, None if nothing pairs
+        """
+        # The file would be removed again by the deletes after the move
+        if any(_path in deleted_paths
+               for _path in iter_self_and_ancestors(path)):
+            return None
+        if self.is_ignore(os.path.join(self.src_path, path), False):
+            return None
+        file_stat = self.stat(path)
+        if file_stat is None:
+            return None
+        src_path = candidates.get(
+            ("inode", file_stat.st_ino, file_stat.st_size)
+        )
+        is_renamed = src_path is not None
+        if src_path is None:
+            src_path = candidates.get(
+                ("mtime", file_stat.st_size, int(file_stat.st_mtime))
+            )
+        if src_path is None or src_path in paired_paths:
+            return None
+        if not is_renamed:
+            # The same size and time don't prove the same content, so the
+            # copy is synced after the move, and rsync only sends the delta
+            return src_path, path, True
+        # A reused inode is unlikely to keep the exact modification time
+        mtime = self.file_index.get(src_path)[2]
+        return src_path, path, mtime != file_stat.st_mtime
+
+    def should_hold(self, event, events, paired_paths):
+        """Check whether a delete which pairs with nothing is held
+
+        :param event: FileSystemEvent -- the delete
+        :param events: list of FileSystemEvent -- the window
+        :param paired_paths: set of str -- the deleted files paired
+        :return: bool -- whether it covers a tracked file not paired, and
+                         no other event of the window is under it
+        """
+        path = self.get_relative_path(event.src_path)
+        if not any(file_path not in paired_paths for file_path, _, _, _
+                   in self.file_index.iter_files(path)):
+            return False
+        for _event in events:
+            if _event is event:
+                continue
+            for _path in [_event.src_path] + (
+                [_event.dest_path] if hasattr(_event, "dest_path") else []
+            ):
+                _path = self.get_relative_path(_path)
+                if _path == path or _path.startswith(path + "/"):
+                    return False
+        return True
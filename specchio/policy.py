@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import fnmatch
+import re
+import threading
+
+from specchio.events import iter_self_and_ancestors
+
+# The actions of a file over the policy
+SKIP = "skip"
+DEFER = "defer"
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3,
+              "T": 1024 ** 4}
+
+
+def parse_size(text):
+    """Parse a size like "512K", "10M", "4G" or "100"
+
+    :param text: str -- the size, "-" is unlimited
+    :return: int -- the size in bytes, None if unlimited
+    """
+    if text == "-":
+        return None
+    text = text.upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    number = float(text[:len(text) - len(unit)])
+    if number < 0:
+        raise ValueError("Negative size {}".format(text))
+    return int(number * SIZE_UNITS[unit])
+
+
+def compile_glob(glob):
+    """Compile a glob like in `.gitignore`, a glob without "/" matches the
+    name, and a glob starting with "/" is relative to the source path
+
+    :param glob: str -- the glob, a folder ends with "/"
+    :return: tuple -- (regex, whether it matches the name only)
+    """
+    glob = glob.rstrip("/")
+    is_name = "/" not in glob
+    return re.compile(fnmatch.translate(glob.lstrip("/"))), is_name
+
+
+def match_glob(compiled_glob, path):
+    regex, is_name = compiled_glob
+    return regex.match(path.rsplit("/", 1)[-1] if is_name else path)
+
+
+class SizePolicy(object):
+
+    def __init__(self, max_size=None, rules=(), budgets=()):
+        """Constructor of `SizePolicy`, decide whether a file which is not
+        ignored is sent by its size, like to keep a core dump or a dataset
+        nobody ignored from saturating the link
+
+        A file over the max size of the last rule it matches, or over
+        `max_size` if it matches no rule, is skipped or deferred. A file in
+        a folder whose budget of bytes or files is used up is skipped or
+        deferred too. A deferred file is sent later as bulk work. The
+        globs are matched like in `.gitignore`, and a file below every max
+        size is checked without matching any glob.
+
+        :param max_size: int -- max size in bytes of all files, None is
+                                unlimited
+        :param rules: list of tuple -- (glob, max size in bytes, action)
+        :param budgets: list of tuple -- (glob of folder, max bytes, max
+                                         files, action), each folder
+                                         matched has its own budget, None
+                                         is unlimited
+        :return: None
+        """
+        self.max_size = max_size
+        self.rules = [(compile_glob(glob), size, action)
+                      for glob, size, action in rules]
+        self.budgets = [
+            (compile_glob(glob), max_bytes, max_files, action)
+            for glob, max_bytes, max_files, action in budgets
+        ]
+        sizes = [size for _, size, _ in self.rules if size is not None]
+        if max_size is not None:
+            sizes.append(max_size)
+        # A file of this size or smaller is under every max size
+        self.min_size = min(sizes) if sizes else None
+        # The folder of budget is the key, the value is a list like
+        # [bytes charged, dict of the sizes of files charged]
+        self.usage = {}
+        self.lock = threading.Lock()
+
+    def check(self, path, size, is_charged=True):
+        """Check a file before it's sent, and charge it to the budget of its
+        folder
+
+        :param path: str -- relative path of file
+        :param size: int -- size of file
+        :param is_charged: bool -- False to check it without charging, like
+                                   to know whether a file was skipped
+        :return: str -- `SKIP` or `DEFER`, None to send it now
+        """
+        if self.min_size is not None and size > self.min_size:
+            max_size, action = self.max_size, SKIP
+            for compiled_glob, _max_size, _action in self.rules:
+                if match_glob(compiled_glob, path):
+                    max_size, action = _max_size, _action
+            if max_size is not None and size > max_size:
+                return action
+        if not self.budgets:
+            return None
+        return self.charge(path, size, is_charged)
+
+    def get_budget(self, path):
+        """Find the budget of a file from the top folder
+
+        :param path: str -- relative path of file
+        :return: tuple -- (folder, the budget), None if there is no budget
+        """
+        for folder in reversed(list(iter_self_and_ancestors(path))[1:-1]):
+            for budget in self.budgets:
+                if match_glob(budget[0], folder):
+                    return folder, budget
+        return None
+
+    def charge(self, path, size, is_charged=True):
+        budget = self.get_budget(path)
+        if budget is None:
+            return None
+        folder, (_, max_bytes, max_files, action) = budget
+        with self.lock:
+            usage = self.usage.get(folder, [0, {}])
+            old_size = usage[1].get(path)
+            total_bytes = usage[0] - (old_size or 0) + size
+            if ((max_bytes is not None and total_bytes > max_bytes) or
+                    (max_files is not None and old_size is None and
+                     len(usage[1]) >= max_files)):
+                return action
+            if is_charged:
+                self.usage[folder] = usage
+                usage[0] = total_bytes
+                usage[1][path] = size
+        return None
+
+    def release(self, path):
+        """Release the budget of a removed file, or all files under a
+        removed folder
+
+        :param path: str -- relative path of file or folder
+        :return: None
+        """
+        if not self.budgets:
+            return
+        with self.lock:
+            for folder, usage in list(self.usage.items()):
+                if folder == path or folder.startswith(path + "/"):
+                    del self.usage[folder]
+                elif path.startswith(folder + "/"):
+                    for file_path in list(usage[1]):
+                        if (file_path == path or
+                                file_path.startswith(path + "/")):
+                            usage[0] -= usage[1].pop(file_path)
+
+
+def load_policy(policy_path, max_size=None):
+    """Load a size policy file, each line is like `GLOB SIZE [defer]` for
+    a max size of the files matched, or `FOLDER/ SIZE [files=N] [defer]`
+    for a budget of the folders matched, SIZE is like "512K", "10M", "4G",
+    or "-" for unlimited, and a line starting with `#` is a comment
+
+    :param policy_path: str -- the path of policy file
+    :param max_size: int -- max size in bytes of all files, None is
+                            unlimited
+    :return: `SizePolicy`
+    """
+    rules, budgets = [], []
+    with open(policy_path, "r") as policy_file:
+        for line_number, line in enumerate(policy_file, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            try:
+                action = SKIP
+                if fields[-1] == DEFER:
+                    action = DEFER
+                    fields.pop()
+                max_files = None
+                if fields[-1].startswith("files="):
+                    max_files = int(fields.pop()[len("files="):])
+                if len(fields) != 2:
+                    raise ValueError("Expect a glob and a size")
+                glob, size = fields[0], parse_size(fields[1])
+                if glob.endswith("/"):
+                    budgets.append((glob, size, max_files, action))
+                elif max_files is not None:
+                    raise ValueError("Only a folder has a budget of files")
+                else:
+                    rules.append((glob, size, action))
+            except (IndexError, ValueError) as e:
+                raise ValueError("Invalid line {0} of {1}: {2}".format(
+                    line_number, policy_path, e
+                ))
+    return SizePolicy(max_size=max_size, rules=rules, budgets=budgets)
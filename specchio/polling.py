@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import array
+import os
+import stat
+import threading
+import time
+
+from specchio.utils import logger
+from watchdog.events import (DirCreatedEvent, DirDeletedEvent, DirMovedEvent,
+                             FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent, FileMovedEvent)
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# A folder changed this number of seconds around a poll is listed again
+# next time, the modification time of some file systems is in seconds
+MTIME_WINDOW = 2
+
+# The poll interval is at least this times the duration of the last poll
+POLL_LOAD_FACTOR = 4
+
+
+def list_folder(folder_path):
+    """List a folder by `scandir` if it's available, which knows whether an
+    entry is a folder without `lstat`
+
+    :param folder_path: str -- the absolute path of folder
+    :return: list of tuple -- (name, whether it's a folder, callable to get
+                               the `lstat` result of entry)
+    """
+    if scandir is not None:
+        return [(entry.name, entry.is_dir(follow_symlinks=False),
+                 lambda entry=entry: entry.stat(follow_symlinks=False))
+                for entry in scandir(folder_path)]
+    entries = []
+    for name in os.listdir(folder_path):
+        try:
+            stat_result = os.lstat(os.path.join(folder_path, name))
+        except OSError:
+            continue
+        entries.append((name, stat.S_ISDIR(stat_result.st_mode),
+                        lambda stat_result=stat_result: stat_result))
+    return entries
+
+
+class FolderSnapshot(object):
+
+    __slots__ = ("mtime", "inode", "names", "kinds", "inodes", "sizes",
+                 "mtimes", "ignored_entries")
+
+    def __init__(self, mtime, inode, entries, ignored_entries):
+        """Constructor of `FolderSnapshot`, the entries of a folder are kept
+        in arrays sorted by name instead of one stat result per entry
+
+        :param mtime: float -- modification time of folder, -1 if the folder
+                               must be listed next time
+        :param inode: int -- inode of folder
+        :param entries: list of tuple -- (name, whether it's a folder,
+                                          inode, size, modification time)
+        :param ignored_entries: list of tuple -- (name, whether it's a
+                                                 folder) of ignored entries
+        :return: None
+        """
+        self.mtime = mtime
+        self.inode = inode
+        entries = sorted(entries)
+        self.names = tuple(entry[0] for entry in entries)
+        # "d" for a folder, "f" for others
+        self.kinds = "".join("d" if entry[1] else "f" for entry in entries)
+        self.inodes = array.array("L", [entry[2] for entry in entries])
+        self.sizes = array.array("L", [entry[3] for entry in entries])
+        self.mtimes = array.array("d", [entry[4] for entry in entries])
+        self.ignored_entries = tuple(ignored_entries)
+
+    def get_entries(self):
+        """Get all entries of folder
+
+        :return: dict -- the name is the key, the value is a tuple like
+                         (whether it's a folder, inode, size, mtime)
+        """
+        return dict(
+            (name, (kind == "d", inode, size, mtime))
+            for name, kind, inode, size, mtime in zip(
+                self.names, self.kinds, self.inodes, self.sizes, self.mtimes
+            )
+        )
+
+    def get_folder_names(self):
+        return [name for name, kind in zip(self.names, self.kinds)
+                if kind == "d"]
+
+
+class PollingObserver(threading.Thread):
+
+    def __init__(self, min_interval=1, max_interval=10):
+        """Constructor of `PollingObserver`, poll the source path for the
+        file systems without inotify, like NFS, SMB or a volume of container
+
+        A folder whose modification time is not changed is not listed
+        again, only its files are checked by `lstat`, and the ignored
+        folders are skipped. The interval is reset to `min_interval` by a
+        change, and doubled up to `max_interval` by a poll without change.
+
+        :param min_interval: float -- min seconds between two polls
+        :param max_interval: float -- max seconds between two polls
+        :return: None
+        """
+        super(PollingObserver, self).__init__()
+        self.daemon = True
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.event_handler = None
+        self.path = None
+        # The relative path of folder is the key, the value is a
+        # `FolderSnapshot`
+        self.folders = {}
+        self.stopped_event = threading.Event()
+        self.init_changes({})
+
+    def schedule(self, event_handler, path, recursive=True):
+        """Same as `Observer.schedule`, only one path is watched, always
+        recursively
+
+        :param event_handler: `SpecchioEventHandler` -- the handler to
+                                                        dispatch events
+        :param path: str -- source path
+        :return: None
+        """
+        self.event_handler = event_handler
+        self.path = path
+
+    def stop(self):
+        self.stopped_event.set()
+
+    def run(self):
+        self.poll()
+        while not self.stopped_event.wait(self.interval):
+            start_time = time.time()
+            try:
+                events = self.poll()
+            except Exception:
+                logger.exception("Failed to poll {}".format(self.path))
+                events = []
+            for event in events:
+                self.event_handler.dispatch(event)
+            if events:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * 2, self.max_interval)
+            # Keep polling a large tree from taking all the time
+            self.interval = max(
+                self.interval,
+                (time.time() - start_time) * POLL_LOAD_FACTOR
+            )
+
+    def init_changes(self, old_folders):
+        self.old_folders = old_folders
+        self.old_inodes = None
+        # Lists of tuple like (relative path, the entry)
+        self.created = []
+        self.deleted = []
+        self.modified = []
+        # The old path of moved folders is the key, the new path is the
+        # value
+        self.dir_moves = {}
+        self.moved_from = {}
+
+    def poll(self):
+        """Compare the source path with the last snapshot, the first poll
+        only takes a snapshot
+
+        :return: list of FileSystemEvent -- the changes since the last poll
+        """
+        poll_time = time.time()
+        self.init_changes(self.folders)
+        folders = {}
+        stack = [("", "")]
+        while stack:
+            folder, old_folder = stack.pop()
+            snapshot = self.poll_folder(
+                folder, self.old_folders.get(old_folder), poll_time
+            )
+            if snapshot is None:
+                continue
+            folders[folder] = snapshot
+            for name in snapshot.get_folder_names():
+                path = os.path.join(folder, name)
+                stack.append((path, self.moved_from.get(
+                    path, os.path.join(old_folder, name)
+                )))
+        if "" not in folders:
+            # Nothing is known until the source path can be listed
+            self.init_changes({})
+            return []
+        git_folder = self.get_git_folder()
+        if git_folder is not None:
+            # Only the top of `.git` is watched to detect git operations
+            snapshot = self.poll_folder(
+                git_folder, self.old_folders.get(git_folder), poll_time,
+                is_git_folder=True
+            )
+            if snapshot is not None:
+                folders[git_folder] = snapshot
+        is_first_poll = not self.old_folders
+        self.folders = folders
+        events = [] if is_first_poll else self.get_events()
+        self.init_changes({})
+        return events
+
+    def get_git_folder(self):
+        git_dir = self.event_handler.git_state_monitor.git_dir
+        root_path = os.path.abspath(self.path)
+        if not git_dir or not git_dir.startswith(root_path + "/"):
+            return None
+        return git_dir[len(root_path) + 1:]
+
+    def poll_folder(self, folder, old, poll_time, is_git_folder=False):
+        """Check a folder, it's listed only if it has been changed
+
+        :param folder: str -- relative path of folder
+        :param old: `FolderSnapshot` -- the last snapshot of folder, None if
+                                        it's a new folder
+        :param poll_time: float -- the start time of poll
+        :param is_git_folder: bool -- whether it's `.git`, which is ignored
+        :return: `FolderSnapshot` -- None if the folder can't be listed
+        """
+        abs_folder = os.path.join(self.path, folder)
+        try:
+            folder_stat = os.lstat(abs_folder)
+        except OSError:
+            return old
+        mtime = folder_stat.st_mtime
+        if (old is not None and old.mtime == mtime and
+                all(self.is_ignore(os.path.join(abs_folder, name), isdir,
+                                   is_git_folder)
+                    for name, isdir in old.ignored_entries) and
+                self.refresh_folder(folder, old)):
+            return old
+        if abs(poll_time - mtime) < MTIME_WINDOW:
+            mtime = -1
+        return self.scan_folder(folder, old, mtime, folder_stat.st_ino,
+                                is_git_folder)
+
+    def is_ignore(self, abs_path, isdir, is_git_folder=False):
+        if is_git_folder:
+            return False
+        return self.event_handler.is_ignore(abs_path, isdir)
+
+    def refresh_folder(self, folder, snapshot):
+        """Check the files of a folder which has not been listed, by
+        `lstat`, the snapshot is updated in place
+
+        :param folder: str -- relative path of folder
+        :param snapshot: `FolderSnapshot` -- the last snapshot of folder
+        :return: bool -- False if the entries of folder have been changed
+        """
+        for index, name in enumerate(snapshot.names):
+            if snapshot.kinds[index] == "d":
+                continue
+            path = os.path.join(folder, name)
+            try:
+                file_stat = os.lstat(os.path.join(self.path, path))
+            except OSError:
+                return False
+            if (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime) != (
+                snapshot.inodes[index], snapshot.sizes[index],
+                snapshot.mtimes[index]
+            ):
+                snapshot.inodes[index] = file_stat.st_ino
+                snapshot.sizes[index] = file_stat.st_size
+                snapshot.mtimes[index] = file_stat.st_mtime
+                self.modified.append((path, None))
+        return True
+
+    def scan_folder(self, folder, old, mtime, inode, is_git_folder=False):
+        """List a folder and compare it with the last snapshot
+
+        :param folder: str -- relative path of folder
+        :param old: `FolderSnapshot` -- the last snapshot of folder, None if
+                                        it's a new folder
+        :param mtime: float -- modification time of folder
+        :param inode: int -- inode of folder
+        :param is_git_folder: bool -- whether it's `.git`, which is ignored
+        :return: `FolderSnapshot` -- None if the folder can't be listed
+        """
+        abs_folder = os.path.join(self.path, folder)
+        try:
+            listed_entries = list_folder(abs_folder)
+        except OSError:
+            return old
+        old_entries = old.get_entries() if old is not None else {}
+        entries, ignored_entries = [], []
+        for name, isdir, get_stat in listed_entries:
+            path = os.path.join(folder, name)
+            if self.is_ignore(os.path.join(abs_folder, name), isdir,
+                              is_git_folder):
+                ignored_entries.append((name, isdir))
+                continue
+            try:
+                entry_stat = get_stat()
+            except OSError:
+                continue
+            entry = ((isdir, entry_stat.st_ino, 0, 0) if isdir else
+                     (isdir, entry_stat.st_ino, entry_stat.st_size,
+                      entry_stat.st_mtime))
+            entries.append((name,) + entry)
+            old_entry = old_entries.pop(name, None)
+            if old_entry is not None and old_entry[0] == isdir:
+                if not isdir and old_entry != entry:
+                    self.modified.append((path, entry))
+                continue
+            if old_entry is not None:
+                self.deleted.append((path, old_entry))
+            old_path = (self.get_moved_folder(path, entry_stat.st_ino)
+                        if isdir and not is_git_folder else None)
+            if old_path is not None:
+                self.dir_moves[old_path] = path
+                self.moved_from[path] = old_path
+            else:
+                self.created.append((path, entry))
+        for name, old_entry in old_entries.items():
+            self.deleted.append((os.path.join(folder, name), old_entry))
+        return FolderSnapshot(mtime, inode, entries, ignored_entries)
+
+    def get_moved_folder(self, path, inode):
+        """Find the old path of a new folder by its inode
+
+        :param path: str -- relative path of the new folder
+        :param inode: int -- inode of the new folder
+        :return: str -- the old relative path, None if it's not moved
+        """
+        if self.old_inodes is None:
+            self.old_inodes = dict(
+                (snapshot.inode, folder)
+                for folder, snapshot in self.old_folders.items() if folder
+            )
+        old_path = self.old_inodes.get(inode)
+        if (old_path is None or old_path in self.dir_moves or
+                path.startswith(old_path + "/")):
+            return None
+        try:
+            if os.lstat(os.path.join(self.path, old_path)).st_ino == inode:
+                return None
+        except OSError:
+            pass
+        return old_path
+
+    def get_events(self):
+        """Turn the changes of a poll into events like the ones of inotify,
+        a file deleted and created with the same inode is moved
+
+        :return: list of FileSystemEvent
+        """
+        events = []
+        # A folder moved under a moved folder is moved from its new path
+        dir_moves = []
+        for old_path, new_path in sorted(self.dir_moves.items()):
+            for _old_path, _new_path in dir_moves:
+                if old_path.startswith(_old_path + "/"):
+                    old_path = _new_path + old_path[len(_old_path):]
+            dir_moves.append((old_path, new_path))
+            events.append(DirMovedEvent(os.path.join(self.path, old_path),
+                                        os.path.join(self.path, new_path)))
+        moved_folders = set(old_path for old_path, _ in dir_moves)
+        deleted_files = {}
+        for path, entry in self.deleted:
+            if not entry[0]:
+                deleted_files.setdefault(entry[1:3], path)
+        created_events, moved_files = [], set()
+        for path, entry in sorted(self.created):
+            old_path = (None if entry[0] else
+                        deleted_files.pop(entry[1:3], None))
+            if old_path is not None:
+                moved_files.add(old_path)
+                events.append(FileMovedEvent(os.path.join(self.path,
+                                                          old_path),
+                                             os.path.join(self.path, path)))
+            else:
+                event_class = DirCreatedEvent if entry[0] else \
+                    FileCreatedEvent
+                created_events.append(event_class(os.path.join(self.path,
+                                                               path)))
+        for path, entry in sorted(self.deleted):
+            if entry[0] and path not in moved_folders:
+                events.append(DirDeletedEvent(os.path.join(self.path, path)))
+            elif not entry[0] and path not in moved_files:
+                events.append(FileDeletedEvent(os.path.join(self.path,
+                                                            path)))
+        events.extend(created_events)
+        for path, _ in sorted(self.modified):
+            events.append(FileModifiedEvent(os.path.join(self.path, path)))
+        return events
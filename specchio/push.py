@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+from specchio.scheduler import INTERACTIVE
+from specchio.utils import get_relative_path, logger
+
+# Seconds to wait for the remote to apply a push
+DEFAULT_PUSH_TIMEOUT = 600
+
+# Seconds to wait for the remote to catch up
+DEFAULT_WAIT_TIMEOUT = 60
+
+
+class PushServer(object):
+
+    def __init__(self, event_handler, socket_path,
+                 timeout=DEFAULT_PUSH_TIMEOUT):
+        """Constructor of `PushServer`, listen on a local Unix socket for
+        requests to sync paths now, like from the save hook of an editor or
+        a script before tests
+
+        A request is a JSON line like {"paths": ["/a/1.py", "b"]}, the
+        paths are absolute or relative to the source path, and a folder is
+        synced with all files under it. The paths skip the batching window
+        of events and go through the same ignore rules and transport. The
+        reply is a JSON line like {"ok": true} once the remote has applied
+        them, or {"ok": false, "error": "..."}.
+
+        A request like {"wait": true, "timeout": 60} is a barrier, it's
+        replied once all events observed before it have been applied.
+
+        :param event_handler: `SpecchioEventHandler` -- the handler to sync
+        :param socket_path: str -- the path of Unix socket
+        :param timeout: int -- seconds to wait for the remote to apply a
+                               push
+        :return: None
+        """
+        self.event_handler = event_handler
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.server_socket = None
+        self.is_stopped = False
+
+    def start(self):
+        # A socket left by a stopped Specchio is replaced
+        try:
+            if stat.S_ISSOCK(os.lstat(self.socket_path).st_mode):
+                os.remove(self.socket_path)
+        except OSError:
+            pass
+        self.server_socket = socket.socket(socket.AF_UNIX,
+                                           socket.SOCK_STREAM)
+        # Only the user can connect
+        umask = os.umask(0o077)
+        try:
+            self.server_socket.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        self.server_socket.listen(16)
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+        logger.info("Listen for pushed paths on {}".format(self.socket_path))
+
+    def stop(self):
+        self.is_stopped = True
+        if self.server_socket is None:
+            return
+        try:
+            # Wake up `accept`
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.server_socket.close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+    def run(self):
+        while not self.is_stopped:
+            try:
+                connection, _ = self.server_socket.accept()
+            except socket.error as e:
+                if not self.is_stopped:
+                    logger.error("Failed to accept a push: {}".format(e))
+                    time.sleep(1)
+                continue
+            thread = threading.Thread(target=self.handle,
+                                      args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, connection):
+        """Reply the requests of a connection one by one
+
+        :param connection: socket -- the accepted connection
+        :return: None
+        """
+        try:
+            reader = connection.makefile("rb")
+            while True:
+                line = reader.readline()
+                if not line:
+                    break
+                connection.sendall(json.dumps(self.reply(line)) + "\n")
+        except socket.error:
+            pass
+        finally:
+            connection.close()
+
+    def get_relative_paths(self, paths):
+        """Check the paths of a request
+
+        :param paths: list of str -- absolute path, or relative to the
+                                     source path
+        :return: list of str -- relative path of files or folders
+        """
+        src_path = os.path.abspath(self.event_handler.src_path)
+        relative_paths = []
+        for path in paths:
+            if isinstance(path, unicode):
+                path = path.encode("utf-8")
+            abs_path = os.path.abspath(os.path.join(src_path, path))
+            if abs_path != src_path and not abs_path.startswith(
+                src_path + "/"
+            ):
+                raise ValueError("{} is not under the source path".format(
+                    path
+                ))
+            relative_paths.append(get_relative_path(src_path, abs_path))
+        return relative_paths
+
+    def reply(self, line):
+        """Run a request, a push or a barrier
+
+        :param line: str -- the request
+        :return: dict -- the reply
+        """
+        try:
+            request = json.loads(line)
+            if request.get("wait"):
+                timeout = float(request.get("timeout") or
+                                DEFAULT_WAIT_TIMEOUT)
+            else:
+                paths = request["paths"]
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            return {"ok": False, "error": "Invalid request: {}".format(e)}
+        if request.get("wait"):
+            return self.wait(timeout)
+        return self.push(paths)
+
+    def wait(self, timeout):
+        """Wait until all events observed before have been applied
+
+        :param timeout: float -- max seconds to wait
+        :return: dict -- the reply
+        """
+        if self.event_handler.wait_synced(timeout):
+            return {"ok": True}
+        if self.event_handler.is_offline():
+            return {"ok": False, "error": "Remote is unreachable, the "
+                                          "changes are journaled"}
+        return {"ok": False, "error": "Timed out"}
+
+    def push(self, paths):
+        """Sync the paths of a request before other events, and wait for
+        the remote to apply them
+
+        :param paths: list of str -- the paths of request
+        :return: dict -- the reply
+        """
+        try:
+            if not isinstance(paths, list) or not all(
+                isinstance(path, basestring) for path in paths
+            ):
+                raise ValueError("The paths must be a list of string")
+            paths = self.get_relative_paths(paths)
+        except ValueError as e:
+            return {"ok": False, "error": "Invalid request: {}".format(e)}
+        done = threading.Event()
+        results = []
+
+        def _sync():
+            try:
+                results.append(self.event_handler.sync_now(paths))
+            finally:
+                done.set()
+
+        self.event_handler.scheduler.submit(INTERACTIVE, _sync)
+        if not done.wait(self.timeout):
+            return {"ok": False, "error": "Timed out"}
+        if not (results and results[0]):
+            return {"ok": False, "error": "Failed to sync, or the remote "
+                                          "is unreachable"}
+        return {"ok": True}
+
+
+def push_paths(socket_path, paths, timeout=DEFAULT_PUSH_TIMEOUT):
+    """Ask a running Specchio to sync paths now, and wait for the remote to
+    apply them
+
+    :param socket_path: str -- the path of Unix socket of `PushServer`
+    :param paths: list of str -- the path of files or folders
+    :param timeout: int -- seconds to wait
+    :return: tuple -- (whether the remote has applied the paths, the error)
+    """
+    return send_request(socket_path, {
+        "paths": [os.path.abspath(path) for path in paths]
+    }, timeout)
+
+
+def wait_synced(socket_path, timeout=DEFAULT_WAIT_TIMEOUT):
+    """Wait until a running Specchio has applied all events observed before
+    remotely, it returns at once if there is nothing to sync
+
+    :param socket_path: str -- the path of Unix socket of `PushServer`
+    :param timeout: int -- seconds to wait
+    :return: tuple -- (whether the remote has caught up, the error)
+    """
+    # The connection waits a little longer than the barrier
+    return send_request(socket_path, {"wait": True, "timeout": timeout},
+                        timeout + 5)
+
+
+def send_request(socket_path, request, timeout):
+    """Send a request to `PushServer` and wait for the reply
+
+    :param socket_path: str -- the path of Unix socket of `PushServer`
+    :param request: dict -- the request
+    :param timeout: int -- seconds to wait
+    :return: tuple -- (whether it succeeds, the error)
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request) + "\n")
+        reply = json.loads(client.makefile("rb").readline())
+    except (socket.error, ValueError) as e:
+        return False, str(e)
+    finally:
+        client.close()
+    return reply.get("ok") is True, reply.get("error")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import Queue
+import traceback
+
+from specchio.utils import match_ignore
+
+# The ignore rules of a worker process, set by `init_worker`
+_worker_rules = None
+
+
+def scan_folders(src_path, folders, rules, max_files):
+    """List folders until enough files are found, the ignored files and
+    folders are skipped, and the linked folders are not followed like
+    `os.walk`
+
+    :param src_path: str -- the absolute source path
+    :param folders: list of str -- relative path of folders to list
+    :param rules: tuple -- the arguments of `utils.match_ignore` after
+                           the path and isdir
+    :param max_files: int -- stop listing after this number of files
+    :return: tuple -- (relative path of files, relative path of folders
+                       not listed yet)
+    """
+    files = []
+    folders = list(folders)
+    while folders and len(files) < max_files:
+        folder = folders.pop()
+        try:
+            names = os.listdir(os.path.join(src_path, folder))
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(folder, name)
+            abs_path = os.path.join(src_path, path)
+            if os.path.isdir(abs_path):
+                if (not os.path.islink(abs_path) and
+                        not match_ignore(abs_path, True, *rules)):
+                    folders.append(path)
+            elif not match_ignore(abs_path, False, *rules):
+                files.append(path)
+    return files, folders
+
+
+def init_worker(rules):
+    global _worker_rules
+    _worker_rules = rules
+
+
+def scan_worker(src_path, folders, max_files):
+    """Same as `scan_folders` in a worker process
+
+    :return: tuple -- (relative path of files joined by "\\0", relative
+                       path of folders not listed yet), or (None, the
+                       traceback) if it fails
+    """
+    try:
+        files, folders = scan_folders(src_path, folders, _worker_rules,
+                                      max_files)
+    except Exception:
+        return None, traceback.format_exc()
+    # One string is much cheaper to send back than a list of strings
+    return "\0".join(files), folders
+
+
+class ParallelScanner(object):
+
+    def __init__(self, processes=None, batch_size=2000):
+        """Constructor of `ParallelScanner`, list all files which are not
+        ignored, the folders are spread across a process pool
+
+        Each worker lists folders until it finds `batch_size` files, and
+        sends back the files and the folders not listed yet, which are
+        split for the idle workers. A tree smaller than one batch is
+        listed without the pool.
+
+        :param processes: int -- number of worker processes, the number of
+                                 cores by default
+        :param batch_size: int -- max number of files in one batch
+        :return: None
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+
+    def iter_batches(self, src_path, folder, rules):
+        """List all files which are not ignored under a folder
+
+        :param src_path: str -- the absolute source path
+        :param folder: str -- relative path of folder to list
+        :param rules: tuple -- the arguments of `utils.match_ignore` after
+                               the path and isdir
+        :return: generator of list of str -- batches of relative path of
+                                             files, in no order
+        """
+        if match_ignore(os.path.join(src_path, folder), True, *rules):
+            return
+        files, folders = scan_folders(src_path, [folder], rules,
+                                      self.batch_size)
+        if files:
+            yield files
+        if folders and self.processes < 2:
+            while folders:
+                files, folders = scan_folders(src_path, folders, rules,
+                                              self.batch_size)
+                if files:
+                    yield files
+            return
+        if not folders:
+            return
+        results = Queue.Queue()
+        pool = multiprocessing.Pool(self.processes, initializer=init_worker,
+                                    initargs=(rules,))
+        running = 0
+        try:
+            while folders or running:
+                # Keep two tasks per worker, so no worker waits for the
+                # result to be read
+                count = min(len(folders), self.processes * 2 - running)
+                for index in range(count):
+                    pool.apply_async(
+                        scan_worker,
+                        (src_path, folders[index::count], self.batch_size),
+                        callback=results.put
+                    )
+                running += count
+                if count:
+                    folders = []
+                data, _folders = results.get()
+                running -= 1
+                if data is None:
+                    raise RuntimeError("Failed to scan {0}: {1}".format(
+                        src_path, _folders
+                    ))
+                folders.extend(_folders)
+                if data:
+                    yield data.split("\0")
+        finally:
+            pool.terminate()
+            pool.join()
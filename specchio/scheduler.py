@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import heapq
+import threading
+import time
+
+from specchio.utils import logger
+
+# Priority classes of sync tasks, smaller is higher
+INTERACTIVE = 0
+GITIGNORE = 1
+BULK = 2
+
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    GITIGNORE: "gitignore",
+    BULK: "bulk"
+}
+
+
+class SyncScheduler(object):
+
+    def __init__(self, bulk_workers=1, report_interval=60):
+        """Constructor of `SyncScheduler`
+
+        Interactive and `.gitignore` tasks run one by one in a foreground
+        thread by priority, and tasks of the same priority run in order.
+        Bulk tasks run in at most `bulk_workers` background threads, so
+        they never delay the foreground tasks. Queueing delay is measured
+        for each priority class.
+
+        Tasks are only queued before `start`, `run_pending` runs them in
+        the current thread instead. Only the tracked tasks, like the ones
+        from events, have a sequence number to wait for, so background work
+        never delays `wait`.
+
+        :param bulk_workers: int -- the number of threads for bulk tasks
+        :param report_interval: int -- seconds between two reports of
+                                       queueing delay
+        :return: None
+        """
+        self.bulk_workers = bulk_workers
+        self.report_interval = report_interval
+        self.condition = threading.Condition()
+        self.foreground_tasks = []
+        self.bulk_tasks = collections.deque()
+        # The order of all tasks, and the sequence number of tracked tasks
+        self.count = 0
+        self.seq = 0
+        # The sequence number of tracked tasks queued or running
+        self.unfinished = set()
+        # The sequence number of the task running in each thread
+        self.local = threading.local()
+        self.threads = []
+        self.is_stopped = False
+        # The priority is the key, the value is [count, total delay, max]
+        self.delays = dict((priority, [0, 0.0, 0.0])
+                           for priority in PRIORITY_NAMES)
+        self.last_report_time = time.time()
+
+    def submit(self, priority, func, *args, **kwargs):
+        """Queue a task
+
+        :param priority: int -- `INTERACTIVE`, `GITIGNORE` or `BULK`
+        :param func: callable -- the task
+        :param is_tracked: bool -- keyword only, give the task a sequence
+                                   number to wait for
+        :return: int -- the sequence number of the task, None if it's not
+                        tracked
+        """
+        is_tracked = kwargs.pop("is_tracked", False)
+        with self.condition:
+            self.count += 1
+            seq = None
+            if is_tracked:
+                self.seq += 1
+                seq = self.seq
+                self.unfinished.add(seq)
+            task = (priority, self.count, seq, time.time(), func, args)
+            if priority == BULK:
+                self.bulk_tasks.append(task)
+            else:
+                heapq.heappush(self.foreground_tasks, task)
+            self.condition.notify_all()
+            return seq
+
+    def pop(self, is_bulk, block=True):
+        with self.condition:
+            tasks = self.bulk_tasks if is_bulk else self.foreground_tasks
+            while not tasks:
+                if self.is_stopped or not block:
+                    return None
+                self.condition.wait()
+            if is_bulk:
+                return tasks.popleft()
+            return heapq.heappop(tasks)
+
+    def run_task(self, task):
+        priority, _, seq, submit_time, func, args = task
+        delay = time.time() - submit_time
+        with self.condition:
+            self.delays[priority][0] += 1
+            self.delays[priority][1] += delay
+            self.delays[priority][2] = max(self.delays[priority][2], delay)
+        self.local.seq = seq
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("Failed to run {} task".format(
+                PRIORITY_NAMES[priority]
+            ))
+        finally:
+            self.local.seq = None
+        with self.condition:
+            self.unfinished.discard(seq)
+            self.condition.notify_all()
+        if time.time() - self.last_report_time >= self.report_interval:
+            self.report()
+
+    def run(self, is_bulk):
+        while True:
+            task = self.pop(is_bulk)
+            if task is None:
+                break
+            self.run_task(task)
+
+    def run_pending(self):
+        """Run all queued tasks in the current thread, foreground tasks
+        first
+
+        :return: None
+        """
+        for is_bulk in (False, True):
+            while True:
+                task = self.pop(is_bulk, block=False)
+                if task is None:
+                    break
+                self.run_task(task)
+
+    def get_current_seq(self):
+        """Get the sequence number of the task running in the current thread
+
+        :return: int -- None if the task isn't tracked, or no task is
+                        running
+        """
+        return getattr(self.local, "seq", None)
+
+    def wait(self, seq, timeout=None):
+        """Wait until all tracked tasks up to a sequence number have been
+        run
+
+        :param seq: int -- the sequence number returned by `submit`
+        :param timeout: float -- max seconds to wait, None is unlimited
+        :return: bool -- False if it times out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.unfinished and min(self.unfinished) <= seq:
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def start(self):
+        for is_bulk in [False] + [True] * self.bulk_workers:
+            thread = threading.Thread(target=self.run, args=(is_bulk,))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """Stop all threads after the foreground tasks are done, the bulk
+        threads are not waited
+
+        :return: None
+        """
+        with self.condition:
+            self.is_stopped = True
+            self.condition.notify_all()
+        if self.threads:
+            self.threads[0].join()
+
+    def get_delays(self):
+        """Get queueing delay of each priority class
+
+        :return: dict -- the name of priority class is the key, the value is
+                         a tuple like (count, average delay, max delay)
+        """
+        with self.condition:
+            return dict(
+                (PRIORITY_NAMES[priority],
+                 (count, total / count if count else 0.0, max_delay))
+                for priority, (count, total, max_delay)
+                in self.delays.items()
+            )
+
+    def report(self):
+        self.last_report_time = time.time()
+        for name, (count, average, max_delay) in sorted(
+            self.get_delays().items()
+        ):
+            if count:
+                logger.debug("{0} tasks: {1} run, queueing delay {2:.3f}s "
+                             "average, {3:.3f}s max".format(
+                                 name, count, average, max_delay
+                             ))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import os
+import time
+
+from specchio.events import iter_self_and_ancestors
+
+
+class StormDetector(object):
+
+    def __init__(self, root_path, max_rate=200, max_depth=1000,
+                 settle_time=2, clock=time):
+        """Constructor of `StormDetector`
+
+        A storm starts when the rate of events or the depth of the event
+        queue is too high. During a storm, events are not handled one by
+        one, only the folders of them are marked dirty, and the storm ends
+        when there is no event for `settle_time` seconds.
+
+        :param root_path: str -- source path, it's marked dirty instead when
+                                 there are too many dirty folders
+        :param max_rate: int -- max number of events in one second
+        :param max_depth: int -- max number of pending events, it's also the
+                                 max number of dirty folders
+        :param settle_time: int -- seconds without event to end a storm
+        :param clock: object -- has `time` like the module, to replay a
+                                trace by its own time
+        :return: None
+        """
+        self.root_path = root_path.rstrip("/") or "/"
+        self.max_rate = max_rate
+        self.max_depth = max_depth
+        self.settle_time = settle_time
+        self.clock = clock
+        self.is_storm = False
+        self.event_times = collections.deque()
+        self.last_event_time = 0
+        self.dirty_folders = set()
+
+    def record(self, depth):
+        """Record an event and check whether it's in a storm
+
+        :param depth: int -- the number of pending events with this event
+        :return: bool -- in a storm or not
+        """
+        now = self.clock.time()
+        self.last_event_time = now
+        if self.is_storm:
+            return True
+        self.event_times.append(now)
+        while self.event_times and self.event_times[0] <= now - 1:
+            self.event_times.popleft()
+        if len(self.event_times) > self.max_rate or depth > self.max_depth:
+            self.is_storm = True
+            self.event_times.clear()
+        return self.is_storm
+
+    def mark_dirty(self, paths):
+        """Mark the folders of an event dirty
+
+        :param paths: list of str -- the paths of the event during a storm
+        :return: None
+        """
+        if self.root_path in self.dirty_folders:
+            return
+        for path in paths:
+            self.dirty_folders.add(os.path.dirname(path.rstrip("/")))
+        if len(self.dirty_folders) > self.max_depth:
+            self.dirty_folders = set([self.root_path])
+
+    def pop_dirty_folders(self):
+        """End the storm if activity settles, and get the dirty folders
+
+        :return: list of str -- dirty folders without the one under another
+                                dirty folder, empty if it's not settled
+        """
+        if (not self.is_storm or
+                self.clock.time() - self.last_event_time < self.settle_time):
+            return []
+        dirty_folders = set(
+            folder for folder in self.dirty_folders
+            if self.root_path in iter_self_and_ancestors(folder)
+        ) or set([self.root_path])
+        self.is_storm = False
+        self.dirty_folders = set()
+        return sorted(
+            folder for folder in dirty_folders
+            if not any(_folder in dirty_folders for _folder in
+                       list(iter_self_and_ancestors(folder))[1:])
+        )
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+
+from specchio.handlers import SpecchioEventHandler
+from specchio.utils import get_relative_path
+from watchdog.events import (DirCreatedEvent, DirDeletedEvent,
+                             DirModifiedEvent, DirMovedEvent,
+                             FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent, FileMovedEvent)
+
+try:
+    from watchdog.events import FileClosedEvent
+except ImportError:
+    # Only watchdog 0.10 and later sends `closed`
+    FileClosedEvent = None
+
+TRACE_VERSION = 1
+
+# The event type and whether it's a folder are the key
+EVENT_CLASSES = {
+    ("created", False): FileCreatedEvent,
+    ("created", True): DirCreatedEvent,
+    ("deleted", False): FileDeletedEvent,
+    ("deleted", True): DirDeletedEvent,
+    ("modified", False): FileModifiedEvent,
+    ("modified", True): DirModifiedEvent,
+    ("moved", False): FileMovedEvent,
+    ("moved", True): DirMovedEvent
+}
+if FileClosedEvent is not None:
+    EVENT_CLASSES[("closed", False)] = FileClosedEvent
+
+
+class ReplayClock(object):
+
+    def __init__(self, speed):
+        """Constructor of `ReplayClock`, the time of a trace, it's the
+        clock of the handler during a replay
+
+        :param speed: float -- 1 is the original speed, 2 is twice as fast,
+                               0 is as fast as possible
+        :return: None
+        """
+        self.speed = speed
+        self.start_time = time.time()
+        self.trace_time = 0
+
+    def time(self):
+        if self.speed:
+            return self.start_time + (
+                time.time() - self.start_time
+            ) * self.speed
+        return self.start_time + self.trace_time
+
+    def sleep(self, seconds):
+        self.advance(self.time() - self.start_time + seconds)
+
+    def advance(self, trace_time):
+        """Wait until a time of the trace
+
+        :param trace_time: float -- seconds since the start of trace
+        :return: None
+        """
+        if self.speed:
+            time.sleep(max(0, self.start_time + trace_time / self.speed -
+                           time.time()))
+        self.trace_time = max(self.trace_time, trace_time)
+
+
+class TraceRecorder(object):
+
+    def __init__(self, trace_path, src_path):
+        """Constructor of `TraceRecorder`, the raw events are written to a
+        trace file, one JSON list per line like
+        [seconds since start, event type, is folder, src path, dest path],
+        the paths are relative to the source path
+
+        :param trace_path: str -- the path of trace file
+        :param src_path: str -- source path
+        :return: None
+        """
+        self.src_path = src_path
+        self.trace_file = open(trace_path, "w")
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+        self.trace_file.write(json.dumps({
+            "version": TRACE_VERSION, "start_time": self.start_time
+        }) + "\n")
+
+    def record(self, event):
+        line = [round(time.time() - self.start_time, 6), event.event_type,
+                int(event.is_directory)]
+        paths = [event.src_path]
+        if hasattr(event, "dest_path"):
+            paths.append(event.dest_path)
+        for path in paths:
+            line.append(get_relative_path(self.src_path, path).decode(
+                "utf-8", "replace"
+            ))
+        with self.lock:
+            self.trace_file.write(json.dumps(line, separators=(",", ":")) +
+                                  "\n")
+
+    def flush(self):
+        with self.lock:
+            self.trace_file.flush()
+
+    def close(self):
+        with self.lock:
+            self.trace_file.close()
+
+
+def read_trace(trace_path, src_path):
+    """Read all events in a trace file
+
+    :param trace_path: str -- the path of trace file
+    :param src_path: str -- source path of the events
+    :return: generator of tuple -- (seconds since start, event)
+    """
+    with open(trace_path, "r") as trace_file:
+        header = json.loads(trace_file.readline())
+        if header.get("version") != TRACE_VERSION:
+            raise ValueError("Unsupported trace version {}".format(
+                header.get("version")
+            ))
+        for line in trace_file:
+            item = json.loads(line)
+            event_class = EVENT_CLASSES.get((item[1], bool(item[2])))
+            if event_class is None:
+                # Like `closed` recorded by a newer watchdog
+                continue
+            paths = [os.path.join(src_path, path.encode("utf-8"))
+                     for path in item[3:]]
+            yield item[0], event_class(*paths)
+
+
+class FakeTransport(object):
+
+    def __init__(self, clock, dst_root_path):
+        """Constructor of `FakeTransport`, a transport which records the
+        operations instead of running them, and measures the latency from
+        each event to the operation of its path
+
+        :param clock: callable -- get the current time of the replay
+        :param dst_root_path: str -- destination path of the handler
+        :return: None
+        """
+        self.clock = clock
+        self.dst_root_path = dst_root_path
+        # The operation name is the key, the value is the number of calls
+        self.operations = {}
+        # The path is the key, the value is the time of the oldest event
+        # not synced yet
+        self.pending_paths = {}
+        self.latencies = []
+
+    def on_event(self, paths):
+        now = self.clock()
+        for path in paths:
+            self.pending_paths.setdefault(path, now)
+
+    def on_operation(self, name, paths):
+        self.operations[name] = self.operations.get(name, 0) + 1
+        now = self.clock()
+        for path in paths:
+            event_time = self.pending_paths.pop(path, None)
+            if event_time is not None:
+                self.latencies.append(now - event_time)
+
+    def on_dst_operation(self, name, dst_paths):
+        self.on_operation(name, [
+            get_relative_path(self.dst_root_path, dst_path)
+            for dst_path in dst_paths
+        ])
+
+    def create_folder(self, dst_path):
+        self.on_dst_operation("create_folder", [dst_path])
+        return True
+
+    def remove(self, dst_path):
+        self.on_dst_operation("remove", [dst_path])
+        return True
+
+    def remove_multi(self, dst_paths):
+        self.on_dst_operation("remove_multi", dst_paths)
+        return True
+
+    def move(self, src_path, dst_path):
+        self.on_dst_operation("move", [src_path, dst_path])
+        return True
+
+    def send_file(self, src_path, dst_path):
+        self.on_dst_operation("send_file", [dst_path])
+        return True
+
+    def send_large_file(self, src_path, dst_path, bwlimit=None,
+                        is_resumed=False):
+        self.on_dst_operation("send_large_file", [dst_path])
+        return True
+
+    def send_files(self, folder_path, src_paths, dst_path, bwlimit=None):
+        # The source paths are relative already
+        self.on_operation("send_files", list(src_paths))
+        return True
+
+    def send_all(self, folder_path, src_paths, dst_path):
+        self.on_operation("send_all", list(src_paths))
+        return True
+
+    def is_empty(self, dst_path):
+        return True
+
+    def is_reachable(self, dst_path):
+        return True
+
+    def manifest(self, dst_path, with_hash=False, folder_paths=None):
+        return iter([])
+
+    def get_report(self):
+        """Get the operations and the latency percentiles
+
+        :return: dict -- operations, number of events not synced, and the
+                         50th, 95th, max latency in seconds
+        """
+        latencies = sorted(self.latencies)
+
+        def _percentile(percent):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1,
+                                 int(len(latencies) * percent / 100))]
+
+        return {
+            "operations": dict(self.operations),
+            "unsynced": len(self.pending_paths),
+            "p50": _percentile(50),
+            "p95": _percentile(95),
+            "max": latencies[-1] if latencies else 0.0
+        }
+
+
+def replay(trace_path, src_path, speed=0, flush_interval=1, **kwargs):
+    """Feed a trace into `SpecchioEventHandler` against `FakeTransport`
+
+    The handler is flushed every `flush_interval` seconds of the trace,
+    and all scheduled tasks run in the current thread, so the operations
+    are deterministic. The time of the handler follows the trace.
+
+    :param trace_path: str -- the path of trace file
+    :param src_path: str -- source path of the handler, the files of
+                            events are looked up here
+    :param speed: float -- 1 is the original speed, 2 is twice as fast,
+                           0 is as fast as possible
+    :param flush_interval: float -- seconds of trace between two flushes
+    :return: dict -- same as `FakeTransport.get_report`
+    """
+    dst_path = "/specchio-replay/"
+    clock = ReplayClock(speed)
+    transport = FakeTransport(lambda: clock.time() - clock.start_time,
+                              dst_path)
+    # The large file lane runs in its own thread, which is not replayed
+    kwargs.setdefault("large_file_size", None)
+    # Reconciliation compares with the real remote, which is not replayed
+    kwargs["reconcile_interval"] = None
+    handler = SpecchioEventHandler(
+        src_path=src_path, dst_ssh=None, dst_path=dst_path,
+        transport=transport, clock=clock, **kwargs
+    )
+    flush_times = [flush_interval]
+
+    def _flush_until(trace_time):
+        while flush_times[0] <= trace_time:
+            clock.advance(flush_times[0])
+            handler.flush()
+            handler.scheduler.run_pending()
+            flush_times[0] += flush_interval
+
+    for event_time, event in read_trace(trace_path, src_path):
+        _flush_until(event_time)
+        clock.advance(event_time)
+        transport.on_event([
+            get_relative_path(src_path, path)
+            for path in handler.get_event_paths(event)
+        ])
+        handler.dispatch(event)
+    # Keep flushing until the storm has settled
+    end_time = clock.trace_time + 60
+    _flush_until(clock.trace_time + flush_interval)
+    while handler.storm_detector.is_storm and flush_times[0] <= end_time:
+        _flush_until(flush_times[0])
+    return transport.get_report()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import os
+import shutil
+
+from specchio.merkle import RemoteMerkleTree
+from specchio.utils import (get_manifest_value, logger, remote_create_folder,
+                            remote_is_empty, remote_is_reachable,
+                            remote_manifest, remote_mv, remote_rm,
+                            remote_rm_multi, rsync, rsync_large, rsync_multi,
+                            tar_multi)
+
+# `ioctl` request to clone a file by reflink, like `cp --reflink`
+FICLONE = 0x40049409
+
+# Errors of `copy_file_range` when the file systems can't copy in kernel
+COPY_FALLBACK_ERRORS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                        errno.EOPNOTSUPP, errno.EBADF)
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _copy_file_range = _libc.copy_file_range
+    _copy_file_range.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int,
+                                 ctypes.c_void_p, ctypes.c_size_t,
+                                 ctypes.c_uint]
+    _copy_file_range.restype = ctypes.c_ssize_t
+except (AttributeError, OSError, TypeError):
+    _copy_file_range = None
+
+
+def copy_data(src_fd, dst_fd):
+    """Copy all data from the position of a file to another, by reflink,
+    `copy_file_range` or `sendfile` without copying to user space if the
+    file system supports it, otherwise by read and write
+
+    :param src_fd: int -- file descriptor to read
+    :param dst_fd: int -- file descriptor to write
+    :return: None
+    """
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return
+    except (IOError, OSError):
+        pass
+    if _copy_file_range is not None:
+        while True:
+            count = _copy_file_range(src_fd, None, dst_fd, None, 1 << 30, 0)
+            if count == 0:
+                return
+            if count < 0:
+                error = ctypes.get_errno()
+                if error not in COPY_FALLBACK_ERRORS:
+                    raise OSError(error, os.strerror(error))
+                break
+    if hasattr(os, "sendfile"):
+        offset = os.lseek(src_fd, 0, os.SEEK_CUR)
+        try:
+            while True:
+                count = os.sendfile(dst_fd, src_fd, offset, 1 << 30)
+                if count == 0:
+                    return
+                offset += count
+        except OSError as e:
+            if e.errno not in COPY_FALLBACK_ERRORS:
+                raise
+        os.lseek(src_fd, offset, os.SEEK_SET)
+    while True:
+        data = os.read(src_fd, 1 << 20)
+        if not data:
+            return
+        while data:
+            data = data[os.write(dst_fd, data):]
+
+
+def copy_file(src_path, dst_path):
+    """Copy a file or link with its mode and modification time like
+    `rsync -a`, the destination is replaced atomically
+
+    :param src_path: str -- source of file
+    :param dst_path: str -- destination of file
+    :return: None
+    """
+    folder_path, name = os.path.split(dst_path)
+    tmp_path = os.path.join(folder_path, ".{}.specchio".format(name))
+    if os.path.islink(src_path):
+        os.symlink(os.readlink(src_path), tmp_path)
+    else:
+        with open(src_path, "rb") as src_file:
+            with open(tmp_path, "wb") as dst_file:
+                copy_data(src_file.fileno(), dst_file.fileno())
+        shutil.copystat(src_path, tmp_path)
+    if os.path.isdir(dst_path) and not os.path.islink(dst_path):
+        shutil.rmtree(dst_path)
+    os.rename(tmp_path, dst_path)
+
+
+class SSHTransport(object):
+
+    def __init__(self, dst_ssh):
+        """Constructor of `SSHTransport`, sync to a remote system by ssh and
+        rsync
+
+        All transports have the same methods, and the destination paths are
+        absolute. The methods which change the destination return whether
+        they succeed.
+
+        :param dst_ssh: str -- user name and host name of destination path
+                               just like: user@host
+        :return: None
+        """
+        self.dst_ssh = dst_ssh
+
+    def create_folder(self, dst_path):
+        return remote_create_folder(dst_ssh=self.dst_ssh, dst_path=dst_path)
+
+    def remove(self, dst_path):
+        return remote_rm(dst_ssh=self.dst_ssh, dst_path=dst_path)
+
+    def remove_multi(self, dst_paths):
+        return remote_rm_multi(dst_ssh=self.dst_ssh, dst_paths=dst_paths)
+
+    def move(self, src_path, dst_path):
+        return remote_mv(dst_ssh=self.dst_ssh, src_path=src_path,
+                         dst_path=dst_path)
+
+    def send_file(self, src_path, dst_path):
+        return rsync(dst_ssh=self.dst_ssh, src_path=src_path,
+                     dst_path=dst_path)
+
+    def send_large_file(self, src_path, dst_path, bwlimit=None,
+                        is_resumed=False):
+        """Send a large file, the interrupted transfer is resumed next time
+
+        :return: bool -- whether the transfer succeeds
+        """
+        return rsync_large(dst_ssh=self.dst_ssh, src_path=src_path,
+                           dst_path=dst_path, bwlimit=bwlimit,
+                           is_resumed=is_resumed)
+
+    def send_files(self, folder_path, src_paths, dst_path, bwlimit=None):
+        return rsync_multi(dst_ssh=self.dst_ssh, folder_path=folder_path,
+                           src_paths=src_paths, dst_path=dst_path,
+                           bwlimit=bwlimit)
+
+    def send_all(self, folder_path, src_paths, dst_path):
+        """Send all files to an empty destination, the files are streamed
+
+        :return: bool -- whether the transfer succeeds
+        """
+        return tar_multi(dst_ssh=self.dst_ssh, folder_path=folder_path,
+                         src_paths=src_paths, dst_path=dst_path)
+
+    def is_empty(self, dst_path):
+        return remote_is_empty(dst_ssh=self.dst_ssh, dst_path=dst_path)
+
+    def is_reachable(self, dst_path):
+        return remote_is_reachable(dst_ssh=self.dst_ssh)
+
+    def manifest(self, dst_path, with_hash=False, folder_paths=None):
+        return remote_manifest(self.dst_ssh, dst_path, with_hash,
+                               folder_paths)
+
+    def merkle_tree(self, dst_path, rules, includes=(), excludes=()):
+        return RemoteMerkleTree(self.dst_ssh, dst_path, rules,
+                                includes=includes, excludes=excludes)
+
+
+class LocalTransport(object):
+
+    def __init__(self):
+        """Constructor of `LocalTransport`, sync to a local folder, like a
+        mounted volume or a bind mount of container, the files are copied
+        without copying to user space when possible
+
+        :return: None
+        """
+
+    def create_folder(self, dst_path):
+        if not os.path.isdir(dst_path):
+            try:
+                os.makedirs(dst_path)
+            except OSError:
+                logger.error("Failed to create {}".format(dst_path))
+                return False
+        return True
+
+    def remove(self, dst_path):
+        try:
+            if os.path.isdir(dst_path) and not os.path.islink(dst_path):
+                shutil.rmtree(dst_path)
+            elif os.path.lexists(dst_path):
+                os.remove(dst_path)
+        except OSError:
+            logger.error("Failed to remove {}".format(dst_path))
+            return False
+        return True
+
+    def remove_multi(self, dst_paths):
+        return all([self.remove(dst_path) for dst_path in dst_paths])
+
+    def move(self, src_path, dst_path):
+        try:
+            os.rename(src_path, dst_path)
+        except OSError:
+            logger.error("Failed to move {0} to {1}".format(src_path,
+                                                            dst_path))
+            return False
+        return True
+
+    def send_file(self, src_path, dst_path):
+        return self.send_large_file(src_path, dst_path)
+
+    def send_large_file(self, src_path, dst_path, bwlimit=None,
+                        is_resumed=False):
+        try:
+            if os.path.isdir(src_path) and not os.path.islink(src_path):
+                for root_path, _, files_path in os.walk(src_path):
+                    _dst_path = os.path.join(
+                        dst_path, os.path.relpath(root_path, src_path)
+                    )
+                    self.create_folder(_dst_path)
+                    for file_path in files_path:
+                        copy_file(os.path.join(root_path, file_path),
+                                  os.path.join(_dst_path, file_path))
+            else:
+                copy_file(src_path, dst_path)
+        except (IOError, OSError):
+            logger.error("Failed to copy {0} to {1}".format(src_path,
+                                                            dst_path))
+            return False
+        return True
+
+    def send_files(self, folder_path, src_paths, dst_path, bwlimit=None):
+        is_succeeded = True
+        for src_path in src_paths:
+            _dst_path = os.path.join(dst_path, src_path)
+            is_succeeded = (
+                self.create_folder(os.path.dirname(_dst_path)) and
+                self.send_large_file(os.path.join(folder_path, src_path),
+                                     _dst_path) and
+                is_succeeded
+            )
+        return is_succeeded
+
+    def send_all(self, folder_path, src_paths, dst_path):
+        return self.send_files(folder_path, src_paths, dst_path)
+
+    def is_empty(self, dst_path):
+        return not os.path.isdir(dst_path) or not os.listdir(dst_path)
+
+    def is_reachable(self, dst_path):
+        return os.path.isdir(dst_path)
+
+    def manifest(self, dst_path, with_hash=False, folder_paths=None):
+        """Same as `utils.remote_manifest`
+
+        :return: generator of tuple -- (relative path, value)
+        """
+        if not (folder_paths and all(folder_paths)):
+            folder_paths = [""]
+        file_paths = []
+        for folder_path in folder_paths:
+            for root_path, _, files_path in os.walk(
+                os.path.join(dst_path, folder_path)
+            ):
+                for file_path in files_path:
+                    abs_file_path = os.path.join(root_path, file_path)
+                    # Like `find -type f`
+                    if (os.path.isfile(abs_file_path) and
+                            not os.path.islink(abs_file_path)):
+                        file_paths.append(
+                            os.path.relpath(abs_file_path, dst_path)
+                        )
+        for file_path in sorted(file_paths):
+            value = get_manifest_value(os.path.join(dst_path, file_path),
+                                       with_hash)
+            if value is not None:
+                yield file_path, value
+
+    def merkle_tree(self, dst_path, rules, includes=(), excludes=()):
+        return RemoteMerkleTree(None, dst_path, rules, includes=includes,
+                                excludes=excludes)
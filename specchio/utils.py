@@ -1,25 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import copy
 import fnmatch
+import hashlib
 import logging
 import logging.config
 import os
+import pipes
 import re
+import subprocess
 
 from specchio.config.logging import LOGGING_CONFIG
 
 
-def get_re_from_single_line(line):
-    """Get regular expression from a single line in `.gitignore`
+def get_glob_from_single_line(line):
+    """Get glob pattern from a single line in `.gitignore`
     The rules of `.gitingore` followed http://git-scm.com/docs/gitignore
 
     :param line: str -- single line from `.gitignore`
     :return: tuple
         0, None -- noting to match
         1, str -- hash to match
-        2, str -- negate ignore path to match
-        3, str -- ignore path to match
+        2, str -- negate ignore glob to match
+        3, str -- ignore glob to match
     """
     _line = line.strip()
     # Deal with file name end with ` `
@@ -53,9 +57,92 @@ def get_re_from_single_line(line):
         line = line.replace("\\", "")
         if line.startswith("./"):
             # Dealing with line start with `./`, just remove the head
-            return re_type, fnmatch.translate(line[2:])
+            return re_type, line[2:]
+        else:
+            return re_type, line
+
+
+def get_re_from_single_line(line):
+    """Get regular expression from a single line in `.gitignore`
+
+    :param line: str -- single line from `.gitignore`
+    :return: tuple -- same as `get_glob_from_single_line`, but the glob is
+                      translated to regular expression
+    """
+    re_type, pattern = get_glob_from_single_line(line)
+    if re_type in (2, 3):
+        return re_type, fnmatch.translate(pattern)
+    return re_type, pattern
+
+
+class PatternSet(object):
+
+    def __init__(self, globs=()):
+        """Constructor of `PatternSet`, a set of glob patterns matched
+        against a whole relative path, the same as `fnmatch`
+
+        Most patterns are plain names, `*` with a suffix or a prefix with
+        `*`, these are matched by hash lookups, and only real wildcards are
+        matched by regular expression.
+
+        :param globs: iterable of str -- glob patterns
+        :return: None
+        """
+        self.literals = set()
+        # The length of suffix or prefix is the key, the value is a set
+        self.suffixes = {}
+        self.prefixes = {}
+        self.regexes = []
+        # All glob patterns in order, and their regular expressions
+        self.globs = []
+        self.patterns = []
+        for glob in globs:
+            self.add(glob)
+
+    def add(self, glob):
+        self.globs.append(glob)
+        self.patterns.append(fnmatch.translate(glob))
+        if not _has_wildcard(glob):
+            self.literals.add(glob)
+        elif glob.endswith("*") and not _has_wildcard(glob[:-1]):
+            self.prefixes.setdefault(len(glob) - 1, set()).add(glob[:-1])
+        elif glob.startswith("*") and not _has_wildcard(glob[1:]):
+            self.suffixes.setdefault(len(glob) - 1, set()).add(glob[1:])
         else:
-            return re_type, fnmatch.translate(line)
+            self.regexes.append(re.compile(self.patterns[-1]))
+
+    def match(self, path):
+        """Check whether the path matches any pattern
+
+        :param path: str -- relative path, folder ends with "/"
+        :return: bool
+        """
+        if path in self.literals:
+            return True
+        for length, prefixes in self.prefixes.items():
+            if path[:length] in prefixes:
+                return True
+        for length, suffixes in self.suffixes.items():
+            if len(path) >= length and path[len(path) - length:] in suffixes:
+                return True
+        return any(_re.match(path) for _re in self.regexes)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __eq__(self, other):
+        return (isinstance(other, PatternSet) and
+                self.patterns == other.patterns)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "PatternSet({!r})".format(self.patterns)
+
+
+def _has_wildcard(glob):
+    return any(char in glob for char in "*?[")
 
 
 def walk_get_gitignore(base_path):
@@ -75,6 +162,36 @@ def walk_get_gitignore(base_path):
     return result
 
 
+def parse_gitignore(gitignore_path):
+    """Parse all glob patterns from a `.gitignore`
+
+    :param gitignore_path: str -- the path of `.gitignore`
+    :return: dict -- like the value of `get_all_re`, but the patterns are
+                     not compiled
+    """
+    result = {1: [], 2: [], 3: []}
+    with open(gitignore_path, "r") as gitignore_file:
+        for line in gitignore_file:
+            ignore_type, ignore_glob = get_glob_from_single_line(line)
+            if ignore_type:
+                result[ignore_type].append(ignore_glob)
+    return result
+
+
+def compile_gitignore(globs):
+    """Compile the glob patterns parsed by `parse_gitignore`
+
+    :param globs: dict -- the result of `parse_gitignore`
+    :return: dict -- like the value of `get_all_re`
+    """
+    return {
+        # If match some file
+        1: [re.compile(ignore_glob) for ignore_glob in globs[1]],
+        2: PatternSet(globs[2]),
+        3: PatternSet(globs[3])
+    }
+
+
 def get_all_re(gitignore_path_list):
     """Get all compiled regular expression from gitignore_list
 
@@ -83,20 +200,193 @@ def get_all_re(gitignore_path_list):
                      the value in dict is another dict, like
                      result[path of `.gitignore`][key2]:
                         result[path][1]: list of hash to match
-                        result[path][2]: list of negate ignore path to match
-                        result[path][3]: list of ignore path to match
-    """
-    result = {}
-    for gitignore_path in gitignore_path_list:
-        with open(gitignore_path, "r") as gitignore_file:
-            result[gitignore_path] = {1: [], 2: [], 3: []}
-            for line in gitignore_file:
-                ignore_type, ignore_pattern = get_re_from_single_line(line)
-                # If match some file
-                if ignore_type:
-                    _re = re.compile(ignore_pattern)
-                    result[gitignore_path][ignore_type].append(_re)
-    return result
+                        result[path][2]: `PatternSet` of negate ignore path
+                        result[path][3]: `PatternSet` of ignore path
+    """
+    return dict(
+        (gitignore_path, compile_gitignore(parse_gitignore(gitignore_path)))
+        for gitignore_path in gitignore_path_list
+    )
+
+
+def match_ignore(file_or_dir_path, isdir, git_path, gitignore_list,
+                 gitignore_dict):
+    """Check whether a path is ignored, by the nearest `.gitignore`
+
+    :param file_or_dir_path: str -- the absolute path of file or folder
+    :param isdir: bool -- whether the path is a folder
+    :param git_path: str -- the absolute path of `.git/`
+    :param gitignore_list: list of str -- the folder of all `.gitignore`,
+                                          the nearest one first
+    :param gitignore_dict: dict -- the result of `get_all_re`
+    :return: bool
+    """
+    if isdir and not file_or_dir_path.endswith("/"):
+        file_or_dir_path += "/"
+    if file_or_dir_path.startswith(git_path):
+        return True
+    for gitignore_folder_path in gitignore_list:
+        gitignore_path = gitignore_folder_path + ".gitignore"
+        if file_or_dir_path.startswith(gitignore_folder_path):
+            _relative_file_or_dir_path = (
+                file_or_dir_path[len(gitignore_folder_path):]
+            )
+            if gitignore_dict[gitignore_path][2].match(
+                _relative_file_or_dir_path
+            ):
+                return False
+            if gitignore_dict[gitignore_path][3].match(
+                _relative_file_or_dir_path
+            ):
+                return True
+    return False
+
+
+def get_relative_path(root_path, path):
+    """Get the path relative to a root path
+
+    :param root_path: str -- the root path
+    :param path: str -- the path under the root path
+    :return: str -- the relative path, "" for the root path itself
+    """
+    root_path = os.path.join(os.path.abspath(root_path), "")
+    path = os.path.abspath(path)
+    return "" if path + "/" == root_path else path[len(root_path):]
+
+
+def find_binary(name):
+    """Find a binary in `PATH` without running another process
+
+    :param name: str -- the name of binary, like `ssh`
+    :return: str -- the path of binary, None if it's not found
+    """
+    for folder_path in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        path = os.path.join(folder_path, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def is_git_work_tree(path):
+    """Check whether the path is inside a git work tree
+
+    :param path: str -- the path to check
+    :return: bool
+    """
+    try:
+        process = subprocess.Popen(
+            ["git", "rev-parse", "--is-inside-work-tree"], cwd=path,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except OSError:
+        # There is no `git` in the system or no such path
+        return False
+    return process.communicate()[0].strip() == "true"
+
+
+def git_ls_files(path):
+    """List all tracked files and untracked files which are not ignored in
+    the path from git index, the output of git is parsed as a stream
+
+    :param path: str -- the path inside a git work tree
+    :return: generator of str -- the path of file relative to the path
+    """
+    process = subprocess.Popen(
+        ["git", "ls-files", "-z", "--cached", "--others",
+         "--exclude-standard"], cwd=path, stdout=subprocess.PIPE
+    )
+    rest, last_file_path = "", None
+    for chunk in iter(lambda: process.stdout.read(65536), ""):
+        file_paths = (rest + chunk).split("\0")
+        rest = file_paths.pop()
+        for file_path in file_paths:
+            # Unmerged file is listed once for each stage
+            if file_path != last_file_path:
+                yield file_path
+            last_file_path = file_path
+    process.wait()
+
+
+def git_ignored_files(path):
+    """List the tracked files which are ignored, and the untracked files
+    which are ignored, an untracked folder ignored as a whole is listed
+    once
+
+    :param path: str -- the path inside a git work tree
+    :return: tuple -- (list of tracked files, list of untracked files or
+                       folders ending with "/"), relative to the path, None
+                       if git fails
+    """
+    outputs = [
+        git_output(path, ["ls-files", "-z", "--cached", "--ignored",
+                          "--exclude-standard"]),
+        git_output(path, ["ls-files", "-z", "--others", "--ignored",
+                          "--exclude-standard", "--directory"])
+    ]
+    if None in outputs:
+        return None
+    return tuple([file_path for file_path in output.split("\0") if file_path]
+                 for output in outputs)
+
+
+def git_output(path, args):
+    """Run a git command in the path and get the output
+
+    :param path: str -- the path inside a git work tree
+    :param args: list of str -- arguments of git
+    :return: str -- the output of git, None if git fails
+    """
+    try:
+        process = subprocess.Popen(["git"] + args, cwd=path,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    output = process.communicate()[0]
+    return output if process.returncode == 0 else None
+
+
+def get_git_dir(path):
+    """Get the absolute path of `.git` folder of a git work tree
+
+    :param path: str -- the path inside a git work tree
+    :return: str -- the path of `.git` folder, None if it's not a work tree
+    """
+    output = git_output(path, ["rev-parse", "--git-dir"])
+    if not output:
+        return None
+    return os.path.join(os.path.abspath(path), output.strip())
+
+
+def get_git_head(path):
+    """Get the commit of HEAD
+
+    :param path: str -- the path inside a git work tree
+    :return: str -- sha1 of the commit, None if there is no commit
+    """
+    output = git_output(path, ["rev-parse", "--verify", "-q", "HEAD"])
+    return output.strip() if output else None
+
+
+def git_changed_files(path, old_head, new_head):
+    """Get the files changed between two commits, and the files modified in
+    the work tree
+
+    :param path: str -- the path inside a git work tree
+    :param old_head: str -- sha1 of the old commit
+    :param new_head: str -- sha1 of the new commit
+    :return: set of str -- the path of file relative to the path
+    """
+    outputs = [git_output(path, ["ls-files", "-z", "--modified"])]
+    if old_head and new_head and old_head != new_head:
+        outputs.append(git_output(path, [
+            "diff", "--name-only", "--no-renames", "--relative", "-z",
+            old_head, new_head
+        ]))
+    return set(
+        file_path for output in outputs if output
+        for file_path in output.split("\0") if file_path
+    )
 
 
 def remote_create_folder(dst_ssh, dst_path):
@@ -105,11 +395,11 @@ def remote_create_folder(dst_ssh, dst_path):
     :param dst_ssh: str -- user name and host name of destination path
                            just like: user@host
     :param dst_path: str -- destination path
-    :return: None
+    :return: bool -- whether the command succeeds
     """
     dst_command = "\"mkdir -p {}\"".format(dst_path)
     command = "ssh " + dst_ssh + " " + dst_command
-    os.popen(command)
+    return os.popen(command).close() is None
 
 
 def remote_rm(dst_ssh, dst_path):
@@ -118,11 +408,29 @@ def remote_rm(dst_ssh, dst_path):
     :param dst_ssh: str -- user name and host name of destination path
                            just like: user@host
     :param dst_path: str -- destination path
-    :return: None
+    :return: bool -- whether the command succeeds
     """
     dst_command = "\"rm -rf {}\"".format(dst_path)
     command = "ssh " + dst_ssh + " " + dst_command
-    os.popen(command)
+    return os.popen(command).close() is None
+
+
+def remote_rm_multi(dst_ssh, dst_paths):
+    """Remove multiple files or folders remotely by using one ssh call,
+    the paths are sent to `xargs` through stdin
+
+    :param dst_ssh: str -- user name and host name of destination path
+                           just like: user@host
+    :param dst_paths: list of str -- a list of destination path
+    :return: bool -- whether the command succeeds
+    """
+    if not dst_paths:
+        return True
+    dst_command = "\"xargs -0 rm -rf\""
+    command = "ssh " + dst_ssh + " " + dst_command
+    pipe = os.popen(command, "w")
+    pipe.write("\0".join(dst_paths))
+    return pipe.close() is None
 
 
 def remote_mv(dst_ssh, src_path, dst_path):
@@ -132,11 +440,11 @@ def remote_mv(dst_ssh, src_path, dst_path):
                            just like: user@host
     :param src_path: str -- source of `mv` operator
     :param dst_path: str -- destination of `mv` operator
-    :return: None
+    :return: bool -- whether the command succeeds
     """
     dst_command = "\"mv {0} {1}\"".format(src_path, dst_path)
     command = "ssh " + dst_ssh + " " + dst_command
-    os.popen(command)
+    return os.popen(command).close() is None
 
 
 def rsync(dst_ssh, src_path, dst_path):
@@ -146,32 +454,241 @@ def rsync(dst_ssh, src_path, dst_path):
                            just like: user@host
     :param src_path: str -- source of file
     :param dst_path: str -- destination of file
-    :return: None
+    :return: bool -- whether rsync succeeds
     """
-    command = "rsync -avz {0} {1}:{2}".format(src_path, dst_ssh, dst_path)
-    os.popen(command)
+    command = "rsync -az {0} {1}:{2}".format(src_path, dst_ssh, dst_path)
+    return os.popen(command).close() is None
 
 
-def rsync_multi(dst_ssh, folder_path, src_paths, dst_path):
-    """Rsync multiple files remotely
+def rsync_large(dst_ssh, src_path, dst_path, bwlimit=None,
+                is_resumed=False):
+    """Rsync a large file remotely, the partial file is kept remotely when
+    the transfer is interrupted, and the next transfer resumes it
 
     :param dst_ssh: str -- user name and host name of destination path
                            just like: user@host
-    :param folder_path: str -- source of folder path
-    :param src_paths: list of str -- a list of src_path
+    :param src_path: str -- source of file
     :param dst_path: str -- destination of file
-    :return: None
+    :param bwlimit: int -- bandwidth limit in KB/s, None is unlimited
+    :param is_resumed: bool -- append to the partial file of an interrupted
+                               transfer, only when the remote file is known
+                               to be a prefix of the local one
+    :return: bool -- whether rsync succeeds
+    """
+    options = "-az --partial"
+    if is_resumed:
+        # A remote file of the same size or larger is skipped in this mode
+        options += " --append-verify"
+    if bwlimit:
+        options += " --bwlimit={}".format(bwlimit)
+    command = "rsync {0} {1} {2}:{3}".format(options, src_path, dst_ssh,
+                                             dst_path)
+    return os.popen(command).close() is None
+
+
+def rsync_multi(dst_ssh, folder_path, src_paths, dst_path, bwlimit=None):
+    """Rsync multiple files remotely, the paths are sent to `rsync` through
+    stdin, so only the files listed are sent whatever the number of files
+
+    :param dst_ssh: str -- user name and host name of destination path
+                           just like: user@host
+    :param folder_path: str -- source of folder path
+    :param src_paths: list of str -- a list of src_path relative to
+                                     folder_path
+    :param dst_path: str -- destination of folder
+    :param bwlimit: int -- bandwidth limit in KB/s, None is unlimited
+    :return: bool -- whether rsync succeeds
+    """
+    if not src_paths:
+        return True
+    options = "-az --from0 --files-from=-"
+    if bwlimit:
+        options += " --bwlimit={}".format(bwlimit)
+    command = "rsync {0} {1} {2}:{3}".format(options, folder_path, dst_ssh,
+                                             dst_path)
+    pipe = os.popen(command, "w")
+    pipe.write("\0".join(src_paths))
+    return pipe.close() is None
+
+
+def remote_is_empty(dst_ssh, dst_path):
+    """Check whether the destination folder is empty or doesn't exist
+
+    :param dst_ssh: str -- user name and host name of destination path
+                           just like: user@host
+    :param dst_path: str -- destination path
+    :return: bool
+    """
+    dst_command = "\"ls -A {} 2>/dev/null\"".format(dst_path)
+    command = "ssh " + dst_ssh + " " + dst_command
+    return os.popen(command).read().strip() == ""
+
+
+def remote_is_reachable(dst_ssh, timeout=10):
+    """Check whether the remote system can be connected by ssh
+
+    :param dst_ssh: str -- user name and host name of destination path
+                           just like: user@host
+    :param timeout: int -- seconds to wait for the connection
+    :return: bool
     """
-    _include_tuples = map(lambda s: "--include=\"/{}\"".format(s),
-                          src_paths)
-    command = "rsync -avrm {0} --exclude=\"*.*\" {1} {2}:{3}".format(
-        " ".join(_include_tuples), folder_path, dst_ssh, dst_path
+    command = "ssh -o BatchMode=yes -o ConnectTimeout={0} {1} true".format(
+        timeout, dst_ssh
     )
-    os.popen(command)
+    return os.popen(command).close() is None
+
+
+def tar_multi(dst_ssh, folder_path, src_paths, dst_path, jobs=4,
+              chunk_size=1000):
+    """Stream multiple files to remote by using compressed tar over ssh,
+    the files are sent in chunks by several tar processes in parallel,
+    so only `jobs` chunks are kept in memory at most
+
+    :param dst_ssh: str -- user name and host name of destination path
+                           just like: user@host
+    :param folder_path: str -- source of folder path
+    :param src_paths: iterable of str -- relative path of files
+    :param dst_path: str -- destination of folder
+    :param jobs: int -- the number of tar processes running at the same time
+    :param chunk_size: int -- the number of files sent by one tar process
+    :return: bool -- whether all tar processes succeed
+    """
+    command = (
+        "tar -czf - -C {0} --null -T - | "
+        "ssh {1} \"mkdir -p {2} && tar -xzf - -C {2}\""
+    ).format(folder_path, dst_ssh, dst_path)
+    processes = []
+    return_codes = []
+
+    def _send_chunk(chunk):
+        if len(processes) >= jobs:
+            return_codes.append(processes.pop(0).wait())
+        process = subprocess.Popen(command, shell=True,
+                                   stdin=subprocess.PIPE)
+        process.stdin.write("\0".join(chunk))
+        process.stdin.close()
+        processes.append(process)
+
+    chunk = []
+    for src_path in src_paths:
+        chunk.append(src_path)
+        if len(chunk) >= chunk_size:
+            _send_chunk(chunk)
+            chunk = []
+    if chunk:
+        _send_chunk(chunk)
+    for process in processes:
+        return_codes.append(process.wait())
+    return not any(return_codes)
+
+
+def remote_manifest(dst_ssh, dst_path, with_hash=False, folder_paths=None):
+    """List all files under the destination path by using one ssh call,
+    the list is sorted by path remotely and parsed as a stream
+
+    :param dst_ssh: str -- user name and host name of destination path
+                           just like: user@host
+    :param dst_path: str -- destination path
+    :param with_hash: bool -- use md5 of the content instead of size and
+                              modification time
+    :param folder_paths: list of str -- only list these folders, relative to
+                                        the destination path
+    :return: generator of tuple -- (relative path, value), value is the same
+                                   as `get_manifest_value`
+    """
+    if folder_paths and all(folder_paths):
+        find_paths = " ".join(pipes.quote(folder_path)
+                              for folder_path in folder_paths)
+    else:
+        # List the whole destination path
+        find_paths = "."
+    if with_hash:
+        dst_command = (
+            "cd {0} && find {1} -type f -print0 2>/dev/null | "
+            "LC_ALL=C sort -z | xargs -0 -r md5sum"
+        ).format(dst_path, find_paths)
+    else:
+        dst_command = (
+            "cd {0} && find {1} -type f -printf '%p\\t%s\\t%T@\\n' "
+            "2>/dev/null | LC_ALL=C sort"
+        ).format(dst_path, find_paths)
+    process = subprocess.Popen(["ssh", dst_ssh, dst_command],
+                               stdout=subprocess.PIPE)
+    for line in process.stdout:
+        line = line.rstrip("\n")
+        if with_hash:
+            # Like `d41d8cd98f00b204e9800998ecf8427e  ./a/b.py`
+            file_hash, file_path = line.split("  ", 1)
+            value = file_hash
+        else:
+            file_path, file_size, file_mtime = line.rsplit("\t", 2)
+            value = "{0}\t{1}".format(file_size, int(float(file_mtime)))
+        if file_path.startswith("./"):
+            file_path = file_path[2:]
+        yield file_path, value
+    process.wait()
+
+
+def get_manifest_value(file_path, with_hash=False):
+    """Get the value to compare in manifest of a local file
+
+    :param file_path: str -- the path of file
+    :param with_hash: bool -- use md5 of the content instead of size and
+                              modification time
+    :return: str -- md5 of the content or "size\tmtime", None if the file
+                    doesn't exist
+    """
+    try:
+        if with_hash:
+            md5 = hashlib.md5()
+            with open(file_path, "rb") as _file:
+                for chunk in iter(lambda: _file.read(65536), b""):
+                    md5.update(chunk)
+            return md5.hexdigest()
+        stat = os.stat(file_path)
+    except (IOError, OSError):
+        return None
+    return "{0}\t{1}".format(stat.st_size, int(stat.st_mtime))
+
+
+def diff_manifest(local_manifest, remote_manifest):
+    """Diff two manifests sorted by path in streaming fashion
 
+    :param local_manifest: iterable of tuple -- (path, value) sorted by path
+    :param remote_manifest: iterable of tuple -- (path, value) sorted by path
+    :return: generator of tuple -- (state, path), state is one of
+        "missing" -- the file only exists locally
+        "changed" -- the value of the file is different
+        "extra" -- the file only exists remotely
+    """
+    local_iter, remote_iter = iter(local_manifest), iter(remote_manifest)
+    local_item, remote_item = next(local_iter, None), next(remote_iter, None)
+    while local_item is not None or remote_item is not None:
+        if remote_item is None or (
+            local_item is not None and local_item[0] < remote_item[0]
+        ):
+            yield "missing", local_item[0]
+            local_item = next(local_iter, None)
+        elif local_item is None or local_item[0] > remote_item[0]:
+            yield "extra", remote_item[0]
+            remote_item = next(remote_iter, None)
+        else:
+            if local_item[1] != remote_item[1]:
+                yield "changed", local_item[0]
+            local_item = next(local_iter, None)
+            remote_item = next(remote_iter, None)
 
-def init_logger():
-    logging.config.dictConfig(LOGGING_CONFIG)
+
+def init_logger(is_json=False):
+    """Initialize the logger of specchio
+
+    :param is_json: bool -- write JSON lines instead of colored text
+    :return: None
+    """
+    config = copy.deepcopy(LOGGING_CONFIG)
+    if is_json:
+        config["handlers"]["specchio"]["formatter"] = "json"
+    logging.config.dictConfig(config)
 
 
 logger = logging.getLogger("specchio")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.cache import StartupCache
+from specchio.utils import PatternSet
+
+
+class StartupCacheTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.temp_path, "src")
+        self.cache_folder = os.path.join(self.temp_path, "cache")
+        os.makedirs(os.path.join(self.src_path, "b", "c"))
+        os.makedirs(os.path.join(self.src_path, "d"))
+        self.write(".gitignore", "*.pyc\n!1.pyc\n")
+        self.write("b/c/.gitignore", "build/\n")
+        self.write("d/.gitignore/1.py", "")
+        # Make all files older than the cache
+        for root_path, dirs_path, files_path in os.walk(self.src_path):
+            for name in dirs_path + files_path + [""]:
+                os.utime(os.path.join(root_path, name), (0, 0))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def write(self, path, text):
+        path = os.path.join(self.src_path, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as _file:
+            _file.write(text)
+
+    def get_cache(self):
+        return StartupCache(self.src_path, cache_folder=self.cache_folder)
+
+    def test_get_gitignore_re(self):
+        result = self.get_cache().get_gitignore_re(self.src_path)
+        self.assertEqual(result, {
+            os.path.join(self.src_path, ".gitignore"): {
+                1: [], 2: PatternSet(["1.pyc"]), 3: PatternSet(["*.pyc"])
+            },
+            os.path.join(self.src_path, "b/c/.gitignore"): {
+                1: [], 2: PatternSet(), 3: PatternSet(["build/*"])
+            }
+        })
+
+    @mock.patch("specchio.cache.parse_gitignore")
+    def test_get_gitignore_re_cached(self, _parse_gitignore):
+        _parse_gitignore.return_value = {1: [], 2: [], 3: ["*.pyc"]}
+        self.get_cache().get_gitignore_re(self.src_path)
+        self.assertEqual(_parse_gitignore.call_count, 2)
+        cache = self.get_cache()
+        with mock.patch.object(cache, "list_folder") as _list_folder:
+            result = cache.get_gitignore_re(self.src_path)
+            self.assertEqual(_list_folder.call_count, 0)
+        self.assertEqual(_parse_gitignore.call_count, 2)
+        self.assertEqual(len(result), 2)
+
+    def test_get_gitignore_re_changed(self):
+        self.get_cache().get_gitignore_re(self.src_path)
+        self.write("b/c/.gitignore", "build/\ndist/\n")
+        self.write("d/e/.gitignore", "*.log\n")
+        os.utime(os.path.join(self.src_path, "b/c/.gitignore"), (0, 1))
+        os.utime(os.path.join(self.src_path, "d"), (0, 1))
+        result = self.get_cache().get_gitignore_re(self.src_path)
+        self.assertEqual(
+            result[os.path.join(self.src_path, "b/c/.gitignore")][3],
+            PatternSet(["build/*", "dist/*"])
+        )
+        self.assertEqual(
+            result[os.path.join(self.src_path, "d/e/.gitignore")][3],
+            PatternSet(["*.log"])
+        )
+
+    @mock.patch("specchio.cache.find_binary")
+    def test_get_binary(self, _find_binary):
+        _find_binary.return_value = "/usr/bin/ssh"
+        cache = self.get_cache()
+        with mock.patch("specchio.cache.os.access") as _access:
+            _access.return_value = True
+            self.assertEqual(cache.get_binary("ssh"), "/usr/bin/ssh")
+            self.assertEqual(cache.get_binary("ssh"), "/usr/bin/ssh")
+        _find_binary.assert_called_once_with("ssh")
+
+    def test_load_broken_cache(self):
+        cache = self.get_cache()
+        os.makedirs(self.cache_folder)
+        with open(cache.cache_path, "w") as cache_file:
+            cache_file.write("broken")
+        self.assertEqual(self.get_cache().data["folders"], {})
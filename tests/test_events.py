@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from specchio.events import (compact_events, is_implied_move,
+                             iter_self_and_ancestors)
+from watchdog.events import (DirCreatedEvent, DirDeletedEvent,
+                             DirModifiedEvent, DirMovedEvent,
+                             FileClosedEvent, FileCreatedEvent,
+                             FileDeletedEvent, FileModifiedEvent,
+                             FileMovedEvent)
+
+
+class IterSelfAndAncestorsTest(TestCase):
+
+    def test_iter_self_and_ancestors(self):
+        self.assertEqual(
+            list(iter_self_and_ancestors("/a/b/")),
+            ["/a/b", "/a", "/"]
+        )
+
+
+class IsImpliedMoveTest(TestCase):
+
+    def test_is_implied_move(self):
+        dir_moves = [("/a/b", "/a/c")]
+        self.assertEqual(
+            is_implied_move(FileMovedEvent("/a/b/1.py", "/a/c/1.py"),
+                            dir_moves),
+            True
+        )
+        self.assertEqual(
+            is_implied_move(FileMovedEvent("/a/b/1.py", "/a/d/1.py"),
+                            dir_moves),
+            False
+        )
+        self.assertEqual(
+            is_implied_move(FileMovedEvent("/a/bb/1.py", "/a/cb/1.py"),
+                            dir_moves),
+            False
+        )
+
+
+class CompactEventsTest(TestCase):
+
+    def test_compact_deleted_folder(self):
+        events = [
+            FileDeletedEvent("/a/build/1.o"),
+            FileDeletedEvent("/a/build/sub/2.o"),
+            DirDeletedEvent("/a/build/sub"),
+            DirDeletedEvent("/a/build"),
+            FileDeletedEvent("/a/1.py")
+        ]
+        self.assertEqual(
+            compact_events(events),
+            [events[3], events[4]]
+        )
+
+    def test_compact_sync_before_delete(self):
+        events = [
+            FileCreatedEvent("/a/build/1.o"),
+            FileModifiedEvent("/a/build/1.o"),
+            DirModifiedEvent("/a/build"),
+            DirDeletedEvent("/a/build"),
+            FileCreatedEvent("/a/build/2.o")
+        ]
+        self.assertEqual(
+            compact_events(events),
+            [events[3], events[4]]
+        )
+
+    def test_compact_repeated_sync(self):
+        events = [
+            DirCreatedEvent("/a/b"),
+            FileCreatedEvent("/a/b/1.py"),
+            FileModifiedEvent("/a/b/1.py"),
+            FileModifiedEvent("/a/2.py"),
+            FileModifiedEvent("/a/b/1.py")
+        ]
+        self.assertEqual(
+            compact_events(events),
+            [events[3], events[4]]
+        )
+
+    def test_compact_closed(self):
+        events = [
+            FileCreatedEvent("/a/1.py"),
+            FileModifiedEvent("/a/1.py"),
+            FileClosedEvent("/a/1.py"),
+            DirModifiedEvent("/a"),
+            FileModifiedEvent("/a/2.py"),
+            FileClosedEvent("/a/2.py")
+        ]
+        self.assertEqual(
+            compact_events(events),
+            [events[1], events[4]]
+        )
+
+    def test_compact_moved_folder(self):
+        events = [
+            FileModifiedEvent("/a/1.py"),
+            DirMovedEvent("/a/b", "/a/c"),
+            FileMovedEvent("/a/b/1.py", "/a/c/1.py"),
+            FileDeletedEvent("/a/1.py")
+        ]
+        self.assertEqual(
+            compact_events(events),
+            [events[0], events[1], events[3]]
+        )
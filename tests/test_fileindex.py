@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from specchio.fileindex import FileIndex
+
+
+class FileIndexTest(TestCase):
+
+    def setUp(self):
+        self.file_index = FileIndex()
+        for path in ["b/c/3.py", "1.py", "b/2.py", "b-c/4.py", "b/c.py"]:
+            self.file_index.add(path)
+
+    def test_iter(self):
+        self.assertEqual(list(self.file_index), [
+            "1.py", "b-c/4.py", "b/2.py", "b/c.py", "b/c/3.py"
+        ])
+        self.assertEqual(list(self.file_index.iter_paths("b/c")),
+                         ["b/c/3.py"])
+        self.assertEqual(list(self.file_index.iter_paths("1.py")), ["1.py"])
+        self.assertEqual(list(self.file_index.iter_paths("d")), [])
+        self.assertEqual(
+            [self.file_index.get_path(entry)
+             for entry in self.file_index.iter_entries("b")],
+            ["b", "b/2.py", "b/c.py", "b/c", "b/c/3.py"]
+        )
+
+    def test_lookup(self):
+        self.assertEqual(len(self.file_index), 5)
+        self.assertIn("b/c/3.py", self.file_index)
+        self.assertIn("b/c", self.file_index)
+        self.assertNotIn("b/c/4.py", self.file_index)
+        self.assertNotIn("c", self.file_index)
+        self.assertEqual(self.file_index.get("b/2.py"), (False, 0, 0, 0))
+        self.assertEqual(self.file_index.get("b"), (True, 0, 0, 0))
+        # The components are interned
+        self.assertEqual(self.file_index.names.count("b"), 1)
+
+    def test_attributes(self):
+        self.file_index.add("b/2.py", size=2, mtime=1.5, inode=7)
+        self.assertEqual(self.file_index.get("b/2.py"), (False, 2, 1.5, 7))
+        self.assertEqual(self.file_index.get("1.py"), (False, 0, 0, 0))
+        self.file_index.add("d/5.py", size=5)
+        self.assertEqual(self.file_index.get("d/5.py"), (False, 5, 0, 0))
+
+    def test_iter_files(self):
+        self.file_index.add("b/c/3.py", size=3, mtime=1.5, inode=7)
+        self.assertEqual(list(self.file_index.iter_files("b")), [
+            ("b/2.py", 0, 0, 0), ("b/c.py", 0, 0, 0), ("b/c/3.py", 3, 1.5, 7)
+        ])
+        self.assertEqual(list(self.file_index.iter_files("1.py")),
+                         [("1.py", 0, 0, 0)])
+        self.assertEqual(list(FileIndex().iter_files("1.py")), [])
+
+    def test_remove(self):
+        self.assertEqual(self.file_index.remove("b"), True)
+        self.assertEqual(self.file_index.remove("b"), False)
+        self.assertEqual(len(self.file_index), 2)
+        self.assertEqual(list(self.file_index), ["1.py", "b-c/4.py"])
+        self.file_index.add("b/c/3.py")
+        self.assertEqual(list(self.file_index.iter_paths("b")),
+                         ["b/c/3.py"])
+        self.assertEqual(len(self.file_index), 3)
+
+    def test_replace(self):
+        self.file_index.add("b/c")
+        self.assertEqual(list(self.file_index.iter_paths("b")),
+                         ["b/2.py", "b/c", "b/c.py"])
+        self.file_index.add("b/c/3.py")
+        self.assertEqual(self.file_index.get("b/c")[0], True)
+        self.assertEqual(len(self.file_index), 5)
+
+    def test_many(self):
+        file_index = FileIndex()
+        paths = ["{0}/{1}.py".format(folder, name)
+                 for folder in range(50) for name in range(50)]
+        for path in paths:
+            file_index.add(path)
+        self.assertEqual(list(file_index), sorted(paths))
+        self.assertEqual(len(file_index.names), 100)
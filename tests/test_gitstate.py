@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import mock
+from specchio.gitstate import GitStateMonitor
+
+
+class GitStateMonitorTest(TestCase):
+
+    @mock.patch("specchio.gitstate.get_git_head")
+    @mock.patch("specchio.gitstate.get_git_dir")
+    def setUp(self, _get_git_dir, _get_git_head):
+        _get_git_dir.return_value = "/a/.git"
+        _get_git_head.return_value = "old_head"
+        self.monitor = GitStateMonitor("/a/", max_paths=2)
+
+    def test_is_git_path(self):
+        self.assertEqual(self.monitor.is_git_path("/a/.git/HEAD"), True)
+        self.assertEqual(self.monitor.is_git_path("/a/.gitignore"), False)
+
+    def test_on_git_event(self):
+        self.monitor.on_git_event("/a/.git/objects/ab/cdef")
+        self.assertEqual(self.monitor.is_running, False)
+        self.monitor.on_git_event("/a/.git/rebase-merge/done")
+        self.assertEqual(self.monitor.is_running, True)
+
+    def test_add_path(self):
+        for path in ("1.py", "2.py", "3.py"):
+            self.monitor.add_path(path)
+        self.assertEqual(self.monitor.paths, set(["1.py", "2.py"]))
+        self.assertEqual(self.monitor.is_overflow, True)
+
+    @mock.patch("specchio.gitstate.os.path.exists")
+    def test_poll_running(self, _exists):
+        _exists.side_effect = (lambda path: path == "/a/.git/index.lock")
+        self.assertEqual(self.monitor.poll(), None)
+        self.monitor.is_running = True
+        self.assertEqual(self.monitor.poll(), None)
+
+    @mock.patch("specchio.gitstate.git_changed_files")
+    @mock.patch("specchio.gitstate.get_git_head")
+    @mock.patch("specchio.gitstate.os.path.exists")
+    def test_poll_done(self, _exists, _get_git_head, _git_changed_files):
+        _exists.return_value = False
+        _get_git_head.return_value = "new_head"
+        _git_changed_files.return_value = set(["1.py"])
+        self.monitor.is_running = True
+        self.monitor.add_path("2.py")
+        self.assertEqual(self.monitor.poll(iter(["3.py"])),
+                         (set(["1.py", "2.py", "3.py"]), False))
+        _git_changed_files.assert_called_once_with("/a/", "old_head",
+                                                   "new_head")
+        self.assertEqual(self.monitor.head, "new_head")
+        self.assertEqual(self.monitor.is_running, False)
+        self.assertEqual(self.monitor.paths, set())
+
+    @mock.patch("specchio.gitstate.git_changed_files")
+    @mock.patch("specchio.gitstate.get_git_head")
+    @mock.patch("specchio.gitstate.os.path.exists")
+    def test_poll_same_head(self, _exists, _get_git_head,
+                            _git_changed_files):
+        _exists.return_value = False
+        _get_git_head.return_value = "old_head"
+        self.monitor.is_running = True
+        self.monitor.add_path("2.py")
+        self.assertEqual(self.monitor.poll(), (set(["2.py"]), False))
+        self.assertEqual(_git_changed_files.call_count, 0)
+
+    @mock.patch("specchio.gitstate.get_git_head")
+    @mock.patch("specchio.gitstate.os.path.exists")
+    def test_poll_started_again(self, _exists, _get_git_head):
+        _exists.return_value = False
+        self.monitor.on_git_event("/a/.git/HEAD")
+
+        def _get_head(path):
+            # Another operation starts while git runs
+            self.monitor.on_git_event("/a/.git/index.lock")
+            self.monitor.add_path("2.py")
+            return "old_head"
+
+        _get_git_head.side_effect = _get_head
+        self.assertEqual(self.monitor.poll(), (set(["2.py"]), False))
+        self.assertEqual(self.monitor.is_running, True)
@@ -7,9 +7,14 @@ from unittest import TestCase
 
 import mock
 from specchio.handlers import SpecchioEventHandler
-from watchdog.events import (DirCreatedEvent, FileCreatedEvent,
-                             FileDeletedEvent, FileModifiedEvent,
-                             FileMovedEvent)
+from specchio.merkle import MerkleTree
+from specchio.policy import DEFER, SKIP, SizePolicy
+from specchio.scheduler import INTERACTIVE
+from specchio.utils import PatternSet
+from watchdog.events import (DirCreatedEvent, DirDeletedEvent,
+                             DirModifiedEvent, DirMovedEvent,
+                             FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent, FileMovedEvent)
 
 
 class SpecchioEventHandlerTest(TestCase):
@@ -28,12 +33,12 @@ class SpecchioEventHandlerTest(TestCase):
         self.handler.gitignore_dict = {
             "/a/.gitignore": {
                 1: [],
-                2: [re.compile(fnmatch.translate("1.py"))],
-                3: [re.compile(fnmatch.translate("test.py")),
-                    re.compile(fnmatch.translate("t_folder/"))]
+                2: PatternSet(["1.py"]),
+                3: PatternSet(["test.py", "t_folder/*"])
             }
         }
         self.handler.gitignore_list = ["/a/"]
+        self.handler.git_index_enabled = False
 
     def test_specchio_init_with_init_remote(self):
         with mock.patch.object(
@@ -44,12 +49,30 @@ class SpecchioEventHandlerTest(TestCase):
             ) as _init_remote:
                 _init_gitignore.return_value = True
                 _init_remote.return_value = True
-                SpecchioEventHandler(
+                handler = SpecchioEventHandler(
                     src_path="/a/", dst_ssh="user@host",
                     dst_path="/b/a/", is_init_remote=True
                 )
+                self.assertEqual(_init_remote.call_count, 0)
+                handler.scheduler.run_pending()
                 _init_remote.assert_called_once_with()
 
+    def test_specchio_init_with_verify_remote(self):
+        with mock.patch.object(
+            SpecchioEventHandler, "init_gitignore"
+        ) as _init_gitignore:
+            with mock.patch.object(
+                SpecchioEventHandler, "verify_remote"
+            ) as _verify_remote:
+                _init_gitignore.return_value = True
+                handler = SpecchioEventHandler(
+                    src_path="/a/", dst_ssh="user@host",
+                    dst_path="/b/a/", is_verify_remote=True,
+                    is_checksum=True
+                )
+                handler.scheduler.run_pending()
+                _verify_remote.assert_called_once_with(with_hash=True)
+
     def test_is_ignore_git_folder(self):
         _file_or_dir_path = mock.Mock("/a/")
         _file_or_dir_path.endswith.return_value = True
@@ -84,21 +107,32 @@ class SpecchioEventHandlerTest(TestCase):
             }
         })
 
+    @mock.patch("specchio.handlers.walk_get_gitignore")
+    def test_init_gitignore_with_cache(self, _walk_get_gitignore):
+        _startup_cache = mock.Mock()
+        _startup_cache.get_gitignore_re.return_value = {
+            "/a/.gitignore": {1: [], 2: PatternSet(), 3: PatternSet()}
+        }
+        handler = SpecchioEventHandler(
+            src_path="/a/", dst_ssh="user@host", dst_path="/b/a/",
+            startup_cache=_startup_cache
+        )
+        _startup_cache.get_gitignore_re.assert_called_once_with("/a/")
+        self.assertEqual(_walk_get_gitignore.call_count, 0)
+        self.assertEqual(handler.gitignore_list, ["/a/"])
+
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_create_folder")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
     def test_on_created_folder(self, _remote_create_folder, _os):
         _remote_create_folder.return_value = True
         _os.path.abspath.return_value = "/a/test1.py"
         _os.path.join.return_value = "/b/a/test1.py"
         _event = DirCreatedEvent(src_path="/a/test1.py")
         self.handler.on_created(_event)
-        _remote_create_folder.assert_called_once_with(
-            dst_ssh=self.handler.dst_ssh,
-            dst_path="/b/a/test1.py"
-        )
+        _remote_create_folder.assert_called_once_with(dst_path="/b/a/test1.py")
 
-    @mock.patch("specchio.handlers.remote_create_folder")
-    @mock.patch("specchio.handlers.rsync")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    @mock.patch("specchio.transports.SSHTransport.send_file")
     @mock.patch("specchio.handlers.os")
     def test_on_created_file(self, _os, _rsync,
                              _remote_create_folder):
@@ -113,17 +147,13 @@ class SpecchioEventHandlerTest(TestCase):
             _os.path.join.return_value = "/b/a/.gitignore"
             _event = FileCreatedEvent(src_path="/a/.gitignore")
             self.handler.on_created(_event)
-            _remote_create_folder.assert_called_once_with(
-                dst_ssh=self.handler.dst_ssh,
-                dst_path="/b/a/"
-            )
-            _rsync.assert_called_once_with(dst_ssh=self.handler.dst_ssh,
-                                           dst_path="/b/a/.gitignore",
+            _remote_create_folder.assert_called_once_with(dst_path="/b/a/")
+            _rsync.assert_called_once_with(dst_path="/b/a/.gitignore",
                                            src_path="/a/.gitignore")
             _update_gitignore.assert_called_once_with("/a/.gitignore")
 
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_create_folder")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
     def test_on_created_ignore(self, _remote_create_folder, _os):
         _remote_create_folder.return_value = True
         _os.path.abspath.return_value = "/a/test.py"
@@ -132,8 +162,8 @@ class SpecchioEventHandlerTest(TestCase):
         self.assertEqual(_remote_create_folder.call_count, 0)
 
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_create_folder")
-    @mock.patch("specchio.handlers.rsync")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    @mock.patch("specchio.transports.SSHTransport.send_file")
     def test_on_modified(self, _rsync, _remote_create_folder, _os):
         with mock.patch.object(
                 self.handler,
@@ -147,21 +177,17 @@ class SpecchioEventHandlerTest(TestCase):
             _event = FileModifiedEvent(src_path="/a/.gitignore")
             self.handler.on_modified(_event)
             _rsync.assert_called_once_with(
-                dst_ssh=self.handler.dst_ssh,
                 src_path="/a/.gitignore",
                 dst_path="/b/a/.gitignore"
             )
-            _remote_create_folder.assert_called_once_with(
-                dst_ssh=self.handler.dst_ssh,
-                dst_path="/b/a/"
-            )
+            _remote_create_folder.assert_called_once_with(dst_path="/b/a/")
             _update_gitignore.assert_called_once_with(
                 "/a/.gitignore"
             )
 
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_create_folder")
-    @mock.patch("specchio.handlers.rsync")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    @mock.patch("specchio.transports.SSHTransport.send_file")
     def test_on_modifited_ignore(self, _rsync, _remote_create_folder, _os):
         _rsync.return_value = True
         _remote_create_folder.return_value = True
@@ -176,8 +202,8 @@ class SpecchioEventHandlerTest(TestCase):
         _get_all_re.return_value = {
             "/a/b/.gitignore": {
                 1: [],
-                2: [],
-                3: []
+                2: PatternSet(),
+                3: PatternSet()
             }
         }
         _handler_gitignore_list = list(self.handler.gitignore_list)
@@ -192,14 +218,13 @@ class SpecchioEventHandlerTest(TestCase):
             {
                 "/a/.gitignore": {
                     1: [],
-                    2: [re.compile(fnmatch.translate("1.py"))],
-                    3: [re.compile(fnmatch.translate("test.py")),
-                        re.compile(fnmatch.translate("t_folder/"))]
+                    2: PatternSet(["1.py"]),
+                    3: PatternSet(["test.py", "t_folder/*"])
                 },
                 "/a/b/.gitignore": {
                     1: [],
-                    2: [],
-                    3: []
+                    2: PatternSet(),
+                    3: PatternSet()
                 }
             }
         )
@@ -207,8 +232,8 @@ class SpecchioEventHandlerTest(TestCase):
         self.handler.gitignore_dict = _handler_gitignore_dict
 
     def test_del_gitignore(self):
-        _handler_gitignore_list = list(self.handler.gitignore_list)
-        _handler_gitignore_dict = dict(self.handler.gitignore_dict)
+        _handler_gitignore_list = self.handler.gitignore_list
+        _handler_gitignore_dict = self.handler.gitignore_dict
         self.handler.del_gitignore("/a/.gitignore")
         self.assertEqual(
             self.handler.gitignore_list,
@@ -218,11 +243,43 @@ class SpecchioEventHandlerTest(TestCase):
             self.handler.gitignore_dict,
             {}
         )
+        # The rules are replaced, so a thread matching the old rules sees
+        # them unchanged
+        self.assertEqual(_handler_gitignore_list, ["/a/"])
+        self.assertEqual(list(_handler_gitignore_dict), ["/a/.gitignore"])
         self.handler.gitignore_list = _handler_gitignore_list
         self.handler.gitignore_dict = _handler_gitignore_dict
 
+    @mock.patch("specchio.handlers.os.path.islink")
+    @mock.patch("specchio.handlers.os.path.isdir")
+    @mock.patch("specchio.handlers.os.listdir")
+    def test_reapply_gitignore(self, _listdir, _isdir, _islink):
+        _folders = {
+            "/a/": [".gitignore", "1.py", "test.py", "t_folder", "c"],
+            "/a/t_folder": ["2.py"],
+            "/a/c": ["3.py", "4.log"]
+        }
+        _listdir.side_effect = lambda path: _folders[path]
+        _isdir.side_effect = lambda path: path in _folders
+        _islink.return_value = False
+        old_rules = self.handler.copy_ignore_rules()
+        self.handler.gitignore_dict["/a/.gitignore"] = {
+            1: [], 2: PatternSet(), 3: PatternSet(["*.log"])
+        }
+        with mock.patch.object(
+            self.handler, "sync_differences"
+        ) as _sync_differences:
+            self.handler.reapply_gitignore("/a/.gitignore", old_rules)
+            _sync_differences.assert_called_once_with(
+                ["t_folder/2.py", "test.py"], ["/b/a/c/4.log"]
+            )
+            self.handler.reapply_gitignore(
+                "/a/.gitignore", self.handler.copy_ignore_rules()
+            )
+            self.assertEqual(_sync_differences.call_count, 1)
+
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_rm")
+    @mock.patch("specchio.transports.SSHTransport.remove")
     def test_on_deleted(self, _remote_rm, _os):
         with mock.patch.object(
             self.handler,
@@ -239,10 +296,7 @@ class SpecchioEventHandlerTest(TestCase):
                 "/b/a/",
                 ".gitignore"
             )
-            _remote_rm.assert_called_once_with(
-                dst_ssh=self.handler.dst_ssh,
-                dst_path="/b/a/.gitignore"
-            )
+            _remote_rm.assert_called_once_with(dst_path="/b/a/.gitignore")
             _del_gitignore.assert_called_once_with("/a/.gitignore")
 
     @mock.patch("specchio.handlers.os")
@@ -256,7 +310,7 @@ class SpecchioEventHandlerTest(TestCase):
         self.assertEqual(_os.path.join.call_count, 0)
 
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_mv")
+    @mock.patch("specchio.transports.SSHTransport.move")
     def test_on_moved(self, _mv, _os):
         _mv.return_value = True
         _os.path.abspath.side_effect = ["/a/1.py", "/a/2.py"]
@@ -264,16 +318,15 @@ class SpecchioEventHandlerTest(TestCase):
         _event = FileMovedEvent(src_path="/a/1.py", dest_path="/a/2.py")
         self.handler.on_moved(_event)
         _mv.assert_called_once_with(
-            dst_ssh=self.handler.dst_ssh,
             src_path="/b/a/1.py",
             dst_path="/b/a/2.py"
         )
 
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_rm")
-    @mock.patch("specchio.handlers.remote_create_folder")
-    @mock.patch("specchio.handlers.remote_mv")
-    @mock.patch("specchio.handlers.rsync")
+    @mock.patch("specchio.transports.SSHTransport.remove")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    @mock.patch("specchio.transports.SSHTransport.move")
+    @mock.patch("specchio.transports.SSHTransport.send_file")
     def test_on_moved_all_ignore(self, _rsync, _mv, _create_folder, _rm, _os):
         _mv.return_value = True
         _create_folder.return_value = True
@@ -289,8 +342,8 @@ class SpecchioEventHandlerTest(TestCase):
         self.assertEqual(_rsync.call_count, 0)
 
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_create_folder")
-    @mock.patch("specchio.handlers.rsync")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    @mock.patch("specchio.transports.SSHTransport.send_file")
     def test_on_moved_src_ignore(self, _rsync, _create_folder, _os):
         _create_folder.return_value = True
         _rsync.return_value = True
@@ -298,32 +351,49 @@ class SpecchioEventHandlerTest(TestCase):
         _os.path.join.side_effect = ["/b/a/test.py", "/b/a/1.py"]
         _event = FileMovedEvent(src_path="test.py", dest_path="/a/1.py")
         self.handler.on_moved(_event)
-        _create_folder.assert_called_once_with(
-            dst_ssh=self.handler.dst_ssh,
-            dst_path="/b/a/"
-        )
+        _create_folder.assert_called_once_with(dst_path="/b/a/")
         _rsync.assert_called_once_with(
-            dst_ssh=self.handler.dst_ssh,
             src_path="/a/1.py",
             dst_path="/b/a/1.py"
         )
 
+    @mock.patch("specchio.handlers.os.lstat")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    @mock.patch("specchio.transports.SSHTransport.send_file")
+    def test_on_moved_src_ignore_with_size_policy(self, _rsync,
+                                                  _create_folder, _lstat):
+        _lstat.return_value.st_size = 10
+        self.handler.size_policy = mock.Mock()
+        self.handler.size_policy.check.return_value = SKIP
+        self.handler.on_moved(FileMovedEvent(src_path="/a/test.py",
+                                             dest_path="/a/core.1"))
+        self.handler.size_policy.check.assert_called_once_with("core.1", 10)
+        self.assertEqual(_rsync.call_count, 0)
+
+    def test_on_moved_src_ignore_folder(self):
+        _event = DirMovedEvent(src_path="/a/build", dest_path="/a/dist")
+        with mock.patch.object(self.handler, "is_ignore") as _is_ignore:
+            _is_ignore.side_effect = [True, False]
+            with mock.patch.object(self.handler,
+                                   "sync_paths") as _sync_paths:
+                self.handler.on_moved(_event)
+        _sync_paths.assert_called_once_with(["dist"])
+
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.remote_rm")
+    @mock.patch("specchio.transports.SSHTransport.remove")
     def test_on_moved_dst_ignore(self, _rm, _os):
         _rm.return_value = True
         _os.path.abspath.side_effect = ["/a/1.py", "/a/test.py"]
         _os.path.join.side_effect = ["/b/a/1.py", "/b/a/test.py"]
         _event = FileMovedEvent(src_path="1.py", dest_path="/a/test.py")
         self.handler.on_moved(_event)
-        _rm.assert_called_once_with(
-            dst_ssh=self.handler.dst_ssh,
-            dst_path="/b/a/1.py"
-        )
+        _rm.assert_called_once_with(dst_path="/b/a/1.py")
 
     @mock.patch("specchio.handlers.os")
-    @mock.patch("specchio.handlers.rsync_multi")
-    def test_init_remote(self, _rsync_multi, _os):
+    @mock.patch("specchio.transports.SSHTransport.is_empty")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_init_remote(self, _rsync_multi, _remote_is_empty, _os):
+        _remote_is_empty.return_value = False
         _os.walk.return_value = [
             ["/a/", [], ["1.py", "2.py"]],
             ["/a/t_folder/", [], []]
@@ -338,7 +408,690 @@ class SpecchioEventHandlerTest(TestCase):
         with mock.patch.object(self.handler, "is_ignore") as _is_ignore:
             _is_ignore.side_effect = [False, True, False, True]
             self.handler.init_remote()
+        self.assertEqual(_rsync_multi.call_count, 1)
+        _kwargs = _rsync_multi.call_args[1]
+        self.assertEqual(list(_kwargs.pop("src_paths")), ["2.py"])
+        self.assertEqual(_kwargs, {"folder_path": self.handler.src_path,
+                                   "dst_path": self.handler.dst_path,
+                                   "bwlimit": None})
+
+    def test_iter_walk_files_with_scanner(self):
+        self.handler.scanner = mock.Mock()
+        self.handler.scanner.iter_batches.return_value = iter([
+            ["b/1.py", "b/2.py"], ["b/c/3.py"]
+        ])
+        self.assertEqual(list(self.handler.iter_walk_files("/a/b")),
+                         ["b/1.py", "b/2.py", "b/c/3.py"])
+        self.handler.scanner.iter_batches.assert_called_once_with(
+            "/a", "b", ("/a/.git/", ["/a/"], self.handler.gitignore_dict)
+        )
+
+    @mock.patch("specchio.transports.SSHTransport.is_empty")
+    @mock.patch("specchio.transports.SSHTransport.send_all")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_init_remote_with_tar(self, _rsync_multi, _tar_multi,
+                                  _remote_is_empty):
+        _remote_is_empty.return_value = True
+        with mock.patch.object(self.handler,
+                               "iter_sync_files") as _iter_sync_files:
+            _iter_sync_files.return_value = iter(["2.py"])
+            self.handler.init_remote()
+        _tar_multi.assert_called_once_with(
+            folder_path=self.handler.src_path,
+            src_paths=_iter_sync_files.return_value,
+            dst_path=self.handler.dst_path
+        )
+        self.assertEqual(_rsync_multi.call_count, 0)
+
+    @mock.patch("specchio.handlers.os")
+    def test_iter_sync_files_prune(self, _os):
+        _dirs = ["t_folder"]
+        _os.walk.return_value = [["/a/t_folder/", _dirs, ["1.py"]]]
+        _os.path.abspath.return_value = "/a/t_folder"
+        result = list(self.handler.iter_sync_files())
+        self.assertEqual(result, [])
+        self.assertEqual(_dirs, [])
+
+    def test_dispatch(self):
+        _event = FileModifiedEvent(src_path="/a/1.py")
+        with mock.patch.object(self.handler, "on_modified") as _on_modified:
+            self.handler.dispatch(_event)
+            self.assertEqual(_on_modified.call_count, 0)
+        self.assertEqual(self.handler.pending_events, [_event])
+
+    def test_dispatch_record(self):
+        _event = FileModifiedEvent(src_path="/a/.git/index")
+        self.handler.trace_recorder = mock.Mock()
+        self.handler.dispatch(_event)
+        self.handler.trace_recorder.record.assert_called_once_with(_event)
+
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    def test_flush(self, _remote_rm_multi):
+        _events = [
+            FileModifiedEvent(src_path="/a/b/1.py"),
+            FileDeletedEvent(src_path="/a/b/2.py"),
+            DirDeletedEvent(src_path="/a/b"),
+            FileDeletedEvent(src_path="/a/2.py"),
+            FileModifiedEvent(src_path="/a/3.py")
+        ]
+        for _event in _events:
+            self.handler.dispatch(_event)
+        with mock.patch.object(self.handler, "on_modified") as _on_modified:
+            self.handler.flush()
+            self.assertEqual(_on_modified.call_count, 0)
+            self.handler.scheduler.run_pending()
+            _on_modified.assert_called_once_with(_events[4])
+        _remote_rm_multi.assert_called_once_with(
+            dst_paths=["/b/a/b", "/b/a/2.py"]
+        )
+        self.assertEqual(self.handler.pending_events, [])
+
+    def test_flush_moves(self):
+        _events = [FileDeletedEvent(src_path="/a/b/1.bin"),
+                   FileCreatedEvent(src_path="/a/c/1.bin")]
+        for _event in _events:
+            self.handler.dispatch(_event)
+        self.handler.move_detector = mock.Mock()
+        self.handler.move_detector.pair.return_value = (
+            [("b/1.bin", "c/1.bin", False)], []
+        )
+        with mock.patch.object(self.handler, "move_files") as _move_files:
+            self.handler.flush()
+            self.handler.scheduler.run_pending()
+            _move_files.assert_called_once_with(
+                [("b/1.bin", "c/1.bin", False)]
+            )
+        self.handler.move_detector.pair.assert_called_once_with(_events)
+
+    @mock.patch("specchio.transports.SSHTransport.send_file")
+    @mock.patch("specchio.transports.SSHTransport.move")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    def test_move_files(self, _create_folder, _mv, _rsync):
+        _mv.side_effect = [True, False, False]
+        self.handler.large_file_lane = None
+        self.handler.move_files([("b/1.bin", "c/1.bin", False),
+                                 ("b/2.bin", "c/2.bin", True),
+                                 ("b/3.bin", "c/3.bin", False)])
+        self.assertEqual(_mv.call_args_list[0], mock.call(
+            src_path="/b/a/b/1.bin", dst_path="/b/a/c/1.bin"
+        ))
+        _create_folder.assert_called_with(dst_path="/b/a/c")
+        # Only the file not synced by its own event is sent again
+        _rsync.assert_called_once_with(src_path="/a/c/3.bin",
+                                       dst_path="/b/a/c/3.bin")
+
+    @mock.patch("specchio.handlers.os.lstat")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_sync_differences_with_size_policy(self, _rsync_multi, _lstat):
+        _lstat.return_value.st_size = 10
+        self.handler.large_file_lane = None
+        self.handler.size_policy = mock.Mock()
+        self.handler.size_policy.check.side_effect = [None, SKIP, DEFER]
+        with mock.patch.object(self.handler, "send_deferred") as _deferred:
+            self.handler.sync_differences(["1.py", "core.1", "2.csv"], [])
+            _rsync_multi.assert_called_once_with(
+                folder_path="/a/", src_paths=["1.py"], dst_path="/b/a/",
+                bwlimit=None
+            )
+            self.assertEqual(_deferred.call_count, 0)
+            self.handler.scheduler.run_pending()
+            _deferred.assert_called_once_with(["2.csv"])
+        self.handler.size_policy.check.assert_called_with("2.csv", 10)
+
+    @mock.patch("specchio.handlers.os.lstat")
+    @mock.patch("specchio.transports.SSHTransport.send_file")
+    def test_rsync_file_with_size_policy(self, _rsync, _lstat):
+        _lstat.return_value.st_size = 10
+        self.handler.size_policy = mock.Mock()
+        self.handler.size_policy.check.side_effect = [SKIP, DEFER]
+        with mock.patch.object(self.handler, "send_deferred") as _deferred:
+            self.handler.rsync_file("/a/core.1", "/b/a/core.1")
+            self.handler.rsync_file("/a/b/2.csv", "/b/a/b/2.csv")
+            self.handler.scheduler.run_pending()
+            _deferred.assert_called_once_with(["b/2.csv"])
+        self.assertEqual(_rsync.call_count, 0)
+
+    @mock.patch("specchio.handlers.os.path.isfile")
+    @mock.patch("specchio.transports.SSHTransport.send_large_file")
+    @mock.patch("specchio.transports.SSHTransport.create_folder")
+    def test_send_deferred(self, _create_folder, _rsync_large, _isfile):
+        _isfile.side_effect = [True, False]
+        self.handler.bulk_bwlimit = 100
+        self.handler.send_deferred(["b/2.csv", "3.csv"])
+        _create_folder.assert_called_once_with(dst_path="/b/a/b")
+        _rsync_large.assert_called_once_with(
+            src_path="/a/b/2.csv", dst_path="/b/a/b/2.csv", bwlimit=100
+        )
+
+    def test_flush_priority(self):
+        _events = [
+            FileModifiedEvent(src_path="/a/.gitignore"),
+            FileModifiedEvent(src_path="/a/1.py")
+        ]
+        for _event in _events:
+            self.handler.dispatch(_event)
+        self.handler.flush()
+        with mock.patch.object(self.handler, "on_modified") as _on_modified:
+            self.handler.scheduler.run_pending()
+            self.assertEqual(_on_modified.call_args_list,
+                             [mock.call(_events[1]), mock.call(_events[0])])
+
+    def test_reconcile_if_due(self):
+        self.handler.merkle_tree = MerkleTree()
+        self.handler.reconcile_interval = 60
+        self.handler.last_reconcile_time = 0
+        with mock.patch.object(self.handler,
+                               "reconcile_merkle_tree") as _reconcile:
+            self.handler.reconcile_if_due()
+            self.handler.reconcile_if_due()
+            self.assertEqual(self.handler.is_reconciling, True)
+            self.handler.scheduler.run_pending()
+            _reconcile.assert_called_once_with()
+        self.assertEqual(self.handler.is_reconciling, False)
+
+    def test_replay_journal(self):
+        _time = self.handler.clock = mock.Mock()
+        _time.time.return_value = 100
+        _journal = mock.Mock()
+        _journal.get_entries.return_value = (
+            {"1.py": "sync", "b": "remove", "": "create", "c": "create",
+             "d": "create"}, 5
+        )
+        self.handler.journal = _journal
+        self.handler.transport = mock.Mock()
+        self.handler.transport.is_offline = True
+        self.handler.transport.is_reachable.return_value = False
+        self.handler.reconnect_if_due()
+        self.handler.reconnect_if_due()
+        self.handler.scheduler.run_pending()
+        self.assertEqual(self.handler.next_reconnect_time, 102)
+        self.handler.reconnect_if_due()
+        self.assertEqual(self.handler.is_replaying, False)
+        _time.time.return_value = 102
+        self.handler.transport.is_reachable.return_value = True
+        with mock.patch.object(self.handler, "sync_paths") as _sync_paths:
+            with mock.patch("specchio.handlers.os.path.isdir",
+                            side_effect=lambda path: path == "/a/c"):
+                self.handler.reconnect_if_due()
+                self.handler.scheduler.run_pending()
+            self.assertEqual(sorted(_sync_paths.call_args[0][0]),
+                             ["1.py", "b"])
+            self.assertEqual(_sync_paths.call_args[1], {"bwlimit": None})
+        # Only the folder still there and created by no file is created
+        self.handler.transport.create_folder.assert_called_once_with(
+            dst_path="/b/a/c"
+        )
+        _journal.clear.assert_called_once_with(5)
+        self.assertEqual(self.handler.transport.is_offline, False)
+        self.assertEqual(self.handler.reconnect_retries, 0)
+
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    def test_on_deleted_multi(self, _remote_rm_multi):
+        _handler_gitignore_list = list(self.handler.gitignore_list)
+        _handler_gitignore_dict = dict(self.handler.gitignore_dict)
+        self.handler.gitignore_dict["/a/b/.gitignore"] = {
+            1: [], 2: PatternSet(), 3: PatternSet()
+        }
+        self.handler.gitignore_list = ["/a/b/", "/a/"]
+        self.handler.on_deleted_multi([
+            DirDeletedEvent(src_path="/a/b"),
+            FileDeletedEvent(src_path="/a/test.py"),
+            FileDeletedEvent(src_path="/a/1.py")
+        ])
+        _remote_rm_multi.assert_called_once_with(
+            dst_paths=["/b/a/b", "/b/a/1.py"]
+        )
+        self.assertEqual(self.handler.gitignore_list, ["/a/"])
+        self.handler.gitignore_list = _handler_gitignore_list
+        self.handler.gitignore_dict = _handler_gitignore_dict
+
+    @mock.patch("specchio.handlers.get_manifest_value")
+    @mock.patch("specchio.transports.SSHTransport.manifest")
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_verify_remote(self, _rsync_multi, _remote_rm_multi,
+                           _remote_manifest, _get_manifest_value):
+        _get_manifest_value.side_effect = (lambda path, with_hash: {
+            "/a/1.py": "1\t1", "/a/2.py": "2\t2", "/a/3.py": "3\t3"
+        }[path])
+        _remote_manifest.return_value = iter([
+            ("0.py", "0\t0"), ("2.py", "2\t2"),
+            ("3.py", "3\t4"), ("test.py", "5\t5")
+        ])
+        with mock.patch.object(self.handler,
+                               "iter_sync_files") as _iter_sync_files:
+            _iter_sync_files.return_value = iter(["3.py", "1.py", "2.py"])
+            self.handler.verify_remote()
+        _remote_manifest.assert_called_once_with("/b/a/", False, None)
+        _rsync_multi.assert_called_once_with(
+            folder_path=self.handler.src_path,
+            src_paths=["1.py", "3.py"], dst_path=self.handler.dst_path,
+            bwlimit=None
+        )
+        _remote_rm_multi.assert_called_once_with(dst_paths=["/b/a/0.py"])
+
+    def test_get_ignore_rules(self):
+        self.assertEqual(self.handler.get_ignore_rules(), [
+            ("", ["1.py"], ["test.py", "t_folder/*"])
+        ])
+
+    @mock.patch("specchio.handlers.git_ignored_files")
+    def test_get_git_exceptions(self, _git_ignored_files):
+        self.handler.git_index_enabled = False
+        self.assertEqual(self.handler.get_git_exceptions(), ([], []))
+        self.handler.git_index_enabled = True
+        _git_ignored_files.return_value = (["test.py"],
+                                           ["test.py", "b.tmp", "c/"])
+        self.assertEqual(self.handler.get_git_exceptions(),
+                         (["test.py"], ["b.tmp", "c/"]))
+        _git_ignored_files.return_value = None
+        self.assertEqual(self.handler.get_git_exceptions(), ([], []))
+
+    @mock.patch("specchio.transports.RemoteMerkleTree")
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_reconcile_merkle_tree(self, _rsync_multi, _remote_rm_multi,
+                                   _RemoteMerkleTree):
+        self.handler.merkle_tree = MerkleTree()
+        self.handler.merkle_tree.update_file("b/1.py", "1\t1")
+        self.handler.merkle_tree.update_file("b/2.py", "2\t2")
+        self.handler.merkle_tree.update_file("c/3.py", "3\t3")
+        self.handler.merkle_tree.update_file("d", "4\t4")
+        _remote_tree = mock.Mock()
+        _remote_tree.root_hash = "root_hash"
+        _remote_tree.is_failed = False
+        _remote_tree.close.return_value = True
+        _local_children = self.handler.merkle_tree.get_children("b")
+        _remote_tree.get_children.side_effect = [
+            [{"b": ("d", "b_hash"),
+              "c": self.handler.merkle_tree.get_children("")["c"],
+              "d": ("d", "d_hash"), "e": ("f", "e_hash")}],
+            [{"1.py": _local_children["1.py"], "2.py": ("f", "2_hash")}]
+        ]
+        _RemoteMerkleTree.return_value = _remote_tree
+        self.handler.reconcile_merkle_tree()
+        _remote_tree.get_children.assert_has_calls([
+            mock.call([""]), mock.call(["b"])
+        ])
+        self.assertEqual(
+            sorted(_remote_rm_multi.call_args[1]["dst_paths"]),
+            ["/b/a/d", "/b/a/e"]
+        )
+        self.assertEqual(
+            sorted(_rsync_multi.call_args[1]["src_paths"]),
+            ["b/2.py", "d"]
+        )
+        _remote_tree.close.assert_called_once_with()
+
+    @mock.patch("specchio.transports.RemoteMerkleTree")
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    def test_reconcile_merkle_tree_same(self, _remote_rm_multi,
+                                        _RemoteMerkleTree):
+        self.handler.merkle_tree = MerkleTree()
+        _RemoteMerkleTree.return_value.root_hash = (
+            self.handler.merkle_tree.get_hash()
+        )
+        _RemoteMerkleTree.return_value.is_failed = False
+        self.handler.reconcile_merkle_tree()
+        self.assertEqual(
+            _RemoteMerkleTree.return_value.get_children.call_count, 0
+        )
+        self.assertEqual(_remote_rm_multi.call_count, 0)
+
+    @mock.patch("specchio.transports.RemoteMerkleTree")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    def test_reconcile_merkle_tree_failed(self, _remote_rm_multi,
+                                          _send_files, _RemoteMerkleTree):
+        self.handler.merkle_tree = MerkleTree()
+        self.handler.merkle_tree.update_file("b/1.py", "1\t1")
+        _remote_tree = _RemoteMerkleTree.return_value
+        # The helper can't run, the remote isn't treated as empty
+        _remote_tree.root_hash = ""
+        _remote_tree.is_failed = True
+        _remote_tree.close.return_value = False
+        self.handler.reconcile_merkle_tree()
+        self.assertEqual(_remote_tree.get_children.call_count, 0)
+        # The helper exits with an error while descending
+        _remote_tree.root_hash = "root_hash"
+        _remote_tree.is_failed = False
+        _remote_tree.get_children.return_value = [{}]
+        self.handler.reconcile_merkle_tree()
+        self.assertEqual(_remote_tree.close.call_count, 2)
+        self.assertEqual(_send_files.call_count, 0)
+        self.assertEqual(_remote_rm_multi.call_count, 0)
+
+    @mock.patch("specchio.handlers.get_manifest_value")
+    @mock.patch("specchio.handlers.os.path.isfile")
+    @mock.patch("specchio.handlers.os.path.isdir")
+    def test_refresh_merkle_tree(self, _isdir, _isfile,
+                                 _get_manifest_value):
+        self.handler.merkle_tree = MerkleTree()
+        self.handler.merkle_tree.update_file("b/1.py", "1\t1")
+        _isdir.return_value = False
+        _isfile.return_value = True
+        _get_manifest_value.return_value = "2\t2"
+        self.handler.refresh_merkle_tree("/a/b/2.py")
+        self.assertEqual(sorted(self.handler.merkle_tree.iter_files("b")),
+                         ["b/1.py", "b/2.py"])
+        _isfile.return_value = False
+        self.handler.refresh_merkle_tree("/a/b/1.py")
+        self.assertEqual(list(self.handler.merkle_tree.iter_files("b")),
+                         ["b/2.py"])
+
+    @mock.patch("specchio.handlers.os.lstat")
+    @mock.patch("specchio.handlers.get_manifest_value")
+    @mock.patch("specchio.handlers.os.path.isfile")
+    @mock.patch("specchio.handlers.os.path.isdir")
+    def test_merkle_tree_with_size_policy(self, _isdir, _isfile,
+                                          _get_manifest_value, _lstat):
+        sizes = {"/a/1.py": 1, "/a/b/core.1": 10}
+        _lstat.side_effect = lambda path: mock.Mock(st_size=sizes[path],
+                                                   st_mode=0)
+        _get_manifest_value.return_value = "1\t1"
+        self.handler.size_policy = SizePolicy(max_size=5)
+        with mock.patch.object(self.handler,
+                               "iter_sync_files") as _iter_sync_files:
+            _iter_sync_files.return_value = iter(["1.py", "b/core.1"])
+            self.handler.init_merkle_tree()
+        # The skipped file is left out of both trees
+        self.assertEqual(list(self.handler.merkle_tree.iter_files("b")), [])
+        self.assertEqual(self.handler.skipped_files, set(["b/core.1"]))
+        self.handler.transport = mock.Mock()
+        self.handler.transport.merkle_tree.return_value.is_failed = True
+        self.handler.reconcile_merkle_tree()
+        self.assertEqual(
+            self.handler.transport.merkle_tree.call_args[1]["excludes"],
+            ["b/core.1"]
+        )
+        # The file is sent once it's small enough
+        _isdir.return_value = False
+        _isfile.return_value = True
+        sizes["/a/b/core.1"] = 1
+        self.handler.refresh_merkle_tree("/a/b/core.1")
+        self.assertEqual(list(self.handler.merkle_tree.iter_files("b")),
+                         ["b/core.1"])
+        self.assertEqual(self.handler.skipped_files, set())
+        sizes["/a/b/core.1"] = 10
+        self.handler.refresh_merkle_tree("/a/b/core.1")
+        self.assertEqual(list(self.handler.merkle_tree.iter_files("b")), [])
+        self.assertEqual(self.handler.skipped_files, set(["b/core.1"]))
+
+    @mock.patch("specchio.handlers.os.lstat")
+    @mock.patch("specchio.handlers.get_manifest_value")
+    @mock.patch("specchio.transports.SSHTransport.manifest")
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_verify_remote_with_size_policy(self, _rsync_multi,
+                                            _remote_rm_multi,
+                                            _remote_manifest,
+                                            _get_manifest_value, _lstat):
+        sizes = {"/a/1.py": 1, "/a/core.1": 10}
+        _lstat.side_effect = lambda path: mock.Mock(st_size=sizes[path],
+                                                   st_mode=0)
+        _get_manifest_value.return_value = "2\t2"
+        _remote_manifest.return_value = iter([("1.py", "1\t1"),
+                                              ("core.1", "1\t1")])
+        self.handler.large_file_lane = None
+        self.handler.size_policy = SizePolicy(max_size=5)
+        with mock.patch.object(self.handler,
+                               "iter_sync_files") as _iter_sync_files:
+            _iter_sync_files.return_value = iter(["1.py", "core.1"])
+            self.handler.verify_remote()
+        # The skipped file is neither sent nor removed remotely
+        _rsync_multi.assert_called_once_with(
+            folder_path=self.handler.src_path, src_paths=["1.py"],
+            dst_path=self.handler.dst_path, bwlimit=None
+        )
+        _remote_rm_multi.assert_called_once_with(dst_paths=[])
+
+    @mock.patch("specchio.handlers.is_git_work_tree")
+    def test_iter_sync_files_from_git(self, _is_git_work_tree):
+        _is_git_work_tree.return_value = True
+        self.handler.git_index_enabled = None
+        with mock.patch.object(self.handler,
+                               "iter_git_files") as _iter_git_files:
+            _iter_git_files.return_value = iter(["1.py"])
+            self.assertEqual(list(self.handler.iter_sync_files()), ["1.py"])
+            _iter_git_files.assert_called_once_with(None)
+        _is_git_work_tree.assert_called_once_with("/a/")
+        self.assertEqual(self.handler.git_index_enabled, True)
+
+    @mock.patch("specchio.handlers.os.lstat")
+    @mock.patch("specchio.handlers.git_ls_files")
+    def test_iter_git_files(self, _git_ls_files, _lstat):
+        _git_ls_files.return_value = iter(["1.py", "deleted.py", "module"])
+        _path2mode = {"/a/b/1.py": 0o100644, "/a/b/module": 0o40755}
+
+        def _fake_lstat(path):
+            if path not in _path2mode:
+                raise OSError
+            return mock.Mock(st_mode=_path2mode[path])
+
+        _lstat.side_effect = _fake_lstat
+        self.assertEqual(list(self.handler.iter_git_files("/a/b")),
+                         ["b/1.py"])
+        _git_ls_files.assert_called_once_with("/a/b")
+
+    @mock.patch("specchio.handlers.os.path.isdir")
+    @mock.patch("specchio.handlers.get_manifest_value")
+    @mock.patch("specchio.transports.SSHTransport.manifest")
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_verify_remote_folders(self, _rsync_multi, _remote_rm_multi,
+                                   _remote_manifest, _get_manifest_value,
+                                   _isdir):
+        _isdir.side_effect = (lambda path: path == "/a/b")
+        _get_manifest_value.return_value = "1\t1"
+        _remote_manifest.return_value = iter([("c/2.py", "2\t2")])
+        with mock.patch.object(self.handler,
+                               "iter_sync_files") as _iter_sync_files:
+            _iter_sync_files.return_value = iter(["b/1.py"])
+            self.handler.verify_remote(folder_paths=["b", "c"])
+            _iter_sync_files.assert_called_once_with("/a/b")
+        _remote_manifest.assert_called_once_with("/b/a/", False,
+                                                 ["b", "c"])
+        _rsync_multi.assert_called_once_with(
+            folder_path=self.handler.src_path,
+            src_paths=["b/1.py"], dst_path=self.handler.dst_path,
+            bwlimit=None
+        )
+        _remote_rm_multi.assert_called_once_with(dst_paths=["/b/a/c/2.py"])
+
+    def test_dispatch_storm(self):
+        self.handler.storm_detector.max_depth = 2
+        _events = [FileModifiedEvent(src_path="/a/b/1.py"),
+                   FileModifiedEvent(src_path="/a/c/2.py"),
+                   FileModifiedEvent(src_path="/a/c/3.py")]
+        for _event in _events:
+            self.handler.dispatch(_event)
+        self.assertEqual(self.handler.pending_events, [])
+        self.assertEqual(self.handler.storm_detector.is_storm, True)
+        self.assertEqual(self.handler.storm_detector.dirty_folders,
+                         set(["/a/b", "/a/c"]))
+
+    def test_flush_after_storm(self):
+        with mock.patch.object(
+            self.handler.storm_detector, "pop_dirty_folders"
+        ) as _pop_dirty_folders:
+            with mock.patch.object(self.handler,
+                                   "verify_remote") as _verify_remote:
+                _pop_dirty_folders.return_value = ["/a", "/a/b"]
+                self.handler.flush()
+                self.handler.scheduler.run_pending()
+                _verify_remote.assert_called_once_with(
+                    folder_paths=["", "b"]
+                )
+        self.handler.init_gitignore.assert_called_once_with("/a/")
+
+    def test_dispatch_git_operation(self):
+        self.handler.git_state_monitor.git_dir = "/a/.git"
+        self.handler.dispatch(FileCreatedEvent(src_path="/a/.git/index.lock"))
+        self.assertEqual(self.handler.git_state_monitor.is_running, True)
+        self.handler.dispatch(FileMovedEvent(src_path="/a/1.py",
+                                             dest_path="/a/b/2.py"))
+        # Syncing a modified folder would send all files under it
+        self.handler.dispatch(DirModifiedEvent(src_path="/a/b"))
+        self.handler.dispatch(DirCreatedEvent(src_path="/a/c"))
+        self.assertEqual(self.handler.pending_events, [])
+        self.assertEqual(self.handler.git_state_monitor.paths,
+                         set(["1.py", "b/2.py", "c"]))
+
+    def test_flush_after_git_operation(self):
+        self.handler.dispatch(FileModifiedEvent(src_path="/a/3.py"))
+        self.handler.dispatch(DirModifiedEvent(src_path="/a"))
+        with mock.patch.object(self.handler.git_state_monitor,
+                               "poll") as _poll:
+            with mock.patch.object(
+                self.handler, "sync_git_changes"
+            ) as _sync_git_changes:
+                def _poll_paths(paths):
+                    # The observer isn't blocked while git runs
+                    self.assertEqual(
+                        self.handler.pending_events_lock.acquire(False), True
+                    )
+                    self.handler.pending_events_lock.release()
+                    return set(["1.py"]) | set(paths), False
+
+                _poll.side_effect = _poll_paths
+                with mock.patch.object(self.handler,
+                                       "on_modified") as _on_modified:
+                    self.handler.flush()
+                    self.handler.scheduler.run_pending()
+                    self.assertEqual(_on_modified.call_count, 0)
+                _sync_git_changes.assert_called_once_with(
+                    set(["1.py", "3.py"]), False
+                )
+
+    @mock.patch("specchio.handlers.os.path.lexists")
+    @mock.patch("specchio.handlers.os.path.isdir")
+    def test_sync_git_changes(self, _isdir, _lexists):
+        _isdir.side_effect = (lambda path: path == "/a/b")
+        _lexists.side_effect = (lambda path: path in ("/a/2.py", "/a/b/1.py"))
+        with mock.patch.object(self.handler,
+                               "iter_sync_files") as _iter_sync_files:
+            with mock.patch.object(
+                self.handler, "sync_differences"
+            ) as _sync_differences:
+                _iter_sync_files.return_value = iter(["b/1.py", "b/2.py"])
+                self.handler.sync_git_changes(
+                    set(["b", "b/1.py", "2.py", "3.py", "test.py"]), False
+                )
+                _iter_sync_files.assert_called_once_with("/a/b")
+                _sync_differences.assert_called_once_with(
+                    ["2.py", "b/1.py", "b/2.py"], ["/b/a/3.py"], bwlimit=None,
+                    use_large_file_lane=True
+                )
+
+    @mock.patch("specchio.handlers.os.path.isfile")
+    def test_sync_now(self, _isfile):
+        _isfile.side_effect = lambda path: path == "/a/b/.gitignore"
+        self.handler.large_file_lane = mock.Mock()
+        with mock.patch.object(self.handler, "sync_paths") as _sync_paths:
+            with mock.patch.object(
+                self.handler, "reapply_gitignore"
+            ) as _reapply_gitignore:
+                _sync_paths.return_value = True
+                self.assertEqual(self.handler.sync_now(["b", "1.py"]), True)
+                _sync_paths.assert_called_once_with(
+                    ["b", "1.py"], use_large_file_lane=False
+                )
+                self.assertEqual(_reapply_gitignore.call_count, 0)
+                # The pushed `.gitignore` is reapplied like by an event
+                with mock.patch("specchio.handlers.get_all_re") as _get_re:
+                    _get_re.return_value = {"/a/b/.gitignore": None}
+                    self.handler.sync_now(["b/.gitignore", "c/.gitignore"])
+                self.assertEqual(
+                    [_call[0][0] for _call in
+                     _reapply_gitignore.call_args_list],
+                    ["/a/b/.gitignore", "/a/c/.gitignore"]
+                )
+                self.assertEqual(self.handler.gitignore_list, ["/a/b/", "/a/"])
+            self.handler.is_offline = mock.Mock(return_value=True)
+            self.assertEqual(self.handler.sync_now(["1.py"]), False)
+
+    def test_wait_synced(self):
+        _time = self.handler.clock = mock.Mock()
+        _time.time.return_value = 0
+        self.handler.scheduler = mock.Mock(seq=3)
+        self.handler.large_file_lane = mock.Mock()
+        self.handler.storm_detector.is_storm = False
+        self.handler.git_state_monitor = mock.Mock(is_running=False)
+        with mock.patch.object(self.handler, "flush") as _flush:
+            self.assertEqual(self.handler.wait_synced(5), True)
+            _flush.assert_called_once_with()
+            self.handler.scheduler.wait.assert_called_once_with(3, 5)
+            self.handler.large_file_lane.wait.assert_called_once_with(5)
+            self.handler.large_file_lane.wait.return_value = False
+            self.assertEqual(self.handler.wait_synced(5), False)
+            self.handler.large_file_lane.wait.return_value = True
+            self.handler.is_offline = mock.Mock(return_value=True)
+            self.assertEqual(self.handler.wait_synced(5), False)
+
+    def test_wait_synced_during_git_operation(self):
+        _time = self.handler.clock = mock.Mock()
+        _time.time.side_effect = [0, 1, 2, 3, 6]
+        self.handler.scheduler = mock.Mock()
+        self.handler.git_state_monitor = mock.Mock(is_running=True)
+        with mock.patch.object(self.handler, "flush") as _flush:
+            self.assertEqual(self.handler.wait_synced(5), False)
+        self.assertEqual(_flush.call_count, 4)
+        self.assertEqual(self.handler.scheduler.wait.call_count, 0)
+
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_sync_differences_without_lane(self, _rsync_multi,
+                                           _remote_rm_multi):
+        self.handler.large_file_lane = mock.Mock()
+        self.handler.large_file_lane.is_large.return_value = True
+        _rsync_multi.return_value = False
+        _remote_rm_multi.return_value = True
+        self.assertEqual(
+            self.handler.sync_differences(["b/2.bin"], [],
+                                          use_large_file_lane=False),
+            False
+        )
+        self.assertEqual(self.handler.large_file_lane.submit.call_count, 0)
+        _rsync_multi.assert_called_once_with(
+            folder_path=self.handler.src_path,
+            src_paths=["b/2.bin"], dst_path=self.handler.dst_path,
+            bwlimit=None
+        )
+
+    def test_sync_git_changes_overflow(self):
+        with mock.patch.object(self.handler,
+                               "resync_folders") as _resync_folders:
+            self.handler.sync_git_changes(set(), True)
+            self.handler.scheduler.run_pending()
+            _resync_folders.assert_called_once_with(["/a/"])
+
+    @mock.patch("specchio.transports.SSHTransport.send_file")
+    def test_rsync_file_large(self, _rsync):
+        self.handler.large_file_lane = mock.Mock()
+        self.handler.large_file_lane.is_large.return_value = True
+        # The file queued by an event is waited
+        self.handler.scheduler.submit(INTERACTIVE, self.handler.rsync_file,
+                                      "/a/1.bin", "/b/a/1.bin",
+                                      is_tracked=True)
+        self.handler.scheduler.run_pending()
+        self.handler.large_file_lane.submit.assert_called_once_with(
+            "/a/1.bin", "/b/a/1.bin", is_tracked=True
+        )
+        self.assertEqual(_rsync.call_count, 0)
+
+    @mock.patch("specchio.transports.SSHTransport.remove_multi")
+    @mock.patch("specchio.transports.SSHTransport.send_files")
+    def test_sync_differences_large(self, _rsync_multi, _remote_rm_multi):
+        self.handler.large_file_lane = mock.Mock()
+        self.handler.large_file_lane.is_large.side_effect = (
+            lambda path: path.endswith(".bin")
+        )
+        self.handler.sync_differences(["1.py", "b/2.bin"], ["/b/a/3.py"])
+        self.handler.large_file_lane.submit.assert_called_once_with(
+            "/a/b/2.bin", "/b/a/b/2.bin", is_tracked=False
+        )
         _rsync_multi.assert_called_once_with(
-            dst_ssh=self.handler.dst_ssh, folder_path=self.handler.src_path,
-            src_paths=["2.py"], dst_path=self.handler.dst_path
+            folder_path=self.handler.src_path,
+            src_paths=["1.py"], dst_path=self.handler.dst_path,
+            bwlimit=None
         )
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.journal import (JournaledTransport, OperationJournal,
+                              get_journal_path)
+
+
+class OperationJournalTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.temp_path, "a", "1.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_append_and_load(self):
+        journal = OperationJournal(self.journal_path)
+        journal.append("sync", ["1.py", "b/2.py"])
+        journal.append("remove", ["1.py"])
+        journal.close()
+        journal = OperationJournal(self.journal_path)
+        self.assertEqual(journal.get_entries(), (
+            {"1.py": "remove", "b/2.py": "sync"}, 3
+        ))
+        self.assertEqual(len(journal), 2)
+        self.assertEqual(journal.record_count, 2)
+
+    def test_broken_record(self):
+        journal = OperationJournal(self.journal_path)
+        journal.append("sync", ["1.py"])
+        journal.close()
+        with open(self.journal_path, "ab") as journal_file:
+            journal_file.write("(\x03\x00")
+        journal = OperationJournal(self.journal_path)
+        self.assertEqual(journal.get_entries(), ({"1.py": "sync"}, 1))
+        journal.append("sync", ["2.py"])
+        journal.close()
+        self.assertEqual(len(OperationJournal(self.journal_path)), 2)
+
+    def test_compact(self):
+        journal = OperationJournal(self.journal_path, max_records=4)
+        for _ in range(3):
+            journal.append("sync", ["1.py", "2.py"])
+        self.assertEqual(journal.record_count, 2)
+        self.assertEqual(len(journal), 2)
+
+    def test_clear(self):
+        journal = OperationJournal(self.journal_path)
+        journal.append("sync", ["1.py", "2.py"])
+        _, last_seq = journal.get_entries()
+        journal.append("remove", ["2.py"])
+        journal.clear(last_seq)
+        journal.close()
+        self.assertEqual(OperationJournal(self.journal_path).get_entries(),
+                         ({"2.py": "remove"}, 3))
+
+    def test_get_journal_path(self):
+        self.assertNotEqual(get_journal_path("/a/", "user@host:/b/"),
+                            get_journal_path("/a/", "user@host:/c/"))
+
+
+class JournaledTransportTest(TestCase):
+
+    def setUp(self):
+        self.transport = mock.Mock()
+        self.journal = mock.Mock()
+        self.journal.__len__ = mock.Mock(return_value=0)
+        self.journaled_transport = JournaledTransport(
+            self.transport, self.journal, "/b/a/"
+        )
+
+    def test_online(self):
+        self.transport.send_file.return_value = True
+        self.assertEqual(
+            self.journaled_transport.send_file("/a/1.py", "/b/a/1.py"), True
+        )
+        self.assertEqual(self.journal.append.call_count, 0)
+        self.assertEqual(self.journaled_transport.is_empty,
+                         self.transport.is_empty)
+
+    def test_failed_but_reachable(self):
+        self.transport.send_file.return_value = False
+        self.transport.is_reachable.return_value = True
+        self.assertEqual(
+            self.journaled_transport.send_file("/a/1.py", "/b/a/1.py"), False
+        )
+        self.assertEqual(self.journaled_transport.is_offline, False)
+        self.assertEqual(self.journal.append.call_count, 0)
+
+    def test_offline(self):
+        self.transport.move.return_value = False
+        self.transport.is_reachable.return_value = False
+        self.assertEqual(
+            self.journaled_transport.move("/b/a/1.py", "/b/a/c/1.py"), True
+        )
+        self.assertEqual(self.journaled_transport.is_offline, True)
+        self.journaled_transport.remove_multi(["/b/a/2.py"])
+        self.journaled_transport.send_files("/a/", ["3.py"], "/b/a/")
+        self.journaled_transport.create_folder("/b/a/")
+        self.assertEqual(self.transport.remove_multi.call_count, 0)
+        self.journal.append.assert_has_calls([
+            mock.call("sync", ["1.py", "c/1.py"]),
+            mock.call("remove", ["2.py"]),
+            mock.call("sync", ["3.py"]),
+            mock.call("create", [""])
+        ])
+
+    def test_offline_with_journal(self):
+        self.journal.__len__.return_value = 1
+        self.assertEqual(JournaledTransport(self.transport, self.journal,
+                                            "/b/a/").is_offline, True)
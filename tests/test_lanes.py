@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import mock
+from specchio.lanes import LargeFileLane
+
+
+class LargeFileLaneTest(TestCase):
+
+    def setUp(self):
+        self.transport = mock.Mock()
+        self.lane = LargeFileLane(self.transport, min_size=100, bwlimit=500,
+                                  max_retries=2)
+        # Don't start the thread
+        self.lane.thread = mock.Mock()
+
+    @mock.patch("specchio.lanes.os.path.getsize")
+    def test_is_large(self, _getsize):
+        _getsize.side_effect = [100, 99, OSError]
+        self.assertEqual(self.lane.is_large("/a/1.bin"), True)
+        self.assertEqual(self.lane.is_large("/a/1.bin"), False)
+        self.assertEqual(self.lane.is_large("/a/1.bin"), False)
+
+    def test_submit(self):
+        self.lane.submit("/a/1.bin", "/b/a/1.bin")
+        self.lane.submit("/a/2.bin", "/b/a/2.bin")
+        self.lane.submit("/a/1.bin", "/b/a/3.bin")
+        self.assertEqual(self.lane.pop(), ("/a/1.bin", "/b/a/3.bin"))
+        self.assertEqual(self.lane.pop(), ("/a/2.bin", "/b/a/2.bin"))
+        self.assertEqual(self.lane.pending_files, {})
+
+    @mock.patch("specchio.lanes.time")
+    def test_transfer(self, _time):
+        self.transport.send_large_file.side_effect = [False, True]
+        self.assertEqual(self.lane.transfer("/a/1.bin", "/b/a/c/1.bin"),
+                         True)
+        self.transport.create_folder.assert_called_once_with(
+            dst_path="/b/a/c"
+        )
+        self.transport.send_large_file.assert_has_calls([
+            mock.call(src_path="/a/1.bin", dst_path="/b/a/c/1.bin",
+                      bwlimit=500, is_resumed=False),
+            mock.call(src_path="/a/1.bin", dst_path="/b/a/c/1.bin",
+                      bwlimit=500, is_resumed=True)
+        ])
+        _time.sleep.assert_called_once_with(2)
+
+    @mock.patch("specchio.lanes.time")
+    def test_transfer_failed(self, _time):
+        self.transport.send_large_file.return_value = False
+        self.assertEqual(self.lane.transfer("/a/1.bin", "/b/a/1.bin"),
+                         False)
+        self.assertEqual(self.transport.send_large_file.call_count, 3)
+
+    def test_wait(self):
+        self.assertEqual(self.lane.wait(), True)
+        self.lane.submit("/a/1.bin", "/b/a/1.bin", is_tracked=True)
+        self.assertEqual(self.lane.wait(timeout=0.01), False)
+        self.lane.pop()
+        # The file is still being sent
+        self.assertEqual(self.lane.wait(timeout=0.01), False)
+        self.lane.is_transferring = self.lane.is_tracked_transfer = False
+        self.assertEqual(self.lane.wait(timeout=0.01), True)
+        # The file queued by background work isn't waited
+        self.lane.submit("/a/2.bin", "/b/a/2.bin")
+        self.assertEqual(self.lane.wait(timeout=0.01), True)
+        self.lane.pop()
+        self.assertEqual(self.lane.wait(timeout=0.01), True)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import logging
+from unittest import TestCase
+
+from specchio.logs import AsyncStreamHandler, JsonFormatter
+
+
+class AsyncStreamHandlerTest(TestCase):
+
+    def setUp(self):
+        self.stream = io.BytesIO()
+        self.handler = AsyncStreamHandler(self.stream, burst_size=2,
+                                          settle_time=1, max_burst_time=10)
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def make_record(self, msg, created, summary=None):
+        record = logging.makeLogRecord({"msg": msg, "created": created})
+        if summary is not None:
+            record.summary = summary
+        return record
+
+    def test_write_burst(self):
+        for index in range(1243):
+            self.handler.write_event(self.make_record(
+                "Rsync {} remotely".format(index), 100 + index * 0.0025,
+                "synced {} files"
+            ))
+        self.handler.write_event(self.make_record("Other", 103.2))
+        self.handler.write_summaries(103.5)
+        self.assertEqual(self.stream.getvalue(), (
+            "Rsync 0 remotely\nRsync 1 remotely\nOther\n"
+        ))
+        self.handler.write_summaries(104.2)
+        self.assertEqual(self.stream.getvalue().splitlines()[-1],
+                         "synced 1,243 files in 3.1s")
+
+    def test_write_no_burst(self):
+        self.handler.write_event(self.make_record("Rsync 1 remotely", 100,
+                                                  "synced {} files"))
+        self.handler.write_summaries(None)
+        self.assertEqual(self.stream.getvalue(), "Rsync 1 remotely\n")
+
+    def test_write_long_burst(self):
+        for index in range(24):
+            self.handler.write_event(self.make_record(
+                "Rsync {} remotely".format(index), 100 + index * 0.5,
+                "synced {} files"
+            ))
+            self.handler.write_summaries(100 + index * 0.5)
+        self.handler.write_summaries(None)
+        self.assertEqual(self.stream.getvalue().splitlines()[2:], [
+            "synced 21 files in 10.0s", "synced 3 files in 1.5s"
+        ])
+
+    def test_emit_and_close(self):
+        logger = logging.getLogger("specchio.test_logs")
+        logger.propagate = False
+        logger.addHandler(self.handler)
+        try:
+            logger.info("Rsync %s remotely", "1.py")
+            self.handler.close()
+        finally:
+            logger.removeHandler(self.handler)
+        self.assertEqual(self.stream.getvalue(), "Rsync 1.py remotely\n")
+
+
+class JsonFormatterTest(TestCase):
+
+    def test_format(self):
+        record = logging.makeLogRecord({
+            "name": "specchio", "levelname": "INFO", "created": 0,
+            "msg": "synced 3 files in 0.1s", "summary": "synced {} files",
+            "count": 3
+        })
+        result = json.loads(JsonFormatter(datefmt="%Y").format(record))
+        self.assertEqual(result, {
+            "time": "1970", "level": "INFO", "name": "specchio",
+            "message": "synced 3 files in 0.1s",
+            "summary": "synced {} files", "count": 3
+        })
@@ -1,13 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import io
 from unittest import TestCase
 
 import mock
 from testfixtures import LogCapture
 
-from specchio.main import main
+from specchio.main import main, push_main, wait_main
 
 
 class mainTest(TestCase):
@@ -16,29 +15,21 @@ class mainTest(TestCase):
         "--init-remote"
     }
 
-    @mock.patch("specchio.main.os")
+    @mock.patch("specchio.main.StartupCache")
     @mock.patch("specchio.main.sys")
     @mock.patch("specchio.main.SpecchioEventHandler")
-    def test_main_invalid(self, _SpecchioEventHandler, _sys, _os):
+    def test_main_invalid(self, _SpecchioEventHandler, _sys, _StartupCache):
         _sys.argv = ["specchio"]
-        _arg2ret = {
-            "whereis ssh": io.StringIO(u"test_msg"),
-            "whereis rsync": io.StringIO(u"test_msg")
-        }
-        _os.popen.side_effect = (lambda arg: _arg2ret[arg])
         main()
         self.assertEqual(_SpecchioEventHandler.call_count, 0)
 
-    @mock.patch("specchio.main.os")
+    @mock.patch("specchio.main.StartupCache")
     @mock.patch("specchio.main.sys")
     @mock.patch("specchio.main.init_logger")
-    def test_main_no_ssh(self, _init_logger, _sys, _os):
+    def test_main_no_ssh(self, _init_logger, _sys, _StartupCache):
         _init_logger.return_value = True
         _sys.argv = ["specchio"]
-        _arg2ret = {
-            "whereis ssh": io.StringIO(u"")
-        }
-        _os.popen.side_effect = (lambda arg: _arg2ret[arg])
+        _StartupCache.return_value.get_binary.return_value = None
         with LogCapture() as log_capture:
             main()
             log_capture.check(
@@ -46,17 +37,15 @@ class mainTest(TestCase):
                                       "but there is no `ssh` in the system")
             )
 
-    @mock.patch("specchio.main.os")
+    @mock.patch("specchio.main.StartupCache")
     @mock.patch("specchio.main.sys")
     @mock.patch("specchio.main.init_logger")
-    def test_main_no_rsync(self, _init_logger, _sys, _os):
+    def test_main_no_rsync(self, _init_logger, _sys, _StartupCache):
         _init_logger.return_value = True
         _sys.argv = ["specchio"]
-        _arg2ret = {
-            "whereis ssh": io.StringIO(u"test_msg"),
-            "whereis rsync": io.StringIO(u"")
-        }
-        _os.popen.side_effect = (lambda arg: _arg2ret[arg])
+        _StartupCache.return_value.get_binary.side_effect = (
+            lambda name: "/usr/bin/ssh" if name == "ssh" else None
+        )
         with LogCapture() as log_capture:
             main()
             log_capture.check(
@@ -64,20 +53,18 @@ class mainTest(TestCase):
                                       "but there is no `rsync` in the system")
             )
 
-    @mock.patch("specchio.main.os")
+    @mock.patch("specchio.main.get_journal_path")
+    @mock.patch("specchio.main.OperationJournal")
+    @mock.patch("specchio.main.StartupCache")
     @mock.patch("specchio.main.sys")
     @mock.patch("specchio.main.time")
     @mock.patch("specchio.main.Observer")
     @mock.patch("specchio.main.init_logger")
     @mock.patch("specchio.main.SpecchioEventHandler")
     def test_main(self, _SpecchioEventHandler, _init_logger,
-                  _Observer, _time, _sys, _os):
-        _arg2ret = {
-            "whereis ssh": io.StringIO(u"test_msg"),
-            "whereis rsync": io.StringIO(u"test_msg")
-        }
+                  _Observer, _time, _sys, _StartupCache, _OperationJournal,
+                  _get_journal_path):
         _init_logger.return_value = True
-        _os.popen.side_effect = (lambda arg: _arg2ret[arg])
         _sys.argv = ["specchio", "/a/", "user@host:/b/a/"]
         _event_handler = mock.Mock()
         _SpecchioEventHandler.return_value = _event_handler
@@ -92,27 +79,252 @@ class mainTest(TestCase):
             )
         _SpecchioEventHandler.assert_called_once_with(
             src_path="/a/", dst_ssh="user@host", dst_path="/b/a/",
-            is_init_remote=False
+            is_init_remote=False, is_verify_remote=False, is_checksum=False,
+            reconcile_interval=None, storm_rate=200, storm_queue=1000,
+            large_file_size=32, large_file_bwlimit=None, bulk_bwlimit=None,
+            startup_cache=_StartupCache.return_value, trace_recorder=None,
+            transport=None, scan_processes=0,
+            journal=_OperationJournal.return_value,
+            size_policy=None
         )
         _observer_object.schedule.assert_called_once_with(
             _event_handler, "/a/", recursive=True
         )
         _observer_object.stop.assert_called_once_with()
         _observer_object.join.assert_called_once_with()
+        _get_journal_path.assert_called_once_with("/a/", "user@host:/b/a/")
+        _OperationJournal.return_value.close.assert_called_once_with()
 
-    @mock.patch("specchio.main.os")
+    @mock.patch("specchio.main.StartupCache")
     @mock.patch("specchio.main.sys")
     @mock.patch("specchio.main.init_logger")
     @mock.patch("specchio.main.SpecchioEventHandler")
     @mock.patch("specchio.main.GENERAL_OPTIONS", _GENERAL_OPTIONS)
     def test_main_with_wrong_options(self, _SpecchioEventHandler,
-                                     _init_logger, _sys, _os):
-        _arg2ret = {
-            "whereis ssh": io.StringIO(u"test_msg"),
-            "whereis rsync": io.StringIO(u"test_msg")
-        }
+                                     _init_logger, _sys, _StartupCache):
         _init_logger.return_value = True
-        _os.popen.side_effect = (lambda arg: _arg2ret[arg])
         _sys.argv = ["specchio", "--test", "/a/", "user@host:/b/a/"]
         main()
         self.assertEqual(_SpecchioEventHandler.call_count, 0)
+
+    @mock.patch("specchio.main.get_journal_path")
+    @mock.patch("specchio.main.OperationJournal")
+    @mock.patch("specchio.main.StartupCache")
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.time")
+    @mock.patch("specchio.main.Observer")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.SpecchioEventHandler")
+    def test_main_with_value_options(self, _SpecchioEventHandler,
+                                     _init_logger, _Observer, _time, _sys,
+                                     _StartupCache, _OperationJournal,
+                                     _get_journal_path):
+        _init_logger.return_value = True
+        _sys.argv = ["specchio", "--verify-remote",
+                     "--reconcile-interval=60", "--storm-rate=50", "/a/",
+                     "user@host:/b/a/"]
+        _time.sleep = mock.PropertyMock(side_effect=KeyboardInterrupt)
+        main()
+        _SpecchioEventHandler.assert_called_once_with(
+            src_path="/a/", dst_ssh="user@host", dst_path="/b/a/",
+            is_init_remote=False, is_verify_remote=True, is_checksum=False,
+            reconcile_interval=60, storm_rate=50, storm_queue=1000,
+            large_file_size=32, large_file_bwlimit=None, bulk_bwlimit=None,
+            startup_cache=_StartupCache.return_value, trace_recorder=None,
+            transport=None, scan_processes=0,
+            journal=_OperationJournal.return_value,
+            size_policy=None
+        )
+
+    @mock.patch("specchio.main.get_journal_path")
+    @mock.patch("specchio.main.OperationJournal")
+    @mock.patch("specchio.main.StartupCache")
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.time")
+    @mock.patch("specchio.main.Observer")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.LocalTransport")
+    @mock.patch("specchio.main.SpecchioEventHandler")
+    def test_main_local(self, _SpecchioEventHandler, _LocalTransport,
+                        _init_logger, _Observer, _time, _sys,
+                        _StartupCache, _OperationJournal, _get_journal_path):
+        _sys.argv = ["specchio", "/a/", "/b/a"]
+        _StartupCache.return_value.get_binary.return_value = None
+        _time.sleep = mock.PropertyMock(side_effect=KeyboardInterrupt)
+        main()
+        self.assertEqual(_StartupCache.return_value.get_binary.call_count, 0)
+        self.assertEqual(_SpecchioEventHandler.call_args[1]["dst_ssh"], None)
+        self.assertEqual(_SpecchioEventHandler.call_args[1]["dst_path"],
+                         "/b/a/")
+        self.assertEqual(_SpecchioEventHandler.call_args[1]["transport"],
+                         _LocalTransport.return_value)
+
+    @mock.patch("specchio.main.get_journal_path")
+    @mock.patch("specchio.main.OperationJournal")
+    @mock.patch("specchio.main.StartupCache")
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.time")
+    @mock.patch("specchio.main.Observer")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.PollingObserver")
+    @mock.patch("specchio.main.SpecchioEventHandler")
+    def test_main_polling(self, _SpecchioEventHandler, _PollingObserver,
+                          _init_logger, _Observer, _time, _sys,
+                          _StartupCache, _OperationJournal,
+                          _get_journal_path):
+        _sys.argv = ["specchio", "--poll-interval=30", "/a/",
+                     "user@host:/b/a/"]
+        _time.sleep = mock.PropertyMock(side_effect=KeyboardInterrupt)
+        main()
+        self.assertEqual(_Observer.call_count, 0)
+        _PollingObserver.assert_called_once_with(max_interval=30)
+        _PollingObserver.return_value.schedule.assert_called_once_with(
+            _SpecchioEventHandler.return_value, "/a/", recursive=True
+        )
+        _PollingObserver.return_value.stop.assert_called_once_with()
+
+    @mock.patch("specchio.main.get_journal_path")
+    @mock.patch("specchio.main.OperationJournal")
+    @mock.patch("specchio.main.StartupCache")
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.time")
+    @mock.patch("specchio.main.Observer")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.PushServer")
+    @mock.patch("specchio.main.SpecchioEventHandler")
+    def test_main_push_socket(self, _SpecchioEventHandler, _PushServer,
+                              _init_logger, _Observer, _time, _sys,
+                              _StartupCache, _OperationJournal,
+                              _get_journal_path):
+        _sys.argv = ["specchio", "--push-socket=/tmp/specchio.sock", "/a/",
+                     "user@host:/b/a/"]
+        _time.sleep = mock.PropertyMock(side_effect=KeyboardInterrupt)
+        main()
+        _PushServer.assert_called_once_with(
+            _SpecchioEventHandler.return_value, "/tmp/specchio.sock"
+        )
+        _PushServer.return_value.start.assert_called_once_with()
+        _PushServer.return_value.stop.assert_called_once_with()
+
+    @mock.patch("specchio.main.get_journal_path")
+    @mock.patch("specchio.main.OperationJournal")
+    @mock.patch("specchio.main.StartupCache")
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.time")
+    @mock.patch("specchio.main.Observer")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.load_policy")
+    @mock.patch("specchio.main.SpecchioEventHandler")
+    def test_main_size_policy(self, _SpecchioEventHandler, _load_policy,
+                              _init_logger, _Observer, _time, _sys,
+                              _StartupCache, _OperationJournal,
+                              _get_journal_path):
+        _sys.argv = ["specchio", "--max-file-size=2",
+                     "--size-policy=/tmp/policy", "/a/", "user@host:/b/a/"]
+        _time.sleep = mock.PropertyMock(side_effect=KeyboardInterrupt)
+        main()
+        _load_policy.assert_called_once_with("/tmp/policy",
+                                             max_size=2 * 1024 * 1024)
+        self.assertEqual(
+            _SpecchioEventHandler.call_args[1]["size_policy"],
+            _load_policy.return_value
+        )
+        _SpecchioEventHandler.reset_mock()
+        _load_policy.side_effect = ValueError("Invalid line 1")
+        with LogCapture() as log_capture:
+            main()
+            log_capture.check(
+                ("specchio", "INFO", "Initialize Specchio"),
+                ("specchio", "ERROR",
+                 "Failed to load the size policy: Invalid line 1")
+            )
+        self.assertEqual(_SpecchioEventHandler.call_count, 0)
+        _sys.argv = ["specchio", "--max-file-size=2", "/a/",
+                     "user@host:/b/a/"]
+        main()
+        self.assertEqual(
+            _SpecchioEventHandler.call_args[1]["size_policy"].max_size,
+            2 * 1024 * 1024
+        )
+
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.push_paths")
+    def test_push_main(self, _push_paths, _init_logger, _sys):
+        _sys.argv = ["specchio-push", "--socket=/tmp/specchio.sock",
+                     "--timeout=10", "1.py", "b/"]
+        _push_paths.return_value = (True, None)
+        self.assertEqual(push_main(), 0)
+        _push_paths.assert_called_once_with("/tmp/specchio.sock",
+                                            ["1.py", "b/"], timeout=10)
+        _push_paths.return_value = (False, "Timed out")
+        with LogCapture() as log_capture:
+            self.assertEqual(push_main(), 1)
+            log_capture.check(
+                ("specchio", "ERROR", "Failed to push: Timed out")
+            )
+
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.push_paths")
+    def test_push_main_invalid(self, _push_paths, _init_logger, _sys):
+        for argv in [["specchio-push", "1.py"],
+                     ["specchio-push", "--socket=/tmp/specchio.sock"],
+                     ["specchio-push", "--socket=/tmp/specchio.sock",
+                      "--timeout=a", "1.py"]]:
+            _sys.argv = argv
+            self.assertEqual(push_main(), 1)
+        self.assertEqual(_push_paths.call_count, 0)
+
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.wait_synced")
+    def test_wait_main(self, _wait_synced, _init_logger, _sys):
+        _sys.argv = ["specchio", "wait", "--socket=/tmp/specchio.sock"]
+        _wait_synced.return_value = (True, None)
+        self.assertEqual(main(), 0)
+        _wait_synced.assert_called_once_with("/tmp/specchio.sock",
+                                             timeout=60)
+        _sys.argv.append("--timeout=5")
+        _wait_synced.return_value = (False, "Timed out")
+        with LogCapture() as log_capture:
+            self.assertEqual(wait_main(), 1)
+            log_capture.check(
+                ("specchio", "ERROR", "Failed to wait: Timed out")
+            )
+        _wait_synced.assert_called_with("/tmp/specchio.sock", timeout=5)
+
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.wait_synced")
+    def test_wait_main_invalid(self, _wait_synced, _init_logger, _sys):
+        for argv in [["specchio", "wait"],
+                     ["specchio", "wait", "--socket=/tmp/specchio.sock",
+                      "--timeout=a"],
+                     ["specchio", "wait", "--socket=/tmp/specchio.sock",
+                      "--push-socket=/tmp/specchio.sock"]]:
+            _sys.argv = argv
+            self.assertEqual(wait_main(), 1)
+        self.assertEqual(_wait_synced.call_count, 0)
+
+    @mock.patch("specchio.main.StartupCache")
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.SpecchioEventHandler")
+    def test_main_with_invalid_value(self, _SpecchioEventHandler,
+                                     _init_logger, _sys, _StartupCache):
+        _init_logger.return_value = True
+        _sys.argv = ["specchio", "--reconcile-interval=a", "/a/",
+                     "user@host:/b/a/"]
+        main()
+        self.assertEqual(_SpecchioEventHandler.call_count, 0)
+
+    @mock.patch("specchio.main.StartupCache")
+    @mock.patch("specchio.main.sys")
+    @mock.patch("specchio.main.init_logger")
+    @mock.patch("specchio.main.SpecchioEventHandler")
+    def test_main_with_missing_value(self, _SpecchioEventHandler,
+                                     _init_logger, _sys, _StartupCache):
+        _sys.argv = ["specchio", "--record", "/a/", "user@host:/b/a/"]
+        main()
+        self.assertEqual(_SpecchioEventHandler.call_count, 0)
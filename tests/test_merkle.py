@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.merkle import MerkleTree, RemoteMerkleTree, get_hash
+from specchio.utils import get_manifest_value
+
+
+class MerkleTreeTest(TestCase):
+
+    def setUp(self):
+        self.tree = MerkleTree()
+        self.tree.update_file("a/b/1.py", "1\t1")
+        self.tree.update_file("a/2.py", "2\t2")
+        self.tree.update_file("3.py", "3\t3")
+
+    def test_update_file(self):
+        self.assertEqual(sorted(self.tree.folders.keys()), ["", "a", "a/b"])
+        self.assertEqual(self.tree.get_children("a/b"),
+                         {"1.py": ("f", get_hash("1\t1"))})
+        _hash = self.tree.get_hash()
+        self.tree.update_file("a/b/1.py", "1\t2")
+        self.assertNotEqual(self.tree.get_hash(), _hash)
+        self.tree.update_file("a/b/1.py", "1\t1")
+        self.assertEqual(self.tree.get_hash(), _hash)
+
+    def test_remove(self):
+        _hash = self.tree.get_hash()
+        self.tree.update_file("c/d/4.py", "4\t4")
+        self.tree.remove("c/d/4.py")
+        self.assertEqual(sorted(self.tree.folders.keys()), ["", "a", "a/b"])
+        self.assertEqual(self.tree.get_hash(), _hash)
+        self.tree.remove("a")
+        self.assertEqual(sorted(self.tree.folders.keys()), [""])
+
+    def test_iter_files(self):
+        self.assertEqual(sorted(self.tree.iter_files("a")),
+                         ["a/2.py", "a/b/1.py"])
+        self.assertEqual(list(self.tree.iter_files("3.py")), ["3.py"])
+        self.assertEqual(list(self.tree.iter_files("4.py")), [])
+
+
+class RemoteMerkleTreeTest(TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp()
+        for path in ("a/b/1.py", "a/2.py", "a/2.pyc", "3.py", ".git/HEAD"):
+            path = os.path.join(self.folder_path, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as _file:
+                _file.write(path)
+        self.tree = MerkleTree()
+        for path in ("a/b/1.py", "a/2.py", "3.py"):
+            self.tree.update_file(path, get_manifest_value(
+                os.path.join(self.folder_path, path)
+            ))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder_path)
+
+    @mock.patch("specchio.merkle.subprocess")
+    def test_remote_merkle_tree(self, _subprocess):
+        # Run the helper locally instead of by ssh
+        _subprocess.PIPE = subprocess.PIPE
+        _subprocess.Popen.side_effect = (
+            lambda args, **kwargs: subprocess.Popen(["sh", "-c", args[2]],
+                                                    **kwargs)
+        )
+        remote_tree = RemoteMerkleTree("user@host", self.folder_path,
+                                       [("", [], ["*.pyc"])])
+        self.assertEqual(remote_tree.root_hash, self.tree.get_hash())
+        self.assertEqual(
+            remote_tree.get_children(["a", "a/b", "c"]),
+            [self.tree.get_children("a"), self.tree.get_children("a/b"), {}]
+        )
+        self.assertEqual(remote_tree.close(), True)
+
+    @mock.patch("specchio.merkle.subprocess")
+    def test_remote_merkle_tree_exceptions(self, _subprocess):
+        _subprocess.PIPE = subprocess.PIPE
+        _subprocess.Popen.side_effect = (
+            lambda args, **kwargs: subprocess.Popen(["sh", "-c", args[2]],
+                                                    **kwargs)
+        )
+        # Only the tracked file is kept in the ignored folder, and the file
+        # excluded by git is dropped
+        self.tree.remove("a")
+        self.tree.remove("3.py")
+        self.tree.update_file("a/2.pyc", get_manifest_value(
+            os.path.join(self.folder_path, "a/2.pyc")
+        ))
+        remote_tree = RemoteMerkleTree(
+            "user@host", self.folder_path, [("", [], ["*.pyc", "a/"])],
+            includes=["a/2.pyc"], excludes=["3.py"]
+        )
+        self.assertEqual(remote_tree.root_hash, self.tree.get_hash())
+        remote_tree.close()
+
+    @mock.patch("specchio.merkle.subprocess")
+    def test_remote_merkle_tree_failed(self, _subprocess):
+        # Like an unreachable host
+        _subprocess.PIPE = subprocess.PIPE
+        _subprocess.Popen.side_effect = (
+            lambda args, **kwargs: subprocess.Popen(
+                ["sh", "-c", "echo error; exit 255"], **kwargs
+            )
+        )
+        remote_tree = RemoteMerkleTree("user@host", self.folder_path, [])
+        self.assertEqual(remote_tree.is_failed, True)
+        self.assertEqual(remote_tree.get_children([""]), [{}])
+        self.assertEqual(remote_tree.close(), False)
+        # Like an argument list too long
+        _subprocess.Popen.side_effect = OSError
+        remote_tree = RemoteMerkleTree("user@host", self.folder_path, [])
+        self.assertEqual(remote_tree.is_failed, True)
+        self.assertEqual(remote_tree.close(), False)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.moves import MoveDetector
+from watchdog.events import (DirCreatedEvent, DirDeletedEvent,
+                             FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent)
+
+
+class MoveDetectorTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.temp_path, "src")
+        os.makedirs(os.path.join(self.src_path, "b"))
+        self.is_ignore = mock.Mock(return_value=False)
+        self.move_detector = MoveDetector(self.src_path, self.is_ignore,
+                                          min_size=2)
+        for path in ["1.bin", "b/2.bin", "b/3.bin"]:
+            self.write(path, path)
+            self.move_detector.record(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def write(self, path, text):
+        with open(self.get_path(path), "w") as _file:
+            _file.write(text)
+
+    def get_path(self, path):
+        return os.path.join(self.src_path, path)
+
+    def test_record(self):
+        self.write("4.txt", "4")
+        self.move_detector.record("4.txt")
+        self.write(".gitignore", "*.pyc")
+        self.move_detector.record(".gitignore")
+        self.assertEqual(list(self.move_detector.file_index),
+                         ["1.bin", "b/2.bin", "b/3.bin"])
+        self.move_detector.forget("b")
+        self.move_detector.move("1.bin", "c/1.bin")
+        self.assertEqual(list(self.move_detector.file_index), ["c/1.bin"])
+
+    def test_pair_renamed(self):
+        os.rename(self.get_path("1.bin"), self.get_path("b/4.bin"))
+        _deleted = FileDeletedEvent(self.get_path("1.bin"))
+        _created = FileCreatedEvent(self.get_path("b/4.bin"))
+        self.assertEqual(self.move_detector.pair([_deleted, _created]),
+                         ([("1.bin", "b/4.bin", False)], []))
+        self.assertEqual(list(self.move_detector.file_index),
+                         ["b/2.bin", "b/3.bin", "b/4.bin"])
+
+    def test_pair_copied(self):
+        shutil.copy2(self.get_path("1.bin"), self.get_path("4.bin"))
+        os.remove(self.get_path("1.bin"))
+        # The copy keeps the modification time, but not the inode
+        _created = FileCreatedEvent(self.get_path("4.bin"))
+        self.assertEqual(self.move_detector.pair([
+            _created, FileDeletedEvent(self.get_path("1.bin"))
+        ]), ([("1.bin", "4.bin", True)], [_created]))
+
+    def test_pair_same_size_and_time(self):
+        self.write("4.bin", "4.bin")
+        _stat = os.stat(self.get_path("1.bin"))
+        os.utime(self.get_path("4.bin"), (_stat.st_atime, _stat.st_mtime))
+        os.remove(self.get_path("1.bin"))
+        # Another file of the same size and time is synced after the move
+        _created = FileCreatedEvent(self.get_path("4.bin"))
+        self.assertEqual(self.move_detector.pair([
+            FileDeletedEvent(self.get_path("1.bin")), _created
+        ]), ([("1.bin", "4.bin", True)], [_created]))
+
+    def test_pair_changed(self):
+        os.rename(self.get_path("1.bin"), self.get_path("4.bin"))
+        os.utime(self.get_path("4.bin"), (1, 1))
+        _created = FileCreatedEvent(self.get_path("4.bin"))
+        self.assertEqual(self.move_detector.pair([
+            FileDeletedEvent(self.get_path("1.bin")), _created
+        ]), ([("1.bin", "4.bin", True)], [_created]))
+
+    def test_pair_folder(self):
+        os.rename(self.get_path("b"), self.get_path("c"))
+        _events = [DirDeletedEvent(self.get_path("b")),
+                   DirCreatedEvent(self.get_path("c")),
+                   FileCreatedEvent(self.get_path("c/2.bin")),
+                   FileModifiedEvent(self.get_path("c/3.bin"))]
+        self.assertEqual(self.move_detector.pair(_events), (
+            [("b/2.bin", "c/2.bin", False), ("b/3.bin", "c/3.bin", False)],
+            _events[:2]
+        ))
+
+    def test_pair_nothing(self):
+        _events = [FileDeletedEvent(self.get_path("5.bin")),
+                   FileCreatedEvent(self.get_path("1.bin"))]
+        self.assertEqual(self.move_detector.pair(_events), ([], _events))
+        self.assertEqual(self.move_detector.pair([]), ([], []))
+
+    def test_pair_ignored(self):
+        os.rename(self.get_path("1.bin"), self.get_path("4.bin"))
+        self.is_ignore.return_value = True
+        _events = [FileDeletedEvent(self.get_path("1.bin")),
+                   FileCreatedEvent(self.get_path("4.bin"))]
+        self.assertEqual(self.move_detector.pair(_events)[0], [])
+        self.is_ignore.assert_called_once_with(self.get_path("4.bin"),
+                                               False)
+
+    def test_pair_deleted_destination(self):
+        # The file would be removed by the delete of its folder
+        os.rename(self.get_path("1.bin"), self.get_path("b/1.bin"))
+        _events = [FileDeletedEvent(self.get_path("1.bin")),
+                   DirDeletedEvent(self.get_path("b")),
+                   FileCreatedEvent(self.get_path("b/1.bin"))]
+        self.assertEqual(self.move_detector.pair(_events),
+                         ([], _events[1:]))
+        self.assertEqual(self.move_detector.held_events, _events[:1])
+
+    def test_pair_held(self):
+        _deleted = FileDeletedEvent(self.get_path("1.bin"))
+        self.assertEqual(self.move_detector.pair([_deleted]), ([], []))
+        self.assertEqual(self.move_detector.held_events, [_deleted])
+        os.rename(self.get_path("1.bin"), self.get_path("4.bin"))
+        self.assertEqual(self.move_detector.pair([
+            FileCreatedEvent(self.get_path("4.bin"))
+        ]), ([("1.bin", "4.bin", False)], []))
+        self.assertEqual(self.move_detector.held_events, [])
+
+    def test_pair_released(self):
+        _deleted = FileDeletedEvent(self.get_path("1.bin"))
+        _modified = FileModifiedEvent(self.get_path("b/2.bin"))
+        self.move_detector.pair([_deleted])
+        self.assertEqual(self.move_detector.pair([_modified]),
+                         ([], [_deleted, _modified]))
+        # Not held when the path is created again in the same window
+        _created = FileCreatedEvent(self.get_path("1.bin"))
+        self.assertEqual(self.move_detector.pair([_deleted, _created]),
+                         ([], [_deleted, _created]))
+        self.assertEqual(self.move_detector.held_events, [])
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from specchio.policy import DEFER, SKIP, SizePolicy, load_policy, parse_size
+
+
+class SizePolicyTest(TestCase):
+
+    def setUp(self):
+        self.size_policy = SizePolicy(
+            max_size=100,
+            rules=[("core.*", 0, SKIP), ("*.csv", 50, DEFER),
+                   ("/data/big.csv", None, SKIP)],
+            budgets=[("assets/", 30, 2, DEFER)]
+        )
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("100"), 100)
+        self.assertEqual(parse_size("512K"), 512 * 1024)
+        self.assertEqual(parse_size("1.5m"), 1024 * 1024 * 3 / 2)
+        self.assertEqual(parse_size("4GB"), 4 * 1024 ** 3)
+        self.assertEqual(parse_size("-"), None)
+        for text in ["", "M", "1X", "-1"]:
+            self.assertRaises(ValueError, parse_size, text)
+
+    def test_check(self):
+        self.assertEqual(self.size_policy.check("1.py", 100), None)
+        self.assertEqual(self.size_policy.check("1.py", 101), SKIP)
+        self.assertEqual(self.size_policy.check("b/core.1", 1), SKIP)
+        self.assertEqual(self.size_policy.check("b/1.csv", 50), None)
+        self.assertEqual(self.size_policy.check("b/1.csv", 51), DEFER)
+        # The last rule matched wins
+        self.assertEqual(self.size_policy.check("data/big.csv", 1000), None)
+        self.assertEqual(self.size_policy.check("b/data/big.csv", 1000),
+                         DEFER)
+
+    def test_budget(self):
+        self.assertEqual(self.size_policy.check("b/assets/1.png", 20), None)
+        self.assertEqual(self.size_policy.check("b/assets/c/2.png", 20),
+                         DEFER)
+        self.assertEqual(self.size_policy.check("b/assets/1.png", 10), None)
+        self.assertEqual(self.size_policy.check("b/assets/c/2.png", 20),
+                         None)
+        # Out of files
+        self.assertEqual(self.size_policy.check("b/assets/3.png", 0), DEFER)
+        # Each folder has its own budget
+        self.assertEqual(self.size_policy.check("d/assets/3.png", 20), None)
+        self.size_policy.release("b/assets/c")
+        self.assertEqual(self.size_policy.check("b/assets/3.png", 20), None)
+        self.size_policy.release("b")
+        self.assertEqual(self.size_policy.usage, {
+            "d/assets": [20, {"d/assets/3.png": 20}]
+        })
+
+    def test_check_without_charging(self):
+        self.assertEqual(
+            self.size_policy.check("b/assets/1.png", 40, is_charged=False),
+            DEFER
+        )
+        self.assertEqual(
+            self.size_policy.check("b/assets/1.png", 20, is_charged=False),
+            None
+        )
+        self.assertEqual(self.size_policy.usage, {})
+        self.size_policy.check("b/assets/1.png", 20)
+        self.assertEqual(
+            self.size_policy.check("b/assets/2.png", 20, is_charged=False),
+            DEFER
+        )
+        self.assertEqual(self.size_policy.usage, {
+            "b/assets": [20, {"b/assets/1.png": 20}]
+        })
+
+
+class LoadPolicyTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.policy_path = os.path.join(self.temp_path, "policy")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def write(self, text):
+        with open(self.policy_path, "w") as policy_file:
+            policy_file.write(text)
+
+    def test_load_policy(self):
+        self.write("# Comment\n\ncore.* 0\n*.csv 100M defer\n"
+                   "assets/ 2G files=5000 defer\ndata/ - files=10\n")
+        size_policy = load_policy(self.policy_path, max_size=1024)
+        self.assertEqual(size_policy.max_size, 1024)
+        self.assertEqual(
+            [(size, action) for _, size, action in size_policy.rules],
+            [(0, SKIP), (100 * 1024 ** 2, DEFER)]
+        )
+        self.assertEqual(
+            [budget[1:] for budget in size_policy.budgets],
+            [(2 * 1024 ** 3, 5000, DEFER), (None, 10, SKIP)]
+        )
+
+    def test_load_invalid_policy(self):
+        for text in ["*.csv\n", "*.csv 1X\n", "*.csv 1M files=2\n",
+                     "data/ 1M files=a\n", "defer\n"]:
+            self.write(text)
+            self.assertRaises(ValueError, load_policy, self.policy_path)
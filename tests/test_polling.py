@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.polling import PollingObserver, list_folder
+from specchio.utils import PatternSet, match_ignore
+from watchdog.events import (DirCreatedEvent, DirMovedEvent,
+                             FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent, FileMovedEvent)
+
+
+class PollingObserverTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.temp_path, "src")
+        for folder in ["b/c", "build", ".git"]:
+            os.makedirs(os.path.join(self.src_path, folder))
+        for path in ["1.py", "b/2.py", "b/c/3.py", "build/4.py",
+                     ".git/HEAD"]:
+            self.write(path, "1")
+        rules = (
+            os.path.join(self.src_path, ".git/"),
+            [self.src_path + "/"],
+            {self.src_path + "/.gitignore": {
+                1: [], 2: PatternSet(), 3: PatternSet(["*.pyc", "build/*"])
+            }}
+        )
+        self.event_handler = mock.Mock()
+        self.event_handler.is_ignore.side_effect = (
+            lambda path, isdir: match_ignore(path, isdir, *rules)
+        )
+        self.event_handler.git_state_monitor.git_dir = os.path.join(
+            self.src_path, ".git"
+        )
+        self.observer = PollingObserver(max_interval=8)
+        self.observer.schedule(self.event_handler, self.src_path + "/",
+                               recursive=True)
+        self.assertEqual(self.observer.poll(), [])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def write(self, path, text):
+        with open(os.path.join(self.src_path, path), "w") as _file:
+            _file.write(text)
+
+    def get_path(self, path):
+        return os.path.join(self.src_path + "/", path)
+
+    def test_poll(self):
+        self.write("b/2.py", "22")
+        self.write("b/5.py", "5")
+        os.makedirs(os.path.join(self.src_path, "d"))
+        self.write("d/6.py", "6")
+        os.remove(os.path.join(self.src_path, "1.py"))
+        self.assertEqual(self.observer.poll(), [
+            FileDeletedEvent(self.get_path("1.py")),
+            FileCreatedEvent(self.get_path("b/5.py")),
+            DirCreatedEvent(self.get_path("d")),
+            FileCreatedEvent(self.get_path("d/6.py")),
+            FileModifiedEvent(self.get_path("b/2.py"))
+        ])
+        self.assertEqual(self.observer.poll(), [])
+
+    def test_poll_moved(self):
+        os.rename(os.path.join(self.src_path, "b"),
+                  os.path.join(self.src_path, "d"))
+        os.rename(os.path.join(self.src_path, "1.py"),
+                  os.path.join(self.src_path, "d/c/1.py"))
+        self.assertEqual(self.observer.poll(), [
+            DirMovedEvent(self.get_path("b"), self.get_path("d")),
+            FileMovedEvent(self.get_path("1.py"), self.get_path("d/c/1.py"))
+        ])
+
+    def test_poll_ignored(self):
+        self.write("build/5.py", "5")
+        self.write("b/2.pyc", "2")
+        with mock.patch("specchio.polling.list_folder",
+                        side_effect=list_folder) as _list_folder:
+            self.assertEqual(self.observer.poll(), [])
+        self.assertNotIn(mock.call(self.get_path("build")),
+                         _list_folder.call_args_list)
+
+    def test_poll_unchanged_folder(self):
+        for folder in ["", "b", "b/c", ".git"]:
+            os.utime(os.path.join(self.src_path, folder), (1, 1))
+        self.observer.poll()
+        # The size and modification time of file are changed, but not the
+        # folder
+        self.write("b/c/3.py", "33")
+        os.utime(os.path.join(self.src_path, "b/c"), (1, 1))
+        with mock.patch("specchio.polling.list_folder") as _list_folder:
+            self.assertEqual(self.observer.poll(), [
+                FileModifiedEvent(self.get_path("b/c/3.py"))
+            ])
+        self.assertEqual(_list_folder.call_count, 0)
+
+    def test_poll_git_folder(self):
+        self.write(".git/index.lock", "")
+        self.assertEqual(self.observer.poll(), [
+            FileCreatedEvent(self.get_path(".git/index.lock"))
+        ])
+
+    def test_poll_unreachable(self):
+        with mock.patch("specchio.polling.os.lstat", side_effect=OSError):
+            self.assertEqual(self.observer.poll(), [])
+        self.assertEqual(self.observer.poll(), [])
+
+    @mock.patch("specchio.polling.PollingObserver.poll")
+    def test_run(self, _poll):
+        _event = FileModifiedEvent(self.get_path("1.py"))
+        _poll.side_effect = [[], [], [], [_event], []]
+        self.observer.stopped_event = mock.Mock()
+        self.observer.stopped_event.wait.side_effect = [False] * 4 + [True]
+        self.observer.run()
+        self.assertEqual(
+            [_call[0][0] for _call
+             in self.observer.stopped_event.wait.call_args_list],
+            [1, 2, 4, 1, 2]
+        )
+        self.event_handler.dispatch.assert_called_once_with(_event)
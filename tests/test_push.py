@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.push import PushServer, push_paths, wait_synced
+from specchio.scheduler import INTERACTIVE
+
+
+class PushServerTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_path, "push.sock")
+        self.event_handler = mock.Mock()
+        self.event_handler.src_path = "/a/"
+        self.event_handler.sync_now.return_value = True
+        # Run the task at once like the foreground thread
+        self.event_handler.scheduler.submit.side_effect = (
+            lambda priority, func, *args: func(*args)
+        )
+        self.server = PushServer(self.event_handler, self.socket_path,
+                                 timeout=5)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_path)
+
+    def test_push(self):
+        self.assertEqual(self.server.reply(json.dumps({
+            "paths": ["/a/1.py", "b/", "/a"]
+        })), {"ok": True})
+        self.event_handler.sync_now.assert_called_once_with(
+            ["1.py", "b", ""]
+        )
+        self.assertEqual(
+            self.event_handler.scheduler.submit.call_args[0][0], INTERACTIVE
+        )
+
+    def test_push_failed(self):
+        self.event_handler.sync_now.return_value = False
+        self.assertEqual(self.server.reply(json.dumps({"paths": ["1.py"]}))
+                         ["ok"], False)
+
+    def test_push_timeout(self):
+        self.event_handler.scheduler.submit.side_effect = None
+        self.server.timeout = 0.01
+        self.assertEqual(self.server.reply(json.dumps({"paths": ["1.py"]})),
+                         {"ok": False, "error": "Timed out"})
+
+    def test_push_invalid(self):
+        for line in ["[", "{}", json.dumps({"paths": "1.py"}),
+                     json.dumps({"paths": ["/b/1.py"]}),
+                     json.dumps({"paths": ["../1.py"]})]:
+            self.assertEqual(self.server.reply(line)["ok"], False)
+        self.assertEqual(self.event_handler.sync_now.call_count, 0)
+
+    def test_wait(self):
+        self.event_handler.wait_synced.return_value = True
+        self.assertEqual(self.server.reply(json.dumps({"wait": True})),
+                         {"ok": True})
+        self.event_handler.wait_synced.assert_called_once_with(60)
+        self.event_handler.wait_synced.return_value = False
+        self.event_handler.is_offline.return_value = False
+        self.assertEqual(self.server.reply(json.dumps({
+            "wait": True, "timeout": 1
+        })), {"ok": False, "error": "Timed out"})
+        self.event_handler.wait_synced.assert_called_with(1)
+        self.event_handler.is_offline.return_value = True
+        self.assertIn("journaled", self.server.reply(json.dumps({
+            "wait": True
+        }))["error"])
+        self.assertEqual(self.server.reply(json.dumps({
+            "wait": True, "timeout": "a"
+        }))["ok"], False)
+        self.assertEqual(self.event_handler.sync_now.call_count, 0)
+
+    def test_wait_synced(self):
+        self.event_handler.wait_synced.return_value = True
+        self.server.start()
+        self.assertEqual(wait_synced(self.socket_path, 3), (True, None))
+        self.event_handler.wait_synced.assert_called_once_with(3)
+
+    def test_push_paths(self):
+        # A socket left by the last run is replaced
+        _socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        _socket.bind(self.socket_path)
+        _socket.close()
+        self.server.start()
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o077, 0)
+        self.assertEqual(push_paths(self.socket_path, ["/a/b/1.py"]),
+                         (True, None))
+        self.event_handler.sync_now.assert_called_once_with(["b/1.py"])
+        self.event_handler.sync_now.return_value = False
+        self.assertEqual(push_paths(self.socket_path, ["/a/b/1.py"])[0],
+                         False)
+
+    def test_push_paths_without_server(self):
+        self.assertEqual(push_paths(self.socket_path, ["/a/1.py"])[0], False)
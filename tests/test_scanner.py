@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.scanner import ParallelScanner, scan_folders, scan_worker
+from specchio.utils import PatternSet
+
+
+class ParallelScannerTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.temp_path, "src")
+        for folder in ["b/c", "d", "build", ".git"]:
+            os.makedirs(os.path.join(self.src_path, folder))
+        for path in ["1.py", "1.pyc", "b/2.py", "b/c/3.py", "b/c/3.pyc",
+                     "d/4.py", "build/5.py", ".git/HEAD"]:
+            with open(os.path.join(self.src_path, path), "w"):
+                pass
+        os.symlink(os.path.join(self.src_path, "b"),
+                   os.path.join(self.src_path, "e"))
+        self.rules = (
+            os.path.join(self.src_path, ".git/"),
+            [self.src_path + "/"],
+            {self.src_path + "/.gitignore": {
+                1: [], 2: PatternSet(), 3: PatternSet(["*.pyc", "build/*"])
+            }}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def scan(self, folder="", **kwargs):
+        scanner = ParallelScanner(**kwargs)
+        batches = list(scanner.iter_batches(self.src_path, folder,
+                                            self.rules))
+        return batches, sorted(path for batch in batches for path in batch)
+
+    def test_scan_folders(self):
+        files, folders = scan_folders(self.src_path, [""], self.rules, 1)
+        self.assertEqual(sorted(files), ["1.py"])
+        self.assertEqual(sorted(folders), ["b", "d"])
+
+    def test_iter_batches(self):
+        batches, files = self.scan(processes=1, batch_size=1)
+        self.assertEqual(files, ["1.py", "b/2.py", "b/c/3.py", "d/4.py"])
+        self.assertEqual(len(batches), 4)
+
+    def test_iter_batches_in_pool(self):
+        batches, files = self.scan(processes=2, batch_size=1)
+        self.assertEqual(files, ["1.py", "b/2.py", "b/c/3.py", "d/4.py"])
+
+    def test_iter_batches_without_pool(self):
+        with mock.patch("specchio.scanner.multiprocessing.Pool") as _Pool:
+            batches, files = self.scan("b", processes=2)
+        self.assertEqual(batches, [["b/2.py", "b/c/3.py"]])
+        self.assertEqual(_Pool.call_count, 0)
+
+    def test_iter_batches_ignored_folder(self):
+        self.assertEqual(self.scan("build"), ([], []))
+
+    @mock.patch("specchio.scanner.scan_folders")
+    def test_scan_worker(self, _scan_folders):
+        _scan_folders.return_value = ["1.py", "b/2.py"], ["c"]
+        self.assertEqual(scan_worker(self.src_path, [""], 10),
+                         ("1.py\0b/2.py", ["c"]))
+        _scan_folders.side_effect = ValueError
+        self.assertEqual(scan_worker(self.src_path, [""], 10)[0], None)
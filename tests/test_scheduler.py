@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+from unittest import TestCase
+
+import mock
+from specchio.scheduler import BULK, GITIGNORE, INTERACTIVE, SyncScheduler
+
+
+class SyncSchedulerTest(TestCase):
+
+    def setUp(self):
+        self.scheduler = SyncScheduler()
+        self.calls = []
+
+    def test_run_pending_by_priority(self):
+        self.scheduler.submit(BULK, self.calls.append, "bulk")
+        self.scheduler.submit(GITIGNORE, self.calls.append, ".gitignore")
+        self.scheduler.submit(INTERACTIVE, self.calls.append, "1.py")
+        self.scheduler.submit(INTERACTIVE, self.calls.append, "2.py")
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, ["1.py", "2.py", ".gitignore", "bulk"])
+
+    def test_submit_returns_sequence(self):
+        self.assertEqual(
+            self.scheduler.submit(BULK, self.calls.append, 1), None
+        )
+        self.assertEqual(self.scheduler.submit(
+            BULK, self.calls.append, 2, is_tracked=True
+        ), 1)
+        self.assertEqual(self.scheduler.submit(
+            INTERACTIVE, self.calls.append, 3, is_tracked=True
+        ), 2)
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, [3, 1, 2])
+
+    @mock.patch("specchio.scheduler.logger")
+    def test_run_task_failed(self, _logger):
+        _task = mock.Mock(side_effect=OSError)
+        self.scheduler.submit(INTERACTIVE, _task)
+        self.scheduler.submit(INTERACTIVE, self.calls.append, "1.py")
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, ["1.py"])
+        _logger.exception.assert_called_once_with(
+            "Failed to run interactive task"
+        )
+
+    @mock.patch("specchio.scheduler.time")
+    def test_get_delays(self, _time):
+        _time.time.side_effect = [0, 0, 3, 3, 5, 5]
+        self.scheduler.last_report_time = 0
+        self.scheduler.submit(INTERACTIVE, self.calls.append, "1.py")
+        self.scheduler.submit(BULK, self.calls.append, "bulk")
+        self.scheduler.run_pending()
+        self.assertEqual(self.scheduler.get_delays(), {
+            "interactive": (1, 3.0, 3.0),
+            "gitignore": (0, 0.0, 0.0),
+            "bulk": (1, 5.0, 5.0)
+        })
+
+    def test_foreground_not_blocked_by_bulk(self):
+        _bulk_started, _bulk_done = threading.Event(), threading.Event()
+
+        def _bulk():
+            _bulk_started.set()
+            _bulk_done.wait(5)
+
+        _saved = threading.Event()
+        self.scheduler.start()
+        self.scheduler.submit(BULK, _bulk)
+        _bulk_started.wait(5)
+        self.scheduler.submit(INTERACTIVE, _saved.set)
+        self.assertEqual(_saved.wait(5), True)
+        self.assertEqual(_bulk_done.is_set(), False)
+        _bulk_done.set()
+        self.scheduler.stop()
+        for thread in self.scheduler.threads:
+            thread.join(5)
+
+    def test_wait(self):
+        self.assertEqual(self.scheduler.wait(self.scheduler.seq), True)
+        self.scheduler.submit(BULK, self.calls.append, "bulk",
+                              is_tracked=True)
+        seq = self.scheduler.submit(INTERACTIVE, self.calls.append, "1.py",
+                                    is_tracked=True)
+        self.assertEqual(self.scheduler.wait(seq, timeout=0.01), False)
+        self.scheduler.run_pending()
+        self.assertEqual(self.scheduler.wait(seq, timeout=0.01), True)
+        # The tasks submitted later are not waited for
+        self.scheduler.submit(BULK, self.calls.append, "bulk",
+                              is_tracked=True)
+        self.assertEqual(self.scheduler.wait(seq), True)
+
+    def test_wait_not_delayed_by_bulk(self):
+        _bulk_started, _bulk_done = threading.Event(), threading.Event()
+
+        def _bulk():
+            _bulk_started.set()
+            _bulk_done.wait(5)
+
+        self.scheduler.start()
+        self.scheduler.submit(BULK, _bulk)
+        _bulk_started.wait(5)
+        seq = self.scheduler.submit(INTERACTIVE, self.calls.append, "1.py",
+                                    is_tracked=True)
+        # The slow background task has no sequence number to wait for
+        self.assertEqual(self.scheduler.wait(self.scheduler.seq, timeout=5),
+                         True)
+        self.assertEqual(seq, self.scheduler.seq)
+        self.assertEqual(self.calls, ["1.py"])
+        self.assertEqual(_bulk_done.is_set(), False)
+        _bulk_done.set()
+        self.scheduler.stop()
+        for thread in self.scheduler.threads:
+            thread.join(5)
+
+    def test_get_current_seq(self):
+        self.scheduler.submit(INTERACTIVE, lambda: self.calls.append(
+            self.scheduler.get_current_seq()
+        ), is_tracked=True)
+        self.scheduler.submit(BULK, lambda: self.calls.append(
+            self.scheduler.get_current_seq()
+        ))
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, [1, None])
+        self.assertEqual(self.scheduler.get_current_seq(), None)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import mock
+from specchio.storm import StormDetector
+
+
+class StormDetectorTest(TestCase):
+
+    def setUp(self):
+        self.clock = mock.Mock()
+        self.storm_detector = StormDetector("/a/", max_rate=3, max_depth=5,
+                                            settle_time=2, clock=self.clock)
+
+    def test_record_rate(self):
+        self.clock.time.side_effect = [0, 0.5, 1.2, 1.3, 1.4, 1.5]
+        result = [self.storm_detector.record(1) for _ in range(6)]
+        self.assertEqual(result, [False, False, False, False, True, True])
+
+    def test_record_depth(self):
+        self.clock.time.return_value = 0
+        self.assertEqual(self.storm_detector.record(5), False)
+        self.assertEqual(self.storm_detector.record(6), True)
+
+    def test_mark_dirty(self):
+        self.storm_detector.mark_dirty(["/a/b/1.py"])
+        self.storm_detector.mark_dirty(["/a/c/2.py", "/a/d/2.py"])
+        self.assertEqual(self.storm_detector.dirty_folders,
+                         set(["/a/b", "/a/c", "/a/d"]))
+        for index in range(5):
+            self.storm_detector.mark_dirty(["/a/{}/1.py".format(index)])
+        self.assertEqual(self.storm_detector.dirty_folders, set(["/a"]))
+
+    def test_pop_dirty_folders(self):
+        self.storm_detector.is_storm = True
+        self.storm_detector.last_event_time = 10
+        self.storm_detector.dirty_folders = set(["/a/b", "/a/b/c", "/a/d",
+                                                 "/e"])
+        self.clock.time.return_value = 11
+        self.assertEqual(self.storm_detector.pop_dirty_folders(), [])
+        self.clock.time.return_value = 12
+        self.assertEqual(self.storm_detector.pop_dirty_folders(),
+                         ["/a/b", "/a/d"])
+        self.assertEqual(self.storm_detector.is_storm, False)
+        self.assertEqual(self.storm_detector.dirty_folders, set())
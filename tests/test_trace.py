@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.trace import FakeTransport, TraceRecorder, read_trace, replay
+from watchdog.events import (DirCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent, FileMovedEvent)
+
+
+class TraceTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.temp_path, "src")
+        os.makedirs(self.src_path)
+        self.trace_path = os.path.join(self.temp_path, "trace.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    @mock.patch("specchio.trace.time")
+    def record(self, events, _time):
+        _time.time.side_effect = [100] + [
+            100 + event_time for event_time, _ in events
+        ]
+        recorder = TraceRecorder(self.trace_path, self.src_path)
+        for _, event in events:
+            recorder.record(event)
+        recorder.close()
+
+    def test_record_and_read(self):
+        _events = [
+            (0.5, DirCreatedEvent(src_path=self.src_path + "/b")),
+            (1.25, FileMovedEvent(src_path=self.src_path + "/1.py",
+                                  dest_path=self.src_path + "/b/1.py"))
+        ]
+        self.record(_events)
+        with open(self.trace_path) as trace_file:
+            self.assertEqual(trace_file.readlines()[1:], [
+                '[0.5,"created",1,"b"]\n',
+                '[1.25,"moved",0,"1.py","b/1.py"]\n'
+            ])
+        self.assertEqual(list(read_trace(self.trace_path, "/a")), [
+            (0.5, DirCreatedEvent(src_path="/a/b")),
+            (1.25, FileMovedEvent(src_path="/a/1.py", dest_path="/a/b/1.py"))
+        ])
+
+    def test_replay(self):
+        self.record([
+            (0.1, FileModifiedEvent(src_path=self.src_path + "/1.py")),
+            (0.2, FileModifiedEvent(src_path=self.src_path + "/1.py")),
+            (1.5, FileDeletedEvent(src_path=self.src_path + "/2.py")),
+            (1.6, FileDeletedEvent(src_path=self.src_path + "/3.py"))
+        ])
+        with mock.patch("specchio.handlers.SpecchioEventHandler."
+                        "init_merkle_tree") as _init_merkle_tree:
+            report = replay(self.trace_path, self.src_path,
+                            reconcile_interval=1)
+        # Reconciliation is not replayed
+        self.assertEqual(_init_merkle_tree.call_count, 0)
+        self.assertEqual(report["operations"], {
+            "create_folder": 1, "send_file": 1, "remove_multi": 1
+        })
+        self.assertEqual(report["unsynced"], 0)
+        self.assertAlmostEqual(report["p50"], 0.5, places=3)
+        self.assertAlmostEqual(report["max"], 0.9, places=3)
+
+
+class FakeTransportTest(TestCase):
+
+    def test_latency(self):
+        _now = [0]
+        transport = FakeTransport(lambda: _now[0], "/b/a/")
+        transport.on_event(["1.py", "b"])
+        _now[0] = 2
+        transport.on_event(["1.py"])
+        transport.move(src_path="/b/a/1.py", dst_path="/b/a/c")
+        self.assertEqual(transport.operations, {"move": 1})
+        self.assertEqual(transport.latencies, [2])
+        self.assertEqual(transport.pending_paths, {"b": 0})
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from specchio.transports import (LocalTransport, SSHTransport, copy_data,
+                                 copy_file)
+
+
+class SSHTransportTest(TestCase):
+
+    def setUp(self):
+        self.transport = SSHTransport("user@host")
+
+    @mock.patch("specchio.transports.rsync")
+    def test_send_file(self, _rsync):
+        self.transport.send_file(src_path="/a/1.py", dst_path="/b/a/1.py")
+        _rsync.assert_called_once_with(dst_ssh="user@host",
+                                       src_path="/a/1.py",
+                                       dst_path="/b/a/1.py")
+
+    @mock.patch("specchio.transports.rsync_multi")
+    def test_send_files(self, _rsync_multi):
+        self.transport.send_files("/a/", ["1.py"], "/b/a/", bwlimit=100)
+        _rsync_multi.assert_called_once_with(
+            dst_ssh="user@host", folder_path="/a/", src_paths=["1.py"],
+            dst_path="/b/a/", bwlimit=100
+        )
+
+    @mock.patch("specchio.transports.RemoteMerkleTree")
+    def test_merkle_tree(self, _RemoteMerkleTree):
+        self.transport.merkle_tree("/b/a/", [])
+        _RemoteMerkleTree.assert_called_once_with("user@host", "/b/a/", [],
+                                                  includes=(), excludes=())
+
+
+class LocalTransportTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.temp_path, "src")
+        self.dst_path = os.path.join(self.temp_path, "dst")
+        os.makedirs(os.path.join(self.src_path, "b"))
+        self.write("1.py", "1")
+        self.write("b/2.py", "22")
+        os.symlink("1.py", os.path.join(self.src_path, "3.py"))
+        self.transport = LocalTransport()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def write(self, path, text):
+        with open(os.path.join(self.src_path, path), "w") as _file:
+            _file.write(text)
+
+    def read(self, path):
+        with open(os.path.join(self.dst_path, path)) as _file:
+            return _file.read()
+
+    def test_send_files(self):
+        os.utime(os.path.join(self.src_path, "b/2.py"), (1, 1))
+        self.assertEqual(self.transport.is_empty(self.dst_path), True)
+        self.transport.send_files(self.src_path, ["1.py", "b/2.py", "3.py"],
+                                  self.dst_path)
+        self.assertEqual(self.transport.is_empty(self.dst_path), False)
+        self.assertEqual(self.read("b/2.py"), "22")
+        self.assertEqual(
+            os.path.getmtime(os.path.join(self.dst_path, "b/2.py")), 1
+        )
+        self.assertEqual(os.readlink(os.path.join(self.dst_path, "3.py")),
+                         "1.py")
+        self.assertEqual(list(self.transport.manifest(self.dst_path)), [
+            ("1.py", "1\t{}".format(int(os.path.getmtime(
+                os.path.join(self.dst_path, "1.py")
+            )))),
+            ("b/2.py", "2\t1")
+        ])
+        self.assertEqual(
+            list(self.transport.manifest(self.dst_path, with_hash=True,
+                                         folder_paths=["b"])),
+            [("b/2.py", "b6d767d2f8ed5d21a44b0e5886680cb9")]
+        )
+
+    def test_send_file_replace(self):
+        os.makedirs(self.dst_path)
+        self.transport.send_file(os.path.join(self.src_path, "1.py"),
+                                 os.path.join(self.dst_path, "1.py"))
+        self.write("1.py", "11")
+        self.transport.send_file(os.path.join(self.src_path, "1.py"),
+                                 os.path.join(self.dst_path, "1.py"))
+        self.assertEqual(self.read("1.py"), "11")
+        self.assertEqual(os.listdir(self.dst_path), ["1.py"])
+
+    def test_send_folder(self):
+        self.transport.send_file(os.path.join(self.src_path, "b"),
+                                 os.path.join(self.dst_path, "c"))
+        self.assertEqual(self.read("c/2.py"), "22")
+
+    def test_move_and_remove(self):
+        self.transport.create_folder(os.path.join(self.dst_path, "b"))
+        self.transport.send_file(os.path.join(self.src_path, "1.py"),
+                                 os.path.join(self.dst_path, "b/1.py"))
+        self.transport.move(os.path.join(self.dst_path, "b"),
+                            os.path.join(self.dst_path, "c"))
+        self.assertEqual(self.read("c/1.py"), "1")
+        self.transport.remove_multi([os.path.join(self.dst_path, "c"),
+                                     os.path.join(self.dst_path, "d")])
+        self.assertEqual(os.listdir(self.dst_path), [])
+
+    def test_send_large_file_failed(self):
+        self.assertEqual(
+            self.transport.send_large_file(
+                os.path.join(self.src_path, "0.py"),
+                os.path.join(self.src_path, "1.py")
+            ),
+            False
+        )
+
+    def test_merkle_tree(self):
+        self.transport.send_files(self.src_path, ["1.py", "b/2.py"],
+                                  self.dst_path)
+        remote_tree = self.transport.merkle_tree(self.dst_path, [])
+        try:
+            self.assertEqual(
+                sorted(remote_tree.get_children([""])[0].keys()),
+                ["1.py", "b"]
+            )
+        finally:
+            remote_tree.close()
+
+
+class CopyDataTest(TestCase):
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.temp_path, "1.bin")
+        with open(self.src_path, "wb") as _file:
+            _file.write(b"a" * 3000000)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def copy(self):
+        dst_path = os.path.join(self.temp_path, "2.bin")
+        copy_file(self.src_path, dst_path)
+        with open(dst_path, "rb") as _file:
+            return _file.read()
+
+    def test_copy(self):
+        self.assertEqual(self.copy(), b"a" * 3000000)
+
+    @mock.patch("specchio.transports._copy_file_range", None)
+    @mock.patch("specchio.transports.fcntl")
+    def test_copy_by_read(self, _fcntl):
+        _fcntl.ioctl.side_effect = IOError
+        self.assertEqual(self.copy(), b"a" * 3000000)
+
+    @mock.patch("specchio.transports.ctypes.get_errno")
+    @mock.patch("specchio.transports._copy_file_range")
+    @mock.patch("specchio.transports.fcntl")
+    def test_copy_fallback(self, _fcntl, _copy_file_range, _get_errno):
+        _fcntl.ioctl.side_effect = IOError
+        _copy_file_range.return_value = -1
+        _get_errno.return_value = errno.EXDEV
+        self.assertEqual(self.copy(), b"a" * 3000000)
+        self.assertEqual(_copy_file_range.call_count, 1)
+
+    @mock.patch("specchio.transports.ctypes.get_errno")
+    @mock.patch("specchio.transports._copy_file_range")
+    @mock.patch("specchio.transports.fcntl")
+    def test_copy_error(self, _fcntl, _copy_file_range, _get_errno):
+        _fcntl.ioctl.side_effect = IOError
+        _copy_file_range.return_value = -1
+        _get_errno.return_value = errno.ENOSPC
+        self.assertRaises(OSError, copy_data, 0, 1)
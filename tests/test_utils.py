@@ -1,15 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import fnmatch
 import io
 import logging
+import re
 import sys
 from unittest import TestCase
 
 import mock
-from specchio.utils import (get_all_re, get_re_from_single_line, init_logger,
-                            remote_create_folder, remote_mv, remote_rm, rsync,
-                            rsync_multi, walk_get_gitignore)
+from specchio.logs import JsonFormatter
+from specchio.utils import (PatternSet, diff_manifest, find_binary,
+                            get_all_re, get_git_dir, get_git_head,
+                            get_glob_from_single_line, get_manifest_value,
+                            get_re_from_single_line, git_changed_files,
+                            git_ignored_files, git_ls_files, git_output,
+                            init_logger, is_git_work_tree,
+                            remote_create_folder,
+                            remote_is_empty, remote_manifest, remote_mv,
+                            remote_rm, remote_rm_multi, rsync, rsync_large,
+                            rsync_multi, tar_multi, walk_get_gitignore)
 from testfixtures import LogCapture
 
 
@@ -93,12 +103,24 @@ class WalkGetGitignoreTest(TestCase):
         )
 
 
+class FindBinaryTest(TestCase):
+
+    @mock.patch("specchio.utils.os.access")
+    @mock.patch("specchio.utils.os.path.isfile")
+    @mock.patch.dict("specchio.utils.os.environ", {"PATH": "/bin:/usr/bin"})
+    def test_find_binary(self, _isfile, _access):
+        _isfile.side_effect = (lambda path: path == "/usr/bin/ssh")
+        _access.return_value = True
+        self.assertEqual(find_binary("ssh"), "/usr/bin/ssh")
+        self.assertEqual(find_binary("rsync"), None)
+
+
 class GetAllReTest(TestCase):
 
     # Don't use mock_open, it doesn't support iter for file
     @mock.patch("__builtin__.open")
     @mock.patch("specchio.utils.re")
-    @mock.patch("specchio.utils.get_re_from_single_line")
+    @mock.patch("specchio.utils.get_glob_from_single_line")
     def test_get_all_re(self, _get_re, _re, _open):
         _open.return_value = io.StringIO(u"simple text")
         _get_re.return_value = (1, "re_text")
@@ -111,19 +133,162 @@ class GetAllReTest(TestCase):
             {
                 "/young/simple/.gitignore": {
                     1: ["compiled_re"],
-                    2: [],
-                    3: []
+                    2: PatternSet(),
+                    3: PatternSet()
+                }
+            }
+        )
+
+    @mock.patch("__builtin__.open")
+    def test_get_all_re_with_pattern(self, _open):
+        _open.return_value = io.StringIO(u"*.pyc\n!a.pyc\nbuild/\n")
+        result = get_all_re(["/young/simple/.gitignore"])
+        self.assertEqual(
+            result,
+            {
+                "/young/simple/.gitignore": {
+                    1: [],
+                    2: PatternSet(["a.pyc"]),
+                    3: PatternSet(["*.pyc", "build/*"])
                 }
             }
         )
 
 
+class GetGlobFromSingleLineTest(TestCase):
+
+    def test_get_glob_from_single_line(self):
+        self.assertEqual(get_glob_from_single_line("# too simple"),
+                         (0, None))
+        self.assertEqual(get_glob_from_single_line("!./too\\ young/"),
+                         (2, "too young/*"))
+
+
+class PatternSetTest(TestCase):
+
+    def setUp(self):
+        self.globs = ["node_modules/*", ".DS_Store", "*.pyc", "*", "a/*/b",
+                      "build/*", "*.o", "t?st.py", "[ab].py", "*_test*"]
+        self.paths = ["node_modules/", "node_modules/a.js", "a/node_modules",
+                      ".DS_Store", "a/.DS_Store", "a.pyc", "a/b.pyc",
+                      "a.pyc/", "a/c/b", "a/b", "build/", "build", "a.o",
+                      "test.py", "tst.py", "a.py", "c.py", "a_test.py", ""]
+
+    def test_pattern_set_classes(self):
+        pattern_set = PatternSet(self.globs)
+        self.assertEqual(pattern_set.literals, set([".DS_Store"]))
+        self.assertEqual(pattern_set.prefixes,
+                         {0: set([""]), 6: set(["build/"]),
+                          13: set(["node_modules/"])})
+        self.assertEqual(pattern_set.suffixes,
+                         {2: set([".o"]), 4: set([".pyc"])})
+        self.assertEqual(len(pattern_set.regexes), 4)
+        self.assertEqual(len(pattern_set), 10)
+
+    def test_pattern_set_match(self):
+        # Each single pattern matches the same paths as `fnmatch`
+        for glob in self.globs:
+            pattern_set = PatternSet([glob])
+            _re = re.compile(fnmatch.translate(glob))
+            for path in self.paths:
+                self.assertEqual(pattern_set.match(path),
+                                 bool(_re.match(path)),
+                                 (glob, path))
+
+
+class IsGitWorkTreeTest(TestCase):
+
+    @mock.patch("specchio.utils.subprocess")
+    def test_is_git_work_tree(self, _subprocess):
+        _subprocess.Popen.return_value.communicate.return_value = (
+            "true\n", ""
+        )
+        self.assertEqual(is_git_work_tree("/a/"), True)
+        _subprocess.Popen.assert_called_once_with(
+            ["git", "rev-parse", "--is-inside-work-tree"], cwd="/a/",
+            stdout=_subprocess.PIPE, stderr=_subprocess.PIPE
+        )
+
+    @mock.patch("specchio.utils.subprocess.Popen")
+    def test_is_git_work_tree_without_git(self, _Popen):
+        _Popen.side_effect = OSError
+        self.assertEqual(is_git_work_tree("/a/"), False)
+
+
+class GitLsFilesTest(TestCase):
+
+    @mock.patch("specchio.utils.subprocess")
+    def test_git_ls_files(self, _subprocess):
+        _process = mock.Mock()
+        _process.stdout = io.BytesIO(b"a.py\0c d/b.py\0c d/b.py\0e.py\0")
+        _subprocess.Popen.return_value = _process
+        self.assertEqual(list(git_ls_files("/a/")),
+                         ["a.py", "c d/b.py", "e.py"])
+        _subprocess.Popen.assert_called_once_with(
+            ["git", "ls-files", "-z", "--cached", "--others",
+             "--exclude-standard"], cwd="/a/", stdout=_subprocess.PIPE
+        )
+        _process.wait.assert_called_once_with()
+
+
+class GitOutputTest(TestCase):
+
+    @mock.patch("specchio.utils.subprocess")
+    def test_git_output(self, _subprocess):
+        _subprocess.Popen.return_value.communicate.return_value = ("out", "")
+        _subprocess.Popen.return_value.returncode = 0
+        self.assertEqual(git_output("/a/", ["status"]), "out")
+        _subprocess.Popen.assert_called_once_with(
+            ["git", "status"], cwd="/a/", stdout=_subprocess.PIPE,
+            stderr=_subprocess.PIPE
+        )
+        _subprocess.Popen.return_value.returncode = 128
+        self.assertEqual(git_output("/a/", ["status"]), None)
+
+    @mock.patch("specchio.utils.git_output")
+    def test_get_git_dir(self, _git_output):
+        _git_output.return_value = "../.git\n"
+        self.assertEqual(get_git_dir("/a/b"), "/a/b/../.git")
+        _git_output.return_value = None
+        self.assertEqual(get_git_dir("/a/b"), None)
+
+    @mock.patch("specchio.utils.git_output")
+    def test_get_git_head(self, _git_output):
+        _git_output.return_value = "abcdef\n"
+        self.assertEqual(get_git_head("/a/"), "abcdef")
+        _git_output.assert_called_once_with(
+            "/a/", ["rev-parse", "--verify", "-q", "HEAD"]
+        )
+
+    @mock.patch("specchio.utils.git_output")
+    def test_git_changed_files(self, _git_output):
+        _git_output.side_effect = ["1.py\0", "2.py\0b/3.py\0"]
+        self.assertEqual(git_changed_files("/a/", "old", "new"),
+                         set(["1.py", "2.py", "b/3.py"]))
+        _git_output.assert_called_with("/a/", [
+            "diff", "--name-only", "--no-renames", "--relative", "-z",
+            "old", "new"
+        ])
+
+    @mock.patch("specchio.utils.git_output")
+    def test_git_ignored_files(self, _git_output):
+        _git_output.side_effect = ["a.log\0", "b.tmp\0build/\0"]
+        self.assertEqual(git_ignored_files("/a/"),
+                         (["a.log"], ["b.tmp", "build/"]))
+        _git_output.assert_called_with("/a/", [
+            "ls-files", "-z", "--others", "--ignored", "--exclude-standard",
+            "--directory"
+        ])
+        _git_output.side_effect = ["a.log\0", None]
+        self.assertEqual(git_ignored_files("/a/"), None)
+
+
 class RemoteCreateFloderTest(TestCase):
 
     @mock.patch("specchio.utils.os")
     def test_remote_create_folder(self, _os):
-        _os.popen.return_value = True
-        remote_create_folder("user@host", "/a/b/")
+        _os.popen.return_value.close.return_value = None
+        self.assertEqual(remote_create_folder("user@host", "/a/b/"), True)
         _os.popen.assert_called_once_with("ssh user@host \"mkdir -p /a/b/\"")
 
 
@@ -131,16 +296,36 @@ class RemoteRmTest(TestCase):
 
     @mock.patch("specchio.utils.os")
     def test_remote_rm(self, _os):
-        _os.popen.return_value = True
-        remote_rm("user@host", "/a/b.py")
+        _os.popen.return_value.close.return_value = 65280
+        self.assertEqual(remote_rm("user@host", "/a/b.py"), False)
         _os.popen.assert_called_once_with("ssh user@host \"rm -rf /a/b.py\"")
 
 
+class RemoteRmMultiTest(TestCase):
+
+    @mock.patch("specchio.utils.os")
+    def test_remote_rm_multi(self, _os):
+        _pipe = mock.Mock()
+        _pipe.close.return_value = None
+        _os.popen.return_value = _pipe
+        self.assertEqual(
+            remote_rm_multi("user@host", ["/a/b.py", "/a/c d/"]), True
+        )
+        _os.popen.assert_called_once_with("ssh user@host \"xargs -0 rm -rf\"",
+                                          "w")
+        _pipe.write.assert_called_once_with("/a/b.py\0/a/c d/")
+        _pipe.close.assert_called_once_with()
+
+    @mock.patch("specchio.utils.os")
+    def test_remote_rm_multi_empty(self, _os):
+        self.assertEqual(remote_rm_multi("user@host", []), True)
+        self.assertEqual(_os.popen.call_count, 0)
+
+
 class RemoteMvTest(TestCase):
 
     @mock.patch("specchio.utils.os")
     def test_remote_mv(self, _os):
-        _os.popen.return_value = True
         remote_mv("user@host", "/a/b.py", "/c.py")
         _os.popen.assert_called_once_with("ssh user@host \"mv /a/b.py /c.py\"")
 
@@ -149,23 +334,172 @@ class RsyncTest(TestCase):
 
     @mock.patch("specchio.utils.os")
     def test_rsync(self, _os):
-        _os.popen.return_value = True
         rsync("user@host", "/a/b.py", "/c.py")
         _os.popen.assert_called_once_with(
-            "rsync -avz /a/b.py user@host:/c.py"
+            "rsync -az /a/b.py user@host:/c.py"
+        )
+
+
+class RsyncLargeTest(TestCase):
+
+    @mock.patch("specchio.utils.os")
+    def test_rsync_large(self, _os):
+        _os.popen.return_value.close.return_value = None
+        self.assertEqual(rsync_large("user@host", "/a/b.bin", "/c.bin", 500),
+                         True)
+        # A file rewritten in place of the same size is sent by delta
+        _os.popen.assert_called_once_with(
+            "rsync -az --partial --bwlimit=500 /a/b.bin user@host:/c.bin"
+        )
+        rsync_large("user@host", "/a/b.bin", "/c.bin", is_resumed=True)
+        _os.popen.assert_called_with(
+            "rsync -az --partial --append-verify /a/b.bin user@host:/c.bin"
         )
+        _os.popen.return_value.close.return_value = 256
+        self.assertEqual(rsync_large("user@host", "/a/b.bin", "/c.bin"),
+                         False)
 
 
 class RsyncMultiTest(TestCase):
 
     @mock.patch("specchio.utils.os")
     def test_rsync_multi(self, _os):
-        _os.popen.return_value = True
-        rsync_multi("user@host", "/a", ["b.py", "c/1.py"], "/remote")
+        _os.popen.return_value.close.return_value = None
+        self.assertEqual(
+            rsync_multi("user@host", "/a", ["b.py", "c/1.py"], "/remote"),
+            True
+        )
+        _os.popen.assert_called_once_with(
+            "rsync -az --from0 --files-from=- /a user@host:/remote", "w"
+        )
+        _os.popen.return_value.write.assert_called_once_with(
+            "b.py\0c/1.py"
+        )
+        _os.popen.return_value.close.return_value = 5888
+        self.assertEqual(
+            rsync_multi("user@host", "/a", ["b.py"], "/remote"), False
+        )
+
+    @mock.patch("specchio.utils.os")
+    def test_rsync_multi_with_bwlimit(self, _os):
+        rsync_multi("user@host", "/a", ["b.py"], "/remote", bwlimit=100)
+        _os.popen.assert_called_once_with(
+            "rsync -az --from0 --files-from=- --bwlimit=100 /a "
+            "user@host:/remote", "w"
+        )
+
+    @mock.patch("specchio.utils.os")
+    def test_rsync_multi_nothing(self, _os):
+        self.assertEqual(rsync_multi("user@host", "/a", [], "/remote"), True)
+        self.assertEqual(_os.popen.call_count, 0)
+
+
+class RemoteIsEmptyTest(TestCase):
+
+    @mock.patch("specchio.utils.os")
+    def test_remote_is_empty(self, _os):
+        _os.popen.return_value = io.StringIO(u"\n")
+        self.assertEqual(remote_is_empty("user@host", "/remote"), True)
         _os.popen.assert_called_once_with(
-            "rsync -avrm --include=\"/b.py\" --include=\"/c/1.py\""
-            " --exclude=\"*.*\" /a user@host:/remote"
+            "ssh user@host \"ls -A /remote 2>/dev/null\""
         )
+        _os.popen.return_value = io.StringIO(u"a.py\n")
+        self.assertEqual(remote_is_empty("user@host", "/remote"), False)
+
+
+class TarMultiTest(TestCase):
+
+    @mock.patch("specchio.utils.subprocess")
+    def test_tar_multi(self, _subprocess):
+        _processes = [mock.Mock(), mock.Mock()]
+        _processes[0].wait.return_value = 0
+        _processes[1].wait.return_value = 2
+        _subprocess.Popen.side_effect = _processes
+        self.assertEqual(
+            tar_multi("user@host", "/a", iter(["b.py", "c/1.py", "d.py"]),
+                      "/remote", jobs=1, chunk_size=2),
+            False
+        )
+        _subprocess.Popen.assert_called_with(
+            "tar -czf - -C /a --null -T - | "
+            "ssh user@host \"mkdir -p /remote && tar -xzf - -C /remote\"",
+            shell=True, stdin=_subprocess.PIPE
+        )
+        self.assertEqual(_subprocess.Popen.call_count, 2)
+        _processes[0].stdin.write.assert_called_once_with("b.py\0c/1.py")
+        _processes[1].stdin.write.assert_called_once_with("d.py")
+        _processes[0].wait.assert_called_once_with()
+        _processes[1].wait.assert_called_once_with()
+
+
+class RemoteManifestTest(TestCase):
+
+    @mock.patch("specchio.utils.subprocess")
+    def test_remote_manifest(self, _subprocess):
+        _process = mock.Mock()
+        _process.stdout = iter(["./a b.py\t12\t1400000000.5\n",
+                                "./c/d.py\t0\t1400000001.0\n"])
+        _subprocess.Popen.return_value = _process
+        result = list(remote_manifest("user@host", "/remote"))
+        self.assertEqual(result, [("a b.py", "12\t1400000000"),
+                                  ("c/d.py", "0\t1400000001")])
+        _subprocess.Popen.assert_called_once_with(
+            ["ssh", "user@host",
+             "cd /remote && find . -type f -printf '%p\\t%s\\t%T@\\n' "
+             "2>/dev/null | LC_ALL=C sort"],
+            stdout=_subprocess.PIPE
+        )
+        _process.wait.assert_called_once_with()
+
+    @mock.patch("specchio.utils.subprocess")
+    def test_remote_manifest_with_hash(self, _subprocess):
+        _process = mock.Mock()
+        _process.stdout = iter(["d41d8cd98f00b204e9800998ecf8427e  ./a.py\n"])
+        _subprocess.Popen.return_value = _process
+        result = list(remote_manifest("user@host", "/remote", True))
+        self.assertEqual(result,
+                         [("a.py", "d41d8cd98f00b204e9800998ecf8427e")])
+
+    @mock.patch("specchio.utils.subprocess")
+    def test_remote_manifest_with_folders(self, _subprocess):
+        _process = mock.Mock()
+        _process.stdout = iter(["a b/c.py\t12\t1400000000.5\n"])
+        _subprocess.Popen.return_value = _process
+        result = list(remote_manifest("user@host", "/remote",
+                                      folder_paths=["a b", "d"]))
+        self.assertEqual(result, [("a b/c.py", "12\t1400000000")])
+        _subprocess.Popen.assert_called_once_with(
+            ["ssh", "user@host",
+             "cd /remote && find 'a b' d -type f "
+             "-printf '%p\\t%s\\t%T@\\n' 2>/dev/null | LC_ALL=C sort"],
+            stdout=_subprocess.PIPE
+        )
+
+
+class GetManifestValueTest(TestCase):
+
+    @mock.patch("specchio.utils.os")
+    def test_get_manifest_value(self, _os):
+        _os.stat.return_value = mock.Mock(st_size=12, st_mtime=1400000000.5)
+        self.assertEqual(get_manifest_value("/a/b.py"), "12\t1400000000")
+
+    @mock.patch("specchio.utils.os")
+    def test_get_manifest_value_missing(self, _os):
+        _os.stat.side_effect = OSError
+        self.assertEqual(get_manifest_value("/a/b.py"), None)
+
+
+class DiffManifestTest(TestCase):
+
+    def test_diff_manifest(self):
+        result = list(diff_manifest(
+            [("a.py", "1"), ("b.py", "2"), ("d.py", "4")],
+            [("b.py", "3"), ("c.py", "3"), ("d.py", "4"), ("e.py", "5")]
+        ))
+        self.assertEqual(result, [
+            ("missing", "a.py"), ("changed", "b.py"),
+            ("extra", "c.py"), ("extra", "e.py")
+        ])
 
 
 class LoggingConfigurationTests(TestCase):
@@ -201,6 +535,14 @@ class LoggingConfigurationTests(TestCase):
         )
 
 
+    def test_json_configuration(self):
+
+        init_logger(is_json=True)
+
+        self.assertIsInstance(self.logger.handlers[0].formatter,
+                              JsonFormatter)
+
+
 class LoggingOutputTest(TestCase):
 
     def test_logger(self):